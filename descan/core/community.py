@@ -6,14 +6,19 @@ from typing import List, Optional, Tuple, Dict, Set
 
 from descan.core.cache import StorageRequestCache, TripletsRequestCache, EdgeSearchCache
 from descan.core.content import Content
+from descan.eva.priority import Priority
 from descan.eva.protocol import EVAProtocol
 from descan.skipgraph import LEFT, RIGHT
 from descan.core.payloads import StorageRequestPayload, StorageResponsePayload, TripletsRequestPayload, TripletsPayload
 from descan.core.db.content_database import ContentDatabase
 from descan.core.db.knowledge_graph import KnowledgeGraph
+from descan.core.db.processed_database import ProcessedDatabase
 from descan.core.db.rules_database import RulesDatabase
 from descan.core.db.triplet import Triplet
+from descan.core.merkle import CommitmentVerifier, SignedTriplets
 from descan.core.rule_execution_engine import RuleExecutionEngine
+from descan.core.serialization import COMPACT_TRIPLETS_VERSION, SIGNED_TRIPLETS_VERSION, pack_signed_triplets, \
+    pack_triplets, unpack_signed_triplets, unpack_triplets
 from descan.skipgraph.community import SkipGraphCommunity
 from descan.skipgraph.node import SGNode
 
@@ -27,13 +32,15 @@ class DKGCommunity(Community):
     community_id = unhexlify('d5889074c1e5b60423cdb6e9307ba0ca5695ead7')
 
     def __init__(self, *args, **kwargs):
+        # The database in which the processed content is tracked across restarts. If not set, it is kept in memory.
+        processed_db_path: str = kwargs.pop("processed_db_path", ":memory:")
         super().__init__(*args, **kwargs)
         self.content_db = ContentDatabase()
         self.rules_db = RulesDatabase()
         self.knowledge_graph = KnowledgeGraph()
-        self.rule_execution_engine: RuleExecutionEngine = RuleExecutionEngine(self.content_db, self.rules_db,
-                                                                              self.my_peer.key,
-                                                                              self.on_new_triplets_generated)
+        self.rule_execution_engine: RuleExecutionEngine = RuleExecutionEngine(
+            self.content_db, self.rules_db, self.my_peer.key, self.on_new_triplets_generated,
+            processed_db=ProcessedDatabase(processed_db_path))
         self.skip_graphs: List[SkipGraphCommunity] = []
 
         self.request_cache = RequestCache()
@@ -46,6 +53,8 @@ class DKGCommunity(Community):
 
         self.eva = EVAProtocol(self, self.on_eva_receive, self.on_eva_send_complete, self.on_eva_error)
         self.eva.settings.max_simultaneous_transfers = 10000
+        self.eva.settings.compression.enabled = True
+        self.eva.settings.batching.enabled = True
 
         self.add_message_handler(StorageRequestPayload, self.on_storage_request)
         self.add_message_handler(StorageResponsePayload, self.on_storage_response)
@@ -56,6 +65,10 @@ class DKGCommunity(Community):
         self.is_offline: bool = False
         self.should_verify_key: bool = True
 
+        # Received triplets are verified against their signed commitments. Unsigned triplets are dropped if required.
+        self.commitment_verifier = CommitmentVerifier()
+        self.require_signed_triplets: bool = False
+
         self.logger.info("The DKG community started!")
 
     def get_sg_key(self) -> int:
@@ -70,19 +83,61 @@ class DKGCommunity(Community):
     async def on_eva_receive(self, result):
         self.logger.info(f'EVA Data has been received: {result}')
         info_json = json.loads(result.info.decode())
+        # The received data is a view on the EVA receive buffer, the triplets should not reference it
+        data = bytes(result.data)
         if info_json["type"] == "store":
-            triplets_payload = self.serializer.unpack_serializable(TripletsPayload, result.data)[0]
-            for triplet_payload in triplets_payload.triplets:
-                self.knowledge_graph.add_triplet(Triplet.from_payload(triplet_payload))
+            unsigned_triplets, signed_triplets = self.unpack_verified_triplets(info_json, data)
+            for triplet in unsigned_triplets:
+                self.knowledge_graph.add_triplet(triplet)
+            for group in signed_triplets:
+                self.knowledge_graph.add_signed_triplets(group)
         elif info_json["type"] == "search_response":
             if not self.request_cache.has("triplets", info_json["id"]):
                 self.logger.warning("triplets cache with id %s not found", info_json["id"])
                 return
 
             cache: TripletsRequestCache = self.request_cache.pop("triplets", info_json["id"])
-            triplets_payload = self.serializer.unpack_serializable(TripletsPayload, result.data)[0]
-            triplets = [Triplet.from_payload(triplet_payload) for triplet_payload in triplets_payload.triplets]
-            cache.future.set_result(triplets)
+            unsigned_triplets, signed_triplets = self.unpack_verified_triplets(info_json, data)
+            cache.future.set_result(unsigned_triplets + [triplet for group in signed_triplets
+                                                         for triplet in group.triplets])
+
+    def unpack_verified_triplets(self, info_json: Dict, data: bytes) -> Tuple[List[Triplet], List[SignedTriplets]]:
+        """
+        Decode the triplets in the received data and verify the signed ones in a single batch. Return the unsigned
+        triplets and the valid signed triplets.
+        """
+        if info_json.get("format") == SIGNED_TRIPLETS_VERSION:
+            try:
+                unsigned_triplets, signed_triplets = unpack_signed_triplets(data)
+            except ValueError as e:
+                self.logger.warning("Received malformed triplets: %s", e)
+                return [], []
+
+            signed_triplets, invalid_triplets = self.commitment_verifier.verify(signed_triplets)
+            if invalid_triplets:
+                self.logger.warning("Dropping %d sets of triplets with an invalid commitment", len(invalid_triplets))
+        else:
+            unsigned_triplets, signed_triplets = self.unpack_triplets(info_json, data), []
+
+        if self.require_signed_triplets and unsigned_triplets:
+            self.logger.warning("Dropping %d unsigned triplets", len(unsigned_triplets))
+            unsigned_triplets = []
+        return unsigned_triplets, signed_triplets
+
+    def unpack_triplets(self, info_json: Dict, data: bytes) -> List[Triplet]:
+        """
+        Decode the triplets in the received data. The info tells whether the data uses the compact encoding
+        or is a serialized TripletsPayload (sent by older peers).
+        """
+        if info_json.get("format") == COMPACT_TRIPLETS_VERSION:
+            try:
+                return unpack_triplets(data)
+            except ValueError as e:
+                self.logger.warning("Received malformed triplets: %s", e)
+                return []
+
+        triplets_payload = self.serializer.unpack_serializable(TripletsPayload, data)[0]
+        return [Triplet.from_payload(triplet_payload) for triplet_payload in triplets_payload.triplets]
 
     async def on_eva_send_complete(self, result):
         self.logger.info(f'EVA transfer has been completed: {result}')
@@ -131,19 +186,28 @@ class DKGCommunity(Community):
             return
 
         triplets: List[Triplet] = []
+        signed_triplets: List[SignedTriplets] = []
         if not self.is_malicious:
-            triplets = self.knowledge_graph.get_triplets_of_node(payload.content)
+            triplets, signed_triplets = self.knowledge_graph.get_signed_triplets_of_node(payload.content)
         else:
             self.logger.warning("Peer %s malicious - responding with no triplets", self.get_my_short_id())
 
-        triplets_payload = TripletsPayload([triplet.to_payload() for triplet in triplets])
-        serialized_payload = self.serializer.pack_serializable(triplets_payload)
         info_json = {"type": "search_response", "id": payload.identifier, "cid": hexlify(payload.content).decode()}
-        ensure_future(self.eva.send_binary(peer, json.dumps(info_json).encode(), serialized_payload))
-
-    async def on_new_triplets_generated(self, content: Content, triplets: List[Triplet]):
+        if signed_triplets:
+            serialized_payload = pack_signed_triplets(triplets, signed_triplets)
+            info_json["format"] = SIGNED_TRIPLETS_VERSION
+        else:
+            serialized_payload = pack_triplets(triplets)
+            info_json["format"] = COMPACT_TRIPLETS_VERSION
+        # Search responses are latency sensitive, they should not wait behind storage transfers
+        ensure_future(self.eva.send_binary(peer, json.dumps(info_json).encode(), serialized_payload,
+                                           priority=Priority.INTERACTIVE))
+
+    async def on_new_triplets_generated(self, content: Content, triplets: List[Triplet],
+                                        signed_triplets: Optional[SignedTriplets] = None):
         """
-        The rule engine generated new triplets. We should store these triplets in the network now.
+        The rule engine generated new triplets. We should store these triplets in the network now, together with the
+        signed commitment to them.
         """
         if not triplets:
             self.logger.info("Content generated no triplets - won't send out storage requests")
@@ -172,17 +236,24 @@ class DKGCommunity(Community):
             target_node = target_nodes[0]  # TODO we just take the first node for now
             if target_node.key == self.get_sg_key():
                 # I'm responsible for storing this data
-                for triplet in triplets:
-                    self.knowledge_graph.add_triplet(triplet)
+                if signed_triplets:
+                    self.knowledge_graph.add_signed_triplets(signed_triplets)
+                else:
+                    for triplet in triplets:
+                        self.knowledge_graph.add_triplet(triplet)
                 continue
 
             # Send a storage request to the target node.
             response = await self.send_storage_request(target_node, content.identifier, content_keys[ind])
             if response:
                 # Store the triplets on this peer
-                triplets_payload = TripletsPayload([triplet.to_payload() for triplet in triplets])
-                serialized_payload = self.serializer.pack_serializable(triplets_payload)
                 info_json = {"type": "store", "cid": hexlify(content.identifier).decode()}
+                if signed_triplets:
+                    serialized_payload = pack_signed_triplets([], [signed_triplets])
+                    info_json["format"] = SIGNED_TRIPLETS_VERSION
+                else:
+                    serialized_payload = pack_triplets(triplets)
+                    info_json["format"] = COMPACT_TRIPLETS_VERSION
                 ensure_future(self.eva.send_binary(target_node.get_peer(), json.dumps(info_json).encode(), serialized_payload))
             else:
                 self.logger.warning("Peer %s refused storage request for key %d",
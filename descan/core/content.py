@@ -1,13 +1,83 @@
 import hashlib
-from typing import List, Optional
+import json
+from enum import Enum
+from typing import Any, List, Optional
+
+
+class ContentType(Enum):
+    """
+    The type of a content item, which determines the rules that are applied to it.
+    """
+    TORRENT = "torrent"
+    ETHEREUM_BLOCK = "ethereum_block"
+    ETHEREUM_TRANSACTION = "ethereum_transaction"
 
 
 class Content:
+    """
+    A content item with its raw data. Structured (JSON) content is decoded lazily and only once, so all rules share
+    the parsed representation. Content can also be created from an already parsed representation, in which case the
+    raw data is only encoded when it is needed.
+
+    Content that is an item of a list in another content item (e.g., a transaction of a block) refers to its parent,
+    the key of the list and its index. It can be stored by this reference, without encoding it. The reference to
+    the parent is not pickled, so a worker process does not receive the whole parent with each item.
+
+    Rules are only applied to the content items of the types that they declare. All rules are applied to content
+    without a type.
+    """
     custom_keys: Optional[List[int]] = None  # Used for testing purposes
 
-    def __init__(self, identifier: bytes, data: bytes) -> None:
+    def __init__(self, identifier: bytes, data: Optional[bytes] = None, parsed: Any = None,
+                 content_type: Optional[ContentType] = None) -> None:
+        if data is None and parsed is None:
+            raise ValueError("Content requires either data or a parsed representation")
         self.identifier: bytes = identifier
-        self.data: bytes = data
+        self.content_type: Optional[ContentType] = content_type
+        self._data: Optional[bytes] = data
+        self._parsed: Any = parsed
+        self.parent: Optional[Content] = None
+        self.parent_key: Optional[str] = None
+        self.parent_index: Optional[int] = None
+
+    @staticmethod
+    def from_parent(identifier: bytes, parent: "Content", key: str, index: int,
+                    content_type: Optional[ContentType] = None) -> "Content":
+        """
+        Create content from an item of a list in the parsed parent, e.g., parent.parsed["transactions"][3].
+        """
+        content = Content(identifier, parsed=parent.parsed[key][index], content_type=content_type)
+        content.parent = parent
+        content.parent_key = key
+        content.parent_index = index
+        return content
+
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        state["parent"] = None
+        return state
+
+    @property
+    def data(self) -> bytes:
+        if self._data is None:
+            self._data = json.dumps(self._parsed).encode()
+        return self._data
+
+    @property
+    def parsed(self) -> Any:
+        """
+        The JSON-decoded data. Raises a ValueError if the data is not JSON.
+        """
+        if self._parsed is None:
+            self._parsed = json.loads(self.data)
+        return self._parsed
+
+    def release_parsed(self) -> None:
+        """
+        Drop the parsed representation to free memory, if it can be decoded again from the data.
+        """
+        if self._data is not None:
+            self._parsed = None
 
     @staticmethod
     def get_keys(identifier: bytes, num_keys: int = 1) -> List[int]:
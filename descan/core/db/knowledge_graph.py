@@ -1,9 +1,10 @@
-from typing import Set, List
+from typing import Dict, Optional, Set, List, Tuple
 
 import networkx as nx
 from ipv8.messaging.serialization import default_serializer
 
 from descan.core.db.triplet import Triplet
+from descan.core.merkle import Proof, SignedTriplets, TripletCommitment, get_leaves, get_proofs, hash_triplet
 
 
 class KnowledgeGraph:
@@ -14,9 +15,14 @@ class KnowledgeGraph:
     def __init__(self) -> None:
         self.graph = nx.DiGraph()
         self.stored_content: Set[bytes] = set()
+        # The commitments to the stored triplets, by their digest. Each edge keeps the proofs against the
+        # commitments that cover it, the latest one last.
+        self.commitments: Dict[bytes, TripletCommitment] = {}
 
-    def add_triplet(self, triplet: Triplet) -> None:
+    def add_triplet(self, triplet: Triplet, commitment: Optional[TripletCommitment] = None,
+                    proof: Optional[Proof] = None) -> None:
         self.stored_content.add(triplet.head)
+        commitments = {commitment.digest: proof} if commitment else {}
         if self.graph.has_edge(triplet.head, triplet.tail):
             edge = self.graph.edges[triplet.head, triplet.tail]
             if edge["attr"]["relation"] == triplet.relation:
@@ -24,11 +30,29 @@ class KnowledgeGraph:
                 for rule in triplet.rules:
                     if rule not in edge["attr"]["rules"]:
                         edge["attr"]["rules"].append(rule)
+                for digest, digest_proof in commitments.items():
+                    edge["attr"]["commitments"].pop(digest, None)
+                    edge["attr"]["commitments"][digest] = digest_proof
 
                 return
 
         # Otherwise, add the adge as new
-        self.graph.add_edge(triplet.head, triplet.tail, attr={"relation": triplet.relation, "rules": triplet.rules})
+        self.graph.add_edge(triplet.head, triplet.tail, attr={"relation": triplet.relation, "rules": triplet.rules,
+                                                              "commitments": commitments})
+
+    def add_signed_triplets(self, signed_triplets: SignedTriplets) -> None:
+        """
+        Add verified triplets with the proofs against their commitment. If they are all triplets of the commitment,
+        the proofs are computed here.
+        """
+        proofs = signed_triplets.proofs
+        if proofs is None:
+            proofs_by_leaf = get_proofs(get_leaves(signed_triplets.triplets))
+            proofs = [proofs_by_leaf[hash_triplet(triplet)] for triplet in signed_triplets.triplets]
+
+        self.commitments[signed_triplets.commitment.digest] = signed_triplets.commitment
+        for triplet, proof in zip(signed_triplets.triplets, proofs):
+            self.add_triplet(triplet, signed_triplets.commitment, proof)
 
     def get_triplets_of_node(self, content: bytes) -> List[Triplet]:
         """
@@ -41,6 +65,31 @@ class KnowledgeGraph:
             triplets.append(triplet)
         return triplets
 
+    def get_signed_triplets_of_node(self, content: bytes) -> Tuple[List[Triplet], List[SignedTriplets]]:
+        """
+        Fetch the triplets around a particular node, grouped by their latest commitment. If only part of the triplets
+        of a commitment is returned, they come with proofs. Triplets without a commitment are returned as is.
+        """
+        unsigned: List[Triplet] = []
+        groups: Dict[bytes, List[Tuple[Triplet, Proof]]] = {}
+        for triplet in self.get_triplets_of_node(content):
+            commitments = self.graph.edges[triplet.head, triplet.tail]["attr"]["commitments"]
+            if not commitments:
+                unsigned.append(triplet)
+                continue
+            digest = next(reversed(commitments))
+            groups.setdefault(digest, []).append((triplet, commitments[digest]))
+
+        signed: List[SignedTriplets] = []
+        for digest, entries in groups.items():
+            commitment = self.commitments[digest]
+            triplets = [triplet for triplet, _ in entries]
+            proofs = None
+            if len(set(triplets)) < commitment.leaves_count:
+                proofs = [proof for _, proof in entries]
+            signed.append(SignedTriplets(commitment, triplets, proofs))
+        return unsigned, signed
+
     def get_num_edges(self) -> int:
         return len(self.graph.edges)
 
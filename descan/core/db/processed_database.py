@@ -0,0 +1,129 @@
+import sqlite3
+from typing import Collection, Dict, Iterable, List, Tuple
+
+from descan.core.content import Content, ContentType
+
+
+class ProcessedDatabase:
+    """
+    Keeps track of the rules (and their versions) that the rule execution engine has applied to each content item,
+    and of the content that is still waiting in its queue. With a database path, this survives a restart of the node,
+    so the engine resumes where it stopped instead of processing all content again.
+
+    Content that refers to a parent (see Content.from_parent) is stored by this reference, and the raw data of
+    its parent is stored once, so the follow-up content of a rule is not encoded again.
+
+    If the engine signs the triplets, the Merkle leaves (hashes) of the triplets of each content item are kept as well,
+    with the rules that generated them, so a new commitment can be signed over all of them when new rules are applied.
+    The triplets themselves are stored in the knowledge graph.
+
+    Changes are written in a transaction that is committed by the engine after each batch. Content is only marked as
+    processed once the engine callback for it has completed. After a crash, at most the work of a single batch and of
+    the callbacks that were in flight is done again.
+    """
+
+    def __init__(self, path: str = ":memory:") -> None:
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("CREATE TABLE IF NOT EXISTS applied_rules "
+                                "(content_hash BLOB NOT NULL, rule_name BLOB NOT NULL, rule_version INTEGER NOT NULL, "
+                                "PRIMARY KEY (content_hash, rule_name))")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS pending "
+                                "(content_hash BLOB PRIMARY KEY, data BLOB, content_type TEXT, "
+                                "parent_hash BLOB, parent_key TEXT, parent_index INTEGER)")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS parents "
+                                "(content_hash BLOB PRIMARY KEY, data BLOB NOT NULL, content_type TEXT)")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS leaves "
+                                "(content_hash BLOB NOT NULL, leaf BLOB NOT NULL, rule_name BLOB NOT NULL, "
+                                "PRIMARY KEY (content_hash, leaf, rule_name))")
+        self.connection.commit()
+
+    def get_applied_rules(self, content_hash: bytes) -> Dict[bytes, int]:
+        """
+        Return the names and versions of the rules that have been applied to the content.
+        """
+        return dict(self.connection.execute("SELECT rule_name, rule_version FROM applied_rules "
+                                            "WHERE content_hash = ?", (content_hash,)))
+
+    def has_applied_rules(self, content_hash: bytes) -> bool:
+        return self.connection.execute("SELECT 1 FROM applied_rules WHERE content_hash = ? LIMIT 1",
+                                       (content_hash,)).fetchone() is not None
+
+    def add_pending(self, contents: Iterable[Content]) -> None:
+        rows = []
+        parents: Dict[bytes, Content] = {}
+        for content in contents:
+            content_type = content.content_type.value if content.content_type else None
+            if content.parent:
+                parents[content.parent.identifier] = content.parent
+                rows.append((content.identifier, None, content_type, content.parent.identifier, content.parent_key,
+                             content.parent_index))
+            else:
+                rows.append((content.identifier, content.data, content_type, None, None, None))
+
+        self.connection.executemany("INSERT OR IGNORE INTO parents (content_hash, data, content_type) "
+                                    "VALUES (?, ?, ?)",
+                                    [(parent.identifier, parent.data,
+                                      parent.content_type.value if parent.content_type else None)
+                                     for parent in parents.values()])
+        self.connection.executemany("INSERT OR REPLACE INTO pending (content_hash, data, content_type, parent_hash, "
+                                    "parent_key, parent_index) VALUES (?, ?, ?, ?, ?, ?)", rows)
+
+    def get_pending(self) -> List[Content]:
+        parents: Dict[bytes, Content] = {}
+        for content_hash, data, content_type in self.connection.execute(
+                "SELECT content_hash, data, content_type FROM parents"):
+            parents[content_hash] = Content(content_hash, data,
+                                            content_type=ContentType(content_type) if content_type else None)
+
+        pending = []
+        for content_hash, data, content_type, parent_hash, parent_key, parent_index in self.connection.execute(
+                "SELECT content_hash, data, content_type, parent_hash, parent_key, parent_index FROM pending"):
+            content_type = ContentType(content_type) if content_type else None
+            if parent_hash is not None:
+                pending.append(Content.from_parent(content_hash, parents[parent_hash], parent_key, parent_index,
+                                                   content_type))
+            else:
+                pending.append(Content(content_hash, data, content_type=content_type))
+        return pending
+
+    def mark_processed(self, content_hash: bytes, rules: Iterable[Tuple[bytes, int]],
+                       follow_up: Iterable[Content] = ()) -> None:
+        """
+        Record the (name, version) of the rules that have been applied to the content, and queue the content that
+        the rules generated from it, in the same transaction.
+        """
+        self.connection.execute("DELETE FROM pending WHERE content_hash = ?", (content_hash,))
+        self.connection.executemany("INSERT OR REPLACE INTO applied_rules (content_hash, rule_name, rule_version) "
+                                    "VALUES (?, ?, ?)", [(content_hash, name, version) for name, version in rules])
+        self.add_pending(follow_up)
+
+    def get_leaves(self, content_hash: bytes, exclude_rules: Collection[bytes] = ()) -> List[bytes]:
+        """
+        Return the sorted leaves of the triplets of the content, except those generated only by the excluded rules.
+        """
+        return sorted({leaf for leaf, rule_name in self.connection.execute(
+            "SELECT leaf, rule_name FROM leaves WHERE content_hash = ?", (content_hash,))
+            if rule_name not in exclude_rules})
+
+    def set_leaves(self, content_hash: bytes, rule_names: Collection[bytes],
+                   leaves: Iterable[Tuple[bytes, bytes]]) -> None:
+        """
+        Replace the leaves of the rules with the (leaf, rule name) pairs.
+        """
+        self.connection.executemany("DELETE FROM leaves WHERE content_hash = ? AND rule_name = ?",
+                                    [(content_hash, rule_name) for rule_name in rule_names])
+        self.connection.executemany("INSERT OR IGNORE INTO leaves (content_hash, leaf, rule_name) VALUES (?, ?, ?)",
+                                    [(content_hash, leaf, rule_name) for leaf, rule_name in leaves])
+
+    def num_processed(self) -> int:
+        return self.connection.execute("SELECT COUNT(DISTINCT content_hash) FROM applied_rules").fetchone()[0]
+
+    def commit(self) -> None:
+        # Remove the parents without pending content
+        self.connection.execute("DELETE FROM parents WHERE content_hash NOT IN "
+                                "(SELECT parent_hash FROM pending WHERE parent_hash IS NOT NULL)")
+        self.connection.commit()
+
+    def close(self) -> None:
+        self.connection.commit()
+        self.connection.close()
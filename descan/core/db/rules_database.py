@@ -1,18 +1,40 @@
-from typing import Dict
+from typing import Dict, List, Optional
 
+from descan.core.content import ContentType
 from descan.core.rules.rule import Rule
 
 
 class RulesDatabase:
+    """
+    Keeps the rules, indexed by the content types they apply to.
+    """
 
     def __init__(self) -> None:
         self.rules: Dict[str, Rule] = {}
+        self.rules_by_type: Dict[ContentType, List[Rule]] = {}
+        self.untyped_rules: List[Rule] = []
 
     def add_rule(self, rule: Rule) -> None:
         self.rules[rule.get_name()] = rule
+        self._build_index()
 
     def get_rule(self, rule_name):
         return self.rules[rule_name] if rule_name in self.rules else None
 
     def get_all_rules(self):
         return self.rules.values()
+
+    def get_rules_for(self, content_type: Optional[ContentType]) -> List[Rule]:
+        """
+        Return the rules that apply to content of the given type. All rules apply to content without a type.
+        """
+        if content_type is None:
+            return list(self.rules.values())
+        return self.rules_by_type.get(content_type, self.untyped_rules)
+
+    def _build_index(self) -> None:
+        self.untyped_rules = [rule for rule in self.rules.values() if rule.CONTENT_TYPES is None]
+        self.rules_by_type = {}
+        for content_type in ContentType:
+            self.rules_by_type[content_type] = [rule for rule in self.rules.values()
+                                                if rule.CONTENT_TYPES is None or content_type in rule.CONTENT_TYPES]
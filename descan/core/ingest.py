@@ -0,0 +1,145 @@
+"""
+Streaming ingestion of content from dataset files.
+
+Content is read lazily from a file, one line at a time, and fed through bounded queues into the rule execution
+engine, whose callback stores the generated triplets. Reading is paused while the engine queue or the number of
+pending storage callbacks is above its limit, so memory stays bounded regardless of the size of the dataset.
+"""
+import json
+from asyncio import sleep
+from binascii import unhexlify
+from typing import AsyncIterable, AsyncIterator, Iterable, Iterator, Optional, TextIO, Union
+
+from descan.core.content import Content, ContentType
+from descan.core.db.content_database import ContentDatabase
+from descan.core.rule_execution_engine import RuleExecutionEngine
+
+
+def read_ethereum_blocks(lines: Iterable[str]) -> Iterator[Content]:
+    """
+    Parse Ethereum blocks, one JSON-encoded block per line.
+    """
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        block_json = json.loads(line)
+        yield Content(unhexlify(block_json["hash"][2:]), line.encode(), parsed=block_json,
+                      content_type=ContentType.ETHEREUM_BLOCK)
+
+
+def read_torrents(lines: Iterable[str]) -> Iterator[Content]:
+    """
+    Parse torrents, one tab-separated (infohash, name) pair per line.
+    """
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        parts = line.split("\t")
+        yield Content(unhexlify(parts[0]), parts[1].encode(), content_type=ContentType.TORRENT)
+
+
+async def follow_lines(file: TextIO, poll_interval: float = 1.0) -> AsyncIterator[str]:
+    """
+    Yield the complete lines of a growing file, like "tail -f". At the end of the file, wait for new lines.
+    """
+    partial = ""
+    while True:
+        line = file.readline()
+        if not line:
+            await sleep(poll_interval)
+            continue
+
+        partial += line
+        if partial.endswith("\n"):
+            yield partial
+            partial = ""
+
+
+class IngestPipeline:
+    """
+    Feeds content into the rule execution engine with backpressure.
+
+    Content that is already in the content database, or that has been processed by the engine before a restart, is
+    skipped. New content is added to the database and queued in the engine. While the engine queue holds max_queued
+    items or max_storing storage callbacks are in flight, the pipeline drains the engine itself (or waits for the
+    storage) before accepting more content.
+
+    The pipeline can be used by a simulation with a dataset file:
+    >>> with open("blocks.json") as blocks_file:
+    ...     await pipeline.run(read_ethereum_blocks(blocks_file))
+    ...     await pipeline.flush()
+
+    or by a node that tails a growing file:
+    >>> async def blocks(blocks_file):
+    ...     async for line in follow_lines(blocks_file):
+    ...         for content in read_ethereum_blocks([line]):
+    ...             yield content
+    >>> await pipeline.run(blocks(blocks_file))
+    """
+
+    def __init__(self, engine: RuleExecutionEngine, content_db: ContentDatabase, max_queued: int = 1000,
+                 max_storing: int = 100, poll_interval: float = 0.1) -> None:
+        self.engine = engine
+        self.content_db = content_db
+        self.max_queued = max_queued
+        self.max_storing = max_storing
+        self.poll_interval = poll_interval
+        self.ingested: int = 0
+        self.skipped: int = 0
+
+    def is_full(self) -> bool:
+        return self.engine.queue_depth >= self.max_queued or len(self.engine.pending_callbacks) >= self.max_storing
+
+    async def put(self, content: Content) -> bool:
+        """
+        Queue the content once there is capacity for it. Return False if the content is already known.
+        """
+        if self.content_db.has_content(content.identifier) or self.engine.is_known(content):
+            self.skipped += 1
+            return False
+
+        while self.is_full():
+            await self._make_progress()
+
+        self.content_db.add_content(content)
+        self.engine.enqueue(content)
+        self.ingested += 1
+        return True
+
+    async def run(self, contents: Union[Iterable[Content], AsyncIterable[Content]],
+                  limit: Optional[int] = None) -> int:
+        """
+        Queue the content from the (asynchronous) iterable, at most limit items. Return the number of queued items.
+        """
+        queued = 0
+        if limit is not None and limit <= 0:
+            return queued
+
+        # Stop as soon as the limit is reached, a followed file might not yield another line for a long time
+        if isinstance(contents, AsyncIterable):
+            async for content in contents:
+                queued += await self.put(content)
+                if limit is not None and queued >= limit:
+                    break
+        else:
+            for content in contents:
+                queued += await self.put(content)
+                if limit is not None and queued >= limit:
+                    break
+        return queued
+
+    async def flush(self) -> None:
+        """
+        Wait until all queued content has been processed and stored.
+        """
+        while self.engine.queue_depth or self.engine.pending_callbacks:
+            await self._make_progress()
+        self.engine.processed_db.commit()
+
+    async def _make_progress(self) -> None:
+        if self.engine.process_queue and len(self.engine.pending_callbacks) < self.max_storing:
+            await self.engine.drain()
+        else:
+            await sleep(self.poll_interval)  # Wait for the storage of the generated triplets
@@ -0,0 +1,229 @@
+"""
+Merkle commitments over the triplets that the rule execution engine generates for a content item.
+
+The leaves are the hashes of the triplets, in sorted order. The root is signed once by the key of the peer that
+generated the triplets, so a verifier checks one signature per content item instead of one per triplet. A single
+triplet can be verified against a signed root with a Merkle proof.
+
+A commitment covers all triplets of a content item at the time it is signed. When new or upgraded rules add
+triplets to an item, a new commitment is signed over the full set, and the new triplets are sent with their proofs.
+Peers keep the older commitments for the triplets they stored before, so each triplet is covered by the latest
+commitment that they know for it.
+
+The rules of a triplet are not part of its leaf, since peers merge the rules of equal triplets.
+"""
+import hashlib
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from ipv8.keyvault.crypto import default_eccrypto
+from ipv8.types import PrivateKey
+
+from descan.core.db.triplet import Triplet
+
+LEAF_PREFIX = b"\x00"
+NODE_PREFIX = b"\x01"
+
+# A proof is the list of (is_left, sibling hash) on the path from a leaf to the root
+Proof = List[Tuple[bool, bytes]]
+
+
+def hash_triplet(triplet: Triplet) -> bytes:
+    h = hashlib.sha256(LEAF_PREFIX)
+    for part in (triplet.head, triplet.relation, triplet.tail):
+        h.update(len(part).to_bytes(4, "big"))
+        h.update(part)
+    return h.digest()
+
+
+def hash_node(left: bytes, right: bytes) -> bytes:
+    return hashlib.sha256(NODE_PREFIX + left + right).digest()
+
+
+def get_leaves(triplets: Iterable[Triplet]) -> List[bytes]:
+    """
+    Return the sorted leaves of the triplets. Duplicate triplets result in a single leaf.
+    """
+    return sorted({hash_triplet(triplet) for triplet in triplets})
+
+
+def get_levels(leaves: List[bytes]) -> List[List[bytes]]:
+    """
+    Return the levels of the tree, from the leaves to the root. A node without sibling is moved up as is.
+    """
+    if not leaves:
+        return [[hashlib.sha256(LEAF_PREFIX).digest()]]
+
+    levels = [leaves]
+    while len(levels[-1]) > 1:
+        level = levels[-1]
+        levels.append([hash_node(level[ind], level[ind + 1]) if ind + 1 < len(level) else level[ind]
+                       for ind in range(0, len(level), 2)])
+    return levels
+
+
+def get_root(leaves: List[bytes]) -> bytes:
+    return get_levels(leaves)[-1][0]
+
+
+def get_proof_from_levels(levels: List[List[bytes]], index: int) -> Proof:
+    proof: Proof = []
+    for level in levels[:-1]:
+        sibling = index ^ 1
+        if sibling < len(level):
+            proof.append((sibling < index, level[sibling]))
+        index //= 2
+    return proof
+
+
+def get_proof(leaves: List[bytes], leaf: bytes) -> Proof:
+    """
+    Return the proof that the leaf is part of the tree of the (sorted) leaves.
+    """
+    return get_proof_from_levels(get_levels(leaves), leaves.index(leaf))
+
+
+def get_proofs(leaves: List[bytes]) -> Dict[bytes, Proof]:
+    """
+    Return the proofs of all leaves. The levels of the tree are computed once.
+    """
+    levels = get_levels(leaves)
+    return {leaf: get_proof_from_levels(levels, index) for index, leaf in enumerate(leaves)}
+
+
+def verify_proof(leaf: bytes, proof: Proof, root: bytes) -> bool:
+    node = leaf
+    for is_left, sibling in proof:
+        node = hash_node(sibling, node) if is_left else hash_node(node, sibling)
+    return node == root
+
+
+class TripletCommitment:
+    """
+    A signed Merkle root over all triplets of a content item.
+    """
+
+    def __init__(self, content_identifier: bytes, root: bytes, leaves_count: int, public_key: bytes,
+                 signature: bytes) -> None:
+        self.content_identifier: bytes = content_identifier
+        self.root: bytes = root
+        self.leaves_count: int = leaves_count
+        self.public_key: bytes = public_key
+        self.signature: bytes = signature
+
+    @staticmethod
+    def get_message(content_identifier: bytes, root: bytes, leaves_count: int) -> bytes:
+        return content_identifier + root + leaves_count.to_bytes(4, "big")
+
+    @staticmethod
+    def create(key: PrivateKey, content_identifier: bytes, triplets: Iterable[Triplet]) -> "TripletCommitment":
+        return TripletCommitment.create_from_leaves(key, content_identifier, get_leaves(triplets))
+
+    @staticmethod
+    def create_from_leaves(key: PrivateKey, content_identifier: bytes, leaves: List[bytes]) -> "TripletCommitment":
+        root = get_root(leaves)
+        signature = default_eccrypto.create_signature(
+            key, TripletCommitment.get_message(content_identifier, root, len(leaves)))
+        return TripletCommitment(content_identifier, root, len(leaves), key.pub().key_to_bin(), signature)
+
+    @property
+    def digest(self) -> bytes:
+        """
+        Identifies the signed commitment, including the signer and the signature.
+        """
+        return hashlib.sha256(self.get_message(self.content_identifier, self.root, self.leaves_count)
+                              + self.public_key + self.signature).digest()
+
+    def has_valid_signature(self) -> bool:
+        try:
+            public_key = default_eccrypto.key_from_public_bin(self.public_key)
+        except Exception:  # pylint: disable=broad-except
+            return False
+        message = self.get_message(self.content_identifier, self.root, self.leaves_count)
+        return bool(default_eccrypto.is_valid_signature(public_key, message, self.signature))
+
+
+class SignedTriplets:
+    """
+    The triplets of a commitment that are sent to another peer. If only part of the triplets is sent, each
+    triplet comes with a proof.
+    """
+
+    def __init__(self, commitment: TripletCommitment, triplets: List[Triplet],
+                 proofs: Optional[List[Proof]] = None) -> None:
+        self.commitment: TripletCommitment = commitment
+        self.triplets: List[Triplet] = triplets
+        self.proofs: Optional[List[Proof]] = proofs
+
+    def is_valid(self) -> bool:
+        """
+        Check the triplets against the root. The signature on the root is checked separately.
+        """
+        if self.proofs is None:
+            leaves = get_leaves(self.triplets)
+            return len(leaves) == self.commitment.leaves_count and get_root(leaves) == self.commitment.root
+
+        if len(self.proofs) != len(self.triplets):
+            return False
+        return all(verify_proof(hash_triplet(triplet), proof, self.commitment.root)
+                   for triplet, proof in zip(self.triplets, self.proofs))
+
+
+def sign_triplets(key: PrivateKey, content_identifier: bytes, triplets: List[Triplet],
+                  leaves: Iterable[bytes] = ()) -> SignedTriplets:
+    """
+    Sign a commitment over the triplets and the leaves of the other triplets of the content. Return the triplets with
+    the commitment, and with their proofs if they are only part of it.
+    """
+    new_leaves = get_leaves(triplets)
+    all_leaves = sorted(set(leaves).union(new_leaves))
+    commitment = TripletCommitment.create_from_leaves(key, content_identifier, all_leaves)
+    if len(new_leaves) == len(all_leaves):
+        return SignedTriplets(commitment, triplets)
+
+    proofs = get_proofs(all_leaves)
+    return SignedTriplets(commitment, triplets, [proofs[hash_triplet(triplet)] for triplet in triplets])
+
+
+class CommitmentVerifier:
+    """
+    Verifies the received triplets in batches. Each batch is checked against the roots first, after which the
+    signature of each distinct root is checked once. Valid signatures are remembered, since the same commitment
+    is received from every replica.
+    """
+
+    def __init__(self, cache_size: int = 10000) -> None:
+        self.cache_size = cache_size
+        self.verified: OrderedDict[bytes, None] = OrderedDict()
+
+    def verify(self, batch: Iterable[SignedTriplets]) -> Tuple[List[SignedTriplets], List[SignedTriplets]]:
+        """
+        Return the valid and the invalid signed triplets in the batch.
+        """
+        valid, invalid = [], []
+        signatures: Dict[bytes, bool] = {}
+        for signed_triplets in batch:
+            if not signed_triplets.is_valid():
+                invalid.append(signed_triplets)
+                continue
+
+            commitment = signed_triplets.commitment
+            digest = commitment.digest
+            if digest not in signatures:
+                signatures[digest] = self.has_valid_signature(commitment)
+            (valid if signatures[digest] else invalid).append(signed_triplets)
+        return valid, invalid
+
+    def has_valid_signature(self, commitment: TripletCommitment) -> bool:
+        digest = commitment.digest
+        if digest in self.verified:
+            self.verified.move_to_end(digest)
+            return True
+
+        if not commitment.has_valid_signature():
+            return False
+
+        self.verified[digest] = None
+        if len(self.verified) > self.cache_size:
+            self.verified.popitem(last=False)
+        return True
@@ -1,50 +1,335 @@
+import logging
 import random
-from asyncio import ensure_future
-from typing import List, Callable
+import time
+from asyncio import Future, ensure_future, gather, get_running_loop, sleep
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Deque, Iterable, Iterator, List, Callable, Optional, Set, Tuple
 
 from descan.core.content import Content
+from descan.core.db.processed_database import ProcessedDatabase
+from descan.core.db.triplet import Triplet
+from descan.core.merkle import SignedTriplets, hash_triplet, sign_triplets
 
+from ipv8.keyvault.crypto import default_eccrypto
 from ipv8.taskmanager import TaskManager
 from ipv8.types import PrivateKey
 from ipv8.util import maybe_coroutine
 
 
+class RuleContext:
+    """
+    Stands in for the engine when rules are applied in a worker process. It collects the content that the rules
+    add to the process queue, which is then queued in the engine.
+    """
+
+    def __init__(self) -> None:
+        self.process_queue: List[Content] = []
+
+
+def apply_rules(rules: Iterable, engine, content: Content) -> List[Triplet]:
+    """
+    Apply the rules to the content, if they apply to it.
+    """
+    triplets = []
+    for rule in rules:
+        if not rule.applies_to(content):
+            continue
+        rule_triplets = rule.apply_rule(engine, content)
+        for triplet in rule_triplets:
+            triplet.add_rule(rule.RULE_NAME)
+        triplets += rule_triplets
+    return triplets
+
+
+def apply_rules_to_batch(batch: List[Tuple[Content, List, List[bytes]]], key: Optional[bytes] = None) \
+        -> List[Tuple[List[Triplet], List[Content], Optional[SignedTriplets]]]:
+    """
+    Apply the rules to a batch of (content, rules, leaves of the other triplets) in a worker process. If the (private)
+    key is given, the triplets are signed as well. Return the generated triplets, the follow-up content and the signed
+    triplets (or None) for each content item.
+    """
+    private_key = default_eccrypto.key_from_private_bin(key) if key else None
+    results = []
+    for content, rules, leaves in batch:
+        context = RuleContext()
+        triplets = apply_rules(rules, context, content)
+        signed_triplets = sign_triplets(private_key, content.identifier, triplets, leaves) \
+            if private_key and triplets else None
+        results.append((triplets, context.process_queue, signed_triplets))
+    return results
+
+
 class RuleExecutionEngine(TaskManager):
+    """
+    Applies the rules to queued content.
+
+    Each tick, the queue is drained in batches of batch_size items until it is empty or the time_budget (in seconds)
+    of the tick is used up. The event loop gets control between batches, so networking is not starved by ingest.
+
+    If workers is set, the batches are processed by a pool of worker processes instead of the event loop thread,
+    so CPU-bound rules use all cores. The rules and the content should be picklable in this mode.
+
+    Once the rules have been applied to a content item, its parsed representation is dropped, since the content
+    database keeps the content for the lifetime of the node.
 
-    def __init__(self, content_db, rules_db, key: PrivateKey, callback: Callable):
+    The rules (and their versions) that have been applied to each content item, and the queue, are tracked in the
+    processed database, which is committed after each batch. A content item is only marked as processed once the
+    callback for its triplets has completed, so the triplets are generated again after a crash or a failed callback.
+    Only the new or upgraded rules are applied to a content item, so the callback receives the delta triplets.
+    On start, only the content with such rules is queued.
+    When rules are added or upgraded at runtime, the backfill queues the existing content in throttled batches.
+
+    If the engine has a key, all triplets of a content item (including those of earlier runs) are committed to with
+    a signed Merkle root, which is signed in the worker processes if they are used. Only the leaves of the triplets
+    are kept in the processed database. The callback is invoked with the content, the new triplets and the signed
+    triplets (or None), which carry proofs if the new triplets are only part of the commitment.
+    """
+
+    # The number of (time, processed count) samples that are used to compute the throughput
+    THROUGHPUT_SAMPLES = 10
+
+    def __init__(self, content_db, rules_db, key: Optional[PrivateKey], callback: Callable,
+                 time_budget: float = 0.05, batch_size: int = 10, workers: int = 0,
+                 processed_db: Optional[ProcessedDatabase] = None):
         super().__init__()
         self.content_db = content_db
         self.rules_db = rules_db
         self.key = key
         self.process_queue: List[Content] = []
         self.callback: Callable = callback
+        self.time_budget: float = time_budget
+        self.batch_size: int = batch_size
+        self.workers: int = workers
+        self.executor: Optional[ProcessPoolExecutor] = None
+        self.processed_count: int = 0
+        self.throughput_samples: Deque[Tuple[float, int]] = deque(maxlen=self.THROUGHPUT_SAMPLES)
+        # The callbacks (e.g., storing the generated triplets) that have not finished yet, and their content
+        self.pending_callbacks: Set[Future] = set()
+        self.storing: Set[bytes] = set()
+        self.processed_db: ProcessedDatabase = processed_db or ProcessedDatabase()
+        self.backfill_content: Optional[Iterator[Content]] = None
+        # The identifiers of the backfilled content that has not been processed yet
+        self.backfill_batch: Set[bytes] = set()
+        self.logger = logging.getLogger(self.__class__.__name__)
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self.process_queue)
+
+    @property
+    def throughput(self) -> float:
+        """
+        The number of content items processed per second over the last ticks.
+        """
+        if len(self.throughput_samples) < 2:
+            return 0
+        (first_time, first_count), (last_time, last_count) = self.throughput_samples[0], self.throughput_samples[-1]
+        if last_time <= first_time:
+            return 0
+        return (last_count - first_count) / (last_time - first_time)
+
+    def get_pending_rules(self, content: Content) -> List:
+        """
+        Return the rules for this content that have not been applied to it yet, or in an older version.
+        """
+        applied_rules = self.processed_db.get_applied_rules(content.identifier)
+        return [rule for rule in self.rules_db.get_rules_for(content.content_type)
+                if applied_rules.get(rule.get_name()) != rule.RULE_VERSION]
+
+    def is_processed(self, content: Content) -> bool:
+        return content.identifier in self.storing or not self.get_pending_rules(content)
+
+    def is_known(self, content: Content) -> bool:
+        """
+        Whether rules have been applied to the content before, e.g., before a restart.
+        """
+        return self.processed_db.has_applied_rules(content.identifier)
+
+    def enqueue(self, content: Content):
+        self.process_queue.append(content)
+        self.processed_db.add_pending([content])
+
+    def start(self, process_interval: float = 0.1):
+        # Resume the queue of the previous run, and queue the existing content that has not been processed yet
+        queued: Set[bytes] = set()
+        for content in self.processed_db.get_pending():
+            self.process_queue.append(content)
+            queued.add(content.identifier)
 
-    def start(self, process_interval: float = 1):
-        # Put existing content in the process queue
         all_content = self.content_db.get_all_content()
         random.shuffle(all_content)
         for content in all_content:
-            self.process_queue.append(content)
+            if content.identifier not in queued and not self.is_processed(content):
+                self.enqueue(content)
+        self.processed_db.commit()
+
+        self.throughput_samples.append((time.monotonic(), self.processed_count))
+        self.register_task("process", self.drain, interval=process_interval)
+
+    def start_backfill(self, interval: float = 1.0, batch_size: int = 100):
+        """
+        Apply new or upgraded rules to the existing content. Each interval, a batch of content is queued, once the
+        previous batch has been processed.
+        """
+        self.backfill_content = iter(self.content_db.get_all_content())
+        self.backfill_batch.clear()
+        self.replace_task("backfill", self.backfill, batch_size, interval=interval)
+
+    def backfill(self, batch_size: int = 100) -> int:
+        """
+        Queue the next batch of existing content that has pending rules, once the previous batch has been processed.
+        Return the number of queued items.
+        """
+        if self.backfill_content is None or self.backfill_batch:
+            return 0
+
+        queued = 0
+        for content in self.backfill_content:
+            if not self.is_processed(content):
+                self.enqueue(content)
+                self.backfill_batch.add(content.identifier)
+                queued += 1
+                if queued >= batch_size:
+                    return queued
 
-        self.register_task("process", self.process, interval=process_interval)
+        # All existing content has been visited
+        self.backfill_content = None
+        if self.is_pending_task_active("backfill"):
+            self.cancel_pending_task("backfill")
+        return queued
 
     def shutdown(self):
         self.cancel_all_pending_tasks()
+        self.processed_db.commit()
+        if self.executor:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+
+    async def drain(self):
+        """
+        Process queued content in batches until the queue is empty or the time budget of this tick is used up.
+        """
+        deadline = time.monotonic() + self.time_budget
+        while self.process_queue:
+            if self.workers:
+                await self.process_in_workers()
+            else:
+                for _ in range(min(self.batch_size, len(self.process_queue))):
+                    self.process()
+            self.processed_db.commit()
+
+            if time.monotonic() >= deadline:
+                break
+            await sleep(0)  # Let the message handlers run between batches
+
+        # Commit the content that has been marked as processed by the callbacks since the last batch
+        self.processed_db.commit()
+        self.throughput_samples.append((time.monotonic(), self.processed_count))
 
     def process(self):
-        # Take one item from the queue and apply the rules
+        # Take one item from the queue and apply the rules that have not been applied to it yet
         if not self.process_queue:
             return
 
         content = self.process_queue.pop()
-        triplets = []
-        for rule in self.rules_db.get_all_rules():
-            rule_triplets = rule.apply_rule(self, content)
-            for triplet in rule_triplets:
-                triplet.add_rule(rule.RULE_NAME)
-            triplets += rule_triplets
+        self.backfill_batch.discard(content.identifier)
+        rules = self.get_pending_rules(content)
+        if not rules:
+            self.processed_db.mark_processed(content.identifier, [])
+            content.release_parsed()
+            return
+
+        queue_depth = len(self.process_queue)
+        triplets = apply_rules(rules, self, content)
+        self.processed_count += 1
+        self.processed_db.add_pending(self.process_queue[queue_depth:])
+        content.release_parsed()
 
-        # TODO we should probably create a Merkle root hash here
+        # Invoke the callback with the new rules, which marks the content as processed when it has completed
+        self.invoke_callback(content, triplets, rules, self.commit(content, triplets, rules))
 
-        # Invoke the callback with the new rules
-        ensure_future(maybe_coroutine(self.callback, content, triplets))
+    async def process_in_workers(self):
+        """
+        Send a batch to each worker process and handle the results on the event loop.
+        """
+        if not self.executor:
+            self.executor = ProcessPoolExecutor(max_workers=self.workers)
+
+        batches = []
+        key = self.key.key_to_bin() if self.key else None
+        while self.process_queue and len(batches) < self.workers:
+            batch_size = min(self.batch_size, len(self.process_queue))
+            batch = []
+            for content in [self.process_queue.pop() for _ in range(batch_size)]:
+                self.backfill_batch.discard(content.identifier)
+                rules = self.get_pending_rules(content)
+                if rules:
+                    batch.append((content, rules, self.get_other_leaves(content, rules) if key else []))
+                else:
+                    self.processed_db.mark_processed(content.identifier, [])
+                    content.release_parsed()
+            batches.append(batch)
+
+        loop = get_running_loop()
+        batch_results = await gather(*[loop.run_in_executor(self.executor, apply_rules_to_batch, batch, key)
+                                       for batch in batches])
+
+        for batch, results in zip(batches, batch_results):
+            for (content, rules, _), (triplets, follow_up_content, signed_triplets) in zip(batch, results):
+                # The follow-up content of a rule refers to the content it was applied to, which is not pickled
+                for follow_up in follow_up_content:
+                    if follow_up.parent_key is not None and follow_up.parent is None:
+                        follow_up.parent = content
+                self.process_queue += follow_up_content
+                self.processed_count += 1
+                self.processed_db.add_pending(follow_up_content)
+                content.release_parsed()
+                if key:
+                    self.store_leaves(content, triplets, rules)
+                self.invoke_callback(content, triplets, rules, signed_triplets)
+
+    def commit(self, content: Content, triplets: List[Triplet], rules: List) -> Optional[SignedTriplets]:
+        """
+        Sign a Merkle root over all triplets of the content, so they can be verified with a single signature.
+        The triplets of the applied rules replace those of their earlier versions. Return the new triplets with the
+        commitment, and with their proofs if they are only part of it.
+        """
+        if not self.key:
+            return None
+
+        leaves = self.get_other_leaves(content, rules)
+        self.store_leaves(content, triplets, rules)
+        return sign_triplets(self.key, content.identifier, triplets, leaves) if triplets else None
+
+    def get_other_leaves(self, content: Content, rules: List) -> List[bytes]:
+        """
+        Return the leaves of the triplets of the content that have not been generated by the rules.
+        """
+        return self.processed_db.get_leaves(content.identifier, exclude_rules={rule.get_name() for rule in rules})
+
+    def store_leaves(self, content: Content, triplets: List[Triplet], rules: List):
+        rule_names = {rule.get_name() for rule in rules}
+        self.processed_db.set_leaves(content.identifier, rule_names,
+                                     [(hash_triplet(triplet), rule_name) for triplet in triplets
+                                      for rule_name in triplet.rules if rule_name in rule_names])
+
+    def invoke_callback(self, content: Content, triplets: List[Triplet], rules: List,
+                        signed_triplets: Optional[SignedTriplets]):
+        future = ensure_future(maybe_coroutine(self.callback, content, triplets, signed_triplets))
+        self.pending_callbacks.add(future)
+        self.storing.add(content.identifier)
+        future.add_done_callback(lambda f: self.on_callback_done(content, rules, f))
+
+    def on_callback_done(self, content: Content, rules: List, future: Future):
+        """
+        Mark the content as processed, unless the callback has failed. Content that is not marked stays pending in the
+        processed database, so it is processed again after a restart.
+        """
+        self.pending_callbacks.discard(future)
+        self.storing.discard(content.identifier)
+        if future.cancelled() or future.exception():
+            self.logger.warning("Callback for content %s has not completed: %s", content.identifier.hex(),
+                                "cancelled" if future.cancelled() else future.exception())
+            return
+        self.processed_db.mark_processed(content.identifier, [(rule.get_name(), rule.RULE_VERSION) for rule in rules])
@@ -1,10 +1,9 @@
-import json
 from binascii import unhexlify
 from typing import Set
 
 from eth_utils import to_bytes
 
-from descan.core.content import Content
+from descan.core.content import Content, ContentType
 from descan.core.db.triplet import Triplet
 from descan.core.rule_execution_engine import RuleExecutionEngine
 from descan.core.rules.rule import Rule
@@ -12,13 +11,14 @@ from descan.core.rules.rule import Rule
 
 class EthereumBlockRule(Rule):
     RULE_NAME = b"ETHBLK"
+    CONTENT_TYPES = {ContentType.ETHEREUM_BLOCK}
+
+    def applies_to(self, content: Content) -> bool:
+        return "miner" in content.parsed  # Otherwise, this doesn't seem to be a block
 
     def apply_rule(self, engine: RuleExecutionEngine, content: Content) -> Set[Triplet]:
         triplets = set()
-        block_json = json.loads(content.data)
-        if "miner" not in block_json:
-            return set()  # This doesn't seem to be a block
-
+        block_json = content.parsed
         for key, value in block_json.items():  # Parse the main block attributes
             if key == "hash" or key == "transactions":
                 continue
@@ -27,24 +27,25 @@ class EthereumBlockRule(Rule):
 
             triplets.add(Triplet(content.identifier, Rule.convert_to_bytes(key), Rule.convert_to_bytes(value)))
 
-        # We now parse all the transactions and add them as new content items to the rule execution engine
-        for transaction in block_json["transactions"]:
+        # We now add all the transactions as new, already parsed content items to the rule execution engine
+        for index, transaction in enumerate(block_json["transactions"]):
             tx_hash = unhexlify(transaction["hash"][2:])
-            content = Content(tx_hash, json.dumps(transaction).encode())
-            engine.process_queue.append(content)
+            engine.process_queue.append(Content.from_parent(tx_hash, content, "transactions", index,
+                                                            ContentType.ETHEREUM_TRANSACTION))
 
         return triplets
 
 
 class EthereumTransactionRule(Rule):
     RULE_NAME = b"ETHTX"
+    CONTENT_TYPES = {ContentType.ETHEREUM_TRANSACTION}
+
+    def applies_to(self, content: Content) -> bool:
+        return "from" in content.parsed  # Otherwise, this doesn't seem to be a transaction
 
     def apply_rule(self, engine: RuleExecutionEngine, content: Content) -> Set[Triplet]:
         triplets = set()
-        tx_json = json.loads(content.data)
-        if "from" not in tx_json:
-            return set()  # This doesn't seem to be a transaction
-
+        tx_json = content.parsed
         for key, value in tx_json.items():  # Parse the main tx attributes
             if key == "hash" or key == "accessList" or key == "input":
                 continue
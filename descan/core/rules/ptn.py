@@ -1,7 +1,7 @@
 from typing import Set
 
 from descan.core.db.triplet import Triplet
-from descan.core.content import Content
+from descan.core.content import Content, ContentType
 from descan.core.rule_execution_engine import RuleExecutionEngine
 from descan.core.rules.rule import Rule
 
@@ -10,6 +10,7 @@ import PTN
 
 class PTNRule(Rule):
     RULE_NAME = b"PTN"
+    CONTENT_TYPES = {ContentType.TORRENT}
 
     def apply_rule(self, engine: RuleExecutionEngine, content: Content) -> Set[Triplet]:
         metadata = PTN.parse(content.data.decode())
@@ -1,14 +1,26 @@
 from abc import ABC, abstractmethod
-from typing import Set, Any
+from typing import Optional, Set, Any
 
 from descan.core.db.triplet import Triplet
-from descan.core.content import Content
+from descan.core.content import Content, ContentType
 from descan.core.rule_execution_engine import RuleExecutionEngine
 
 
 class Rule(ABC):
     RULE_NAME = None
 
+    # Increase the version when the rule changes, so it is applied again to the existing content
+    RULE_VERSION: int = 1
+
+    # The types of content this rule applies to. If not set, the rule is applied to content of any type.
+    CONTENT_TYPES: Optional[Set[ContentType]] = None
+
+    def applies_to(self, content: Content) -> bool:
+        """
+        A cheap check whether this rule should be applied to a piece of content, e.g., whether it has the expected form.
+        """
+        return True
+
     @abstractmethod
     def apply_rule(self, engine: RuleExecutionEngine, content: Content) -> Set[Triplet]:
         """
@@ -0,0 +1,211 @@
+"""
+A compact encoding of triplets that are sent between peers.
+
+Triplets are grouped by their head, since the triplets of a search response or of a storage request usually share
+the same head. Relations and rules come from a small vocabulary, so they are sent once in a dictionary and
+referenced by their index. All numbers are unsigned LEB128 varints.
+
+The layout (version 1):
+    version
+    relations count, (length, relation)*
+    rules count, (length, rule)*
+    heads count, (length, head, edges count, (relation index, length, tail, rules count, rule index*)*)*
+
+Signed triplets (version 2) carry the unsigned triplets and groups of triplets with their signed Merkle commitment
+(see merkle.py), both in the version 1 layout. The proofs of a group are only included when it is incomplete:
+    version
+    length, unsigned triplets
+    groups count, (length, content identifier, length, root, leaves count, length, public key, length, signature,
+                   length, triplets, has proofs, (proof length, (is left, length, hash)*)*)*
+"""
+from typing import Dict, List, Tuple
+
+from descan.core.db.triplet import Triplet
+from descan.core.merkle import Proof, SignedTriplets, TripletCommitment
+
+COMPACT_TRIPLETS_VERSION = 1
+SIGNED_TRIPLETS_VERSION = 2
+
+
+def write_varint(out: bytearray, value: int) -> None:
+    if value < 0:
+        raise ValueError("Negative varint: %d" % value)
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def read_varint(data: bytes, offset: int) -> Tuple[int, int]:
+    """
+    Read a varint at the offset. Return the value and the offset after it.
+    """
+    value = 0
+    shift = 0
+    while True:
+        if offset >= len(data):
+            raise ValueError("Truncated varint")
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return value, offset
+        shift += 7
+        if shift > 63:
+            raise ValueError("Varint is too long")
+
+
+def write_bytes(out: bytearray, value: bytes) -> None:
+    write_varint(out, len(value))
+    out += value
+
+
+def read_bytes(data: bytes, offset: int) -> Tuple[bytes, int]:
+    length, offset = read_varint(data, offset)
+    if offset + length > len(data):
+        raise ValueError("Truncated bytes")
+    return data[offset:offset + length], offset + length
+
+
+def _index(vocabulary: Dict[bytes, int], value: bytes) -> int:
+    if value not in vocabulary:
+        vocabulary[value] = len(vocabulary)
+    return vocabulary[value]
+
+
+def pack_triplets(triplets: List[Triplet]) -> bytes:
+    relations: Dict[bytes, int] = {}
+    rules: Dict[bytes, int] = {}
+    heads: Dict[bytes, List[Triplet]] = {}
+    for triplet in triplets:
+        _index(relations, triplet.relation)
+        for rule in triplet.rules:
+            _index(rules, rule)
+        heads.setdefault(triplet.head, []).append(triplet)
+
+    out = bytearray([COMPACT_TRIPLETS_VERSION])
+    for vocabulary in (relations, rules):
+        write_varint(out, len(vocabulary))
+        for value in vocabulary:
+            write_bytes(out, value)
+
+    write_varint(out, len(heads))
+    for head, head_triplets in heads.items():
+        write_bytes(out, head)
+        write_varint(out, len(head_triplets))
+        for triplet in head_triplets:
+            write_varint(out, relations[triplet.relation])
+            write_bytes(out, triplet.tail)
+            write_varint(out, len(triplet.rules))
+            for rule in triplet.rules:
+                write_varint(out, rules[rule])
+
+    return bytes(out)
+
+
+def unpack_triplets(data: bytes) -> List[Triplet]:
+    """
+    Decode triplets that have been encoded by pack_triplets. Raise a ValueError if the data is malformed.
+    """
+    if not data:
+        raise ValueError("Empty triplets data")
+    if data[0] != COMPACT_TRIPLETS_VERSION:
+        raise ValueError("Unsupported triplets encoding version: %d" % data[0])
+
+    offset = 1
+    vocabularies: List[List[bytes]] = []
+    for _ in range(2):
+        count, offset = read_varint(data, offset)
+        vocabulary = []
+        for _ in range(count):
+            value, offset = read_bytes(data, offset)
+            vocabulary.append(value)
+        vocabularies.append(vocabulary)
+    relations, rules = vocabularies
+
+    try:
+        triplets: List[Triplet] = []
+        heads_count, offset = read_varint(data, offset)
+        for _ in range(heads_count):
+            head, offset = read_bytes(data, offset)
+            edges_count, offset = read_varint(data, offset)
+            for _ in range(edges_count):
+                relation_index, offset = read_varint(data, offset)
+                tail, offset = read_bytes(data, offset)
+                triplet = Triplet(head, relations[relation_index], tail)
+                rules_count, offset = read_varint(data, offset)
+                for _ in range(rules_count):
+                    rule_index, offset = read_varint(data, offset)
+                    triplet.add_rule(rules[rule_index])
+                triplets.append(triplet)
+    except IndexError as e:
+        raise ValueError("Unknown dictionary index") from e
+
+    if offset != len(data):
+        raise ValueError("Unexpected data after the triplets")
+    return triplets
+
+
+def pack_signed_triplets(unsigned_triplets: List[Triplet], groups: List[SignedTriplets]) -> bytes:
+    out = bytearray([SIGNED_TRIPLETS_VERSION])
+    write_bytes(out, pack_triplets(unsigned_triplets))
+    write_varint(out, len(groups))
+    for group in groups:
+        commitment = group.commitment
+        write_bytes(out, commitment.content_identifier)
+        write_bytes(out, commitment.root)
+        write_varint(out, commitment.leaves_count)
+        write_bytes(out, commitment.public_key)
+        write_bytes(out, commitment.signature)
+        write_bytes(out, pack_triplets(group.triplets))
+        write_varint(out, group.proofs is not None)
+        for proof in group.proofs or []:
+            write_varint(out, len(proof))
+            for is_left, sibling in proof:
+                write_varint(out, is_left)
+                write_bytes(out, sibling)
+    return bytes(out)
+
+
+def unpack_signed_triplets(data: bytes) -> Tuple[List[Triplet], List[SignedTriplets]]:
+    """
+    Decode the triplets that have been encoded by pack_signed_triplets. Return the unsigned triplets and the
+    groups of signed triplets, which still have to be verified. Raise a ValueError if the data is malformed.
+    """
+    if not data:
+        raise ValueError("Empty triplets data")
+    if data[0] != SIGNED_TRIPLETS_VERSION:
+        raise ValueError("Unsupported triplets encoding version: %d" % data[0])
+
+    unsigned_data, offset = read_bytes(data, 1)
+    unsigned_triplets = unpack_triplets(unsigned_data)
+
+    groups: List[SignedTriplets] = []
+    groups_count, offset = read_varint(data, offset)
+    for _ in range(groups_count):
+        content_identifier, offset = read_bytes(data, offset)
+        root, offset = read_bytes(data, offset)
+        leaves_count, offset = read_varint(data, offset)
+        public_key, offset = read_bytes(data, offset)
+        signature, offset = read_bytes(data, offset)
+        commitment = TripletCommitment(content_identifier, root, leaves_count, public_key, signature)
+
+        triplets_data, offset = read_bytes(data, offset)
+        triplets = unpack_triplets(triplets_data)
+        has_proofs, offset = read_varint(data, offset)
+        proofs = None
+        if has_proofs:
+            proofs = []
+            for _ in triplets:
+                proof: Proof = []
+                proof_length, offset = read_varint(data, offset)
+                for _ in range(proof_length):
+                    is_left, offset = read_varint(data, offset)
+                    sibling, offset = read_bytes(data, offset)
+                    proof.append((bool(is_left), sibling))
+                proofs.append(proof)
+        groups.append(SignedTriplets(commitment, triplets, proofs))
+
+    if offset != len(data):
+        raise ValueError("Unexpected data after the triplets")
+    return unsigned_triplets, groups
@@ -1,10 +1,12 @@
-from typing import Callable, Coroutine
+from typing import Callable, Coroutine, Optional
 
 from ipv8.types import Peer
 
 from descan.eva.exceptions import TransferException
 from descan.eva.result import TransferResult
+from descan.eva.sink import TransferSink
 
 TransferCompleteCallback = Callable[[TransferResult], Coroutine]
 TransferErrorCallback = Callable[[Peer, TransferException], Coroutine]
 TransferRequestCallback = Callable[[Peer, bytes], Coroutine]
+TransferSinkFactory = Callable[[Peer, bytes, int], Optional[TransferSink]]
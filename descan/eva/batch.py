@@ -0,0 +1,49 @@
+from __future__ import annotations
+
+import struct
+from enum import IntEnum
+from typing import List, Tuple, Union
+
+from descan.eva.exceptions import ValueException
+
+# An entry header: the info size and the data size
+ENTRY_HEADER = struct.Struct('>II')
+
+
+class TransferKind(IntEnum):
+    """A kind of the data of a write transfer. The values are sent in `WriteRequest`.
+
+    Don't change existing numbers.
+    """
+    SINGLE = 0
+    # The data is a sequence of framed entries (see `pack_batch`), each of them is received separately
+    BATCH = 1
+
+
+def pack_batch(entries: List[Tuple[bytes, Union[bytes, memoryview]]]) -> bytes:
+    """Pack (info, data) entries into a single binary"""
+    chunks = []
+    for info, data in entries:
+        chunks.append(ENTRY_HEADER.pack(len(info), len(data)))
+        chunks.append(info)
+        chunks.append(data)
+    return b''.join(chunks)
+
+
+def unpack_batch(batch: Union[bytes, memoryview]) -> List[Tuple[bytes, memoryview]]:
+    """Unpack the entries of the batch. The data of the entries are views of the batch"""
+    view = memoryview(batch)
+    entries = []
+    position = 0
+    while position < len(view):
+        if position + ENTRY_HEADER.size > len(view):
+            raise ValueException('The batch entry header is truncated')
+        info_size, data_size = ENTRY_HEADER.unpack_from(view, position)
+        position += ENTRY_HEADER.size
+
+        end = position + info_size + data_size
+        if end > len(view):
+            raise ValueException('The batch entry is truncated')
+        entries.append((bytes(view[position:position + info_size]), view[position + info_size:end]))
+        position = end
+    return entries
@@ -0,0 +1,33 @@
+from __future__ import annotations
+
+import logging
+
+
+class MemoryBudget:
+    """Accounts the memory that is reserved by incoming transfers buffered in memory.
+
+    A transfer reserves its data size before it is started and releases the reservation
+    when it is finished. Write requests that do not fit into the budget are rejected with
+    `BackpressureException`, and the sender retries them later.
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self.used = 0
+        self.logger = logging.getLogger(self.__class__.__name__)
+
+    @property
+    def available(self) -> int:
+        return max(self.size - self.used, 0)
+
+    def reserve(self, size: int) -> bool:
+        """Reserve `size` bytes. Return False if the budget is exceeded"""
+        if size > self.available:
+            self.logger.debug(f'Budget exceeded. Requested: {size}. Available: {self.available}')
+            return False
+
+        self.used += size
+        return True
+
+    def release(self, size: int):
+        self.used = max(self.used - size, 0)
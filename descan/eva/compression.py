@@ -0,0 +1,96 @@
+from __future__ import annotations
+
+import bz2
+import lzma
+import zlib
+from enum import IntEnum
+from typing import Union
+
+from descan.eva.exceptions import CompressionException, SizeException
+from descan.eva.settings import Compression
+
+
+class Codec(IntEnum):
+    """Compression codecs that can be used for a transfer. The values are sent in `WriteRequest`.
+
+    Don't change existing numbers.
+    """
+    NONE = 0
+    ZLIB = 1
+    BZ2 = 2
+    LZMA = 3
+
+
+def compress(codec: Codec, data: Union[bytes, memoryview], level: int = 6) -> bytes:
+    if codec == Codec.ZLIB:
+        return zlib.compress(data, level)
+    if codec == Codec.BZ2:
+        return bz2.compress(data, max(level, 1))
+    if codec == Codec.LZMA:
+        return lzma.compress(data, preset=level)
+    return bytes(data)
+
+
+def choose_codec(data: Union[bytes, memoryview], settings: Compression) -> Codec:
+    """Choose a codec for the data.
+
+    Small data is sent as is. For the rest, a prefix of the data is compressed with the fastest
+    zlib level, and the configured codec is used only if the prefix shrinks enough.
+    """
+    if not settings.enabled or len(data) < settings.min_size:
+        return Codec.NONE
+
+    probe = data[:settings.probe_size]
+    ratio = len(zlib.compress(probe, 1)) / len(probe)
+    if ratio > settings.max_ratio:
+        return Codec.NONE
+
+    return Codec(settings.codec)
+
+
+class Decompressor:
+    """Incremental decompressor that limits the size of the decompressed data.
+
+    The limit protects the receiver from "decompression bombs": the data size in `WriteRequest`
+    is the compressed size, so the decompressed size is checked while decompressing.
+    """
+
+    def __init__(self, codec: Codec, size_limit: int):
+        self.codec = codec
+        self.size_limit = size_limit
+        self.size = 0
+
+        if codec == Codec.ZLIB:
+            self.decompressor = zlib.decompressobj()
+        elif codec == Codec.BZ2:
+            self.decompressor = bz2.BZ2Decompressor()
+        elif codec == Codec.LZMA:
+            self.decompressor = lzma.LZMADecompressor()
+        else:
+            raise CompressionException(f'Unknown codec: {codec}')
+
+    def decompress(self, chunk: Union[bytes, memoryview]) -> bytes:
+        """Decompress the next chunk of the data"""
+        if not chunk:
+            return b''
+        if self.decompressor.eof:
+            raise CompressionException('Unexpected data after the end of the compressed stream')
+
+        # Asking for one byte more than allowed reveals that the limit has been exceeded
+        # without decompressing the rest of the chunk
+        max_length = self.size_limit - self.size + 1
+        try:
+            result = self.decompressor.decompress(chunk, max_length)
+        except (zlib.error, OSError, EOFError, lzma.LZMAError) as e:
+            raise CompressionException(f'Decompression error: {e}') from e
+
+        self.size += len(result)
+        if self.size > self.size_limit:
+            raise SizeException(f'Decompressed data size limit has been exceeded: {self.size_limit}')
+
+        return result
+
+    def finish(self):
+        """Check that the whole compressed stream has been received"""
+        if not self.decompressor.eof:
+            raise CompressionException('The compressed stream is truncated')
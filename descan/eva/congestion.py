@@ -0,0 +1,81 @@
+from __future__ import annotations
+
+import logging
+from typing import Optional
+
+from descan.eva.settings import EVASettings
+
+
+class CongestionController:
+    """AIMD congestion controller with slow start.
+
+    The controller is shared by all incoming transfers from a single peer. It is driven by
+    the receiver: the time between sending an acknowledgement and completing the requested
+    window is used as a round trip time sample, and a retransmission of an acknowledgement
+    is considered as a loss.
+
+    While in slow start, the window is doubled for each completed window. After the first
+    loss, the window grows by one block per completed window and is decreased
+    multiplicatively on each loss.
+    """
+
+    def __init__(self, settings: EVASettings):
+        self.settings = settings
+        self.logger = logging.getLogger(self.__class__.__name__)
+
+        control = settings.congestion_control
+        self.window_size: int = control.initial_window_size
+        self.slow_start_threshold: int = control.max_window_size
+
+        self.smoothed_rtt: Optional[float] = None
+        self.rtt_variance: float = 0
+        self.backoff: int = 1
+
+    @property
+    def retransmission_interval(self) -> float:
+        """An interval after which an acknowledgement should be retransmitted (RFC 6298)"""
+        maximum = self.settings.retransmission.interval
+        if self.smoothed_rtt is None:
+            return maximum
+
+        interval = (self.smoothed_rtt + 4 * self.rtt_variance) * self.backoff
+        minimum = self.settings.congestion_control.min_retransmission_interval
+        return min(max(interval, minimum), maximum)
+
+    def on_window_completed(self, rtt: float):
+        self._update_rtt(rtt)
+        self.backoff = 1
+
+        if self.window_size < self.slow_start_threshold:
+            self.window_size *= 2
+        else:
+            self.window_size += 1
+
+        self.window_size = self._bound(self.window_size)
+        self.logger.debug(f'Window completed. RTT: {rtt:.6f}s. Window size: {self.window_size}')
+
+    def on_loss(self):
+        decreased = int(self.window_size * self.settings.congestion_control.decrease_factor)
+        self.slow_start_threshold = self._bound(decreased)
+        self.window_size = self.slow_start_threshold
+        self.logger.debug(f'Loss. Window size: {self.window_size}')
+
+    def on_timeout(self):
+        decreased = int(self.window_size * self.settings.congestion_control.decrease_factor)
+        self.slow_start_threshold = self._bound(decreased)
+        self.window_size = self.settings.congestion_control.min_window_size
+        self.backoff *= 2
+        self.logger.debug(f'Timeout. Window size: {self.window_size}')
+
+    def _update_rtt(self, rtt: float):
+        if self.smoothed_rtt is None:
+            self.smoothed_rtt = rtt
+            self.rtt_variance = rtt / 2
+            return
+
+        self.rtt_variance = 0.75 * self.rtt_variance + 0.25 * abs(self.smoothed_rtt - rtt)
+        self.smoothed_rtt = 0.875 * self.smoothed_rtt + 0.125 * rtt
+
+    def _bound(self, window_size: int) -> int:
+        control = self.settings.congestion_control
+        return min(max(window_size, control.min_window_size), control.max_window_size)
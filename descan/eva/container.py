@@ -1,6 +1,6 @@
 from __future__ import annotations
 
-from typing import Dict, Optional, TYPE_CHECKING, TypeVar
+from typing import Dict, Optional, TYPE_CHECKING, Tuple, TypeVar
 
 from ipv8.types import Peer
 
@@ -11,33 +11,61 @@ if TYPE_CHECKING:
 
 T = TypeVar('T', bound=Transfer)
 
+TransferKey = Tuple[Peer, int]
 
-class Container(Dict[Peer, T]):
+
+class Container(Dict[TransferKey, T]):
     """ This class designed as a storage for transfers.
 
+    Transfers are keyed by the (peer, nonce) pair, so several transfers to the same peer
+    can be served simultaneously. The container keeps track of the number of transfers
+    per peer to make the per-peer limit check cheap.
+
     Key feature of the Container class is an ability to call
-    `self.eva.scheduler.send_scheduled()` for each item deletion.
+    `self.eva.scheduler.send_scheduled()` for each item deletion, passing the peer whose
+    slot has been released.
     """
 
     def __init__(self, eva: EVAProtocol):
         super().__init__()
         self.eva = eva
+        self.peer_counts: Dict[Peer, int] = {}
 
-    def pop(self, key: Peer, default: Optional[T] = None) -> T:
+    def count(self, peer: Peer) -> int:
+        """Return the number of transfers that are currently served for the peer"""
+        return self.peer_counts.get(peer, 0)
+
+    def pop(self, key: TransferKey, default: Optional[T] = None) -> T:
+        if key in self:
+            self._decrease_count(key)
         value = super().pop(key, default)
-        self.eva.scheduler.send_scheduled()
+        peer, _ = key
+        self.eva.scheduler.send_scheduled(peer, self)
         return value
 
     def update(self, *args, **kwargs) -> None:
-        super().update(*args, **kwargs)
+        for key, value in dict(*args, **kwargs).items():
+            self[key] = value
         self.eva.scheduler.send_scheduled()
 
-    def __setitem__(self, key: Peer, value: T):
+    def __setitem__(self, key: TransferKey, value: T):
         if key in self:
-            raise KeyError('Peer is already in container')
+            raise KeyError('Transfer is already in container')
 
         super().__setitem__(key, value)
+        peer, _ = key
+        self.peer_counts[peer] = self.count(peer) + 1
 
-    def __delitem__(self, key: Peer):
+    def __delitem__(self, key: TransferKey):
         super().__delitem__(key)
-        self.eva.scheduler.send_scheduled()
+        self._decrease_count(key)
+        peer, _ = key
+        self.eva.scheduler.send_scheduled(peer, self)
+
+    def _decrease_count(self, key: TransferKey):
+        peer, _ = key
+        count = self.count(peer) - 1
+        if count > 0:
+            self.peer_counts[peer] = count
+        else:
+            self.peer_counts.pop(peer, None)
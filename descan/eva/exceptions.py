@@ -37,6 +37,14 @@ class RequestRejected(TransferException):
     """The request was rejected on a sender's side"""
 
 
+class CompressionException(TransferException):
+    """The received data can not be decompressed"""
+
+
+class BackpressureException(TransferException):
+    """The receiver has no memory for the transfer at the moment. The sender should retry later"""
+
+
 # This codes are using for `TransferException` serialization. Don't change existing numbers.
 # If you want to add a new one, then increase the most latest number.
 codes_for_serialization = {
@@ -47,6 +55,8 @@ codes_for_serialization = {
     5: TransferLimitException,
     6: TransferCancelledException,
     7: RequestRejected,
+    8: CompressionException,
+    9: BackpressureException,
 }
 
 # this variable is a swapped codes_for_serialization dictionary
@@ -0,0 +1,71 @@
+from __future__ import annotations
+
+import logging
+from typing import Iterable, List
+
+from descan.eva.settings import ForwardErrorCorrection
+
+
+def xor_blocks(blocks: Iterable[bytes], size: int) -> bytes:
+    """Return XOR of the blocks. Blocks shorter than `size` are padded with zeros"""
+    parity = 0
+    for block in blocks:
+        parity ^= int.from_bytes(block, 'little')
+    return parity.to_bytes(size, 'little')
+
+
+def xor_lengths(blocks: Iterable[bytes]) -> int:
+    length = 0
+    for block in blocks:
+        length ^= len(block)
+    return length
+
+
+def recover_block(parity: bytes, length: int, blocks: List[bytes]) -> bytes:
+    """Rebuild the only missing block of a group from the group parity and the rest of the blocks.
+
+    Args:
+        parity: XOR of all blocks of the group
+        length: XOR of lengths of all blocks of the group
+        blocks: the received blocks of the group
+    """
+    block = xor_blocks([parity, *blocks], len(parity))
+    return block[:length ^ xor_lengths(blocks)]
+
+
+class LossEstimator:
+    """Estimates the loss rate of the path to a peer and derives the FEC group size from it.
+
+    The estimator is fed by the acknowledgements of the peer: a selective acknowledgement reports
+    the blocks that have been lost, a cumulative one reports that the whole window has been received.
+    Each group of blocks is followed by a repair block, so the redundancy is `1 / group_size`.
+    """
+
+    def __init__(self, settings: ForwardErrorCorrection):
+        self.settings = settings
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.loss_rate: float = 0
+
+    @property
+    def group_size(self) -> int:
+        redundancy = self.loss_rate * self.settings.redundancy_factor
+        if redundancy <= 0:
+            return self.settings.max_group_size
+
+        size = round(1 / redundancy)
+        return min(max(size, self.settings.min_group_size), self.settings.max_group_size)
+
+    def update(self, lost: int, total: int):
+        if total <= 0:
+            return
+
+        smoothing = self.settings.loss_smoothing
+        self.loss_rate = (1 - smoothing) * self.loss_rate + smoothing * (lost / total)
+        self.logger.debug(f'Loss rate: {self.loss_rate:.4f}. Group size: {self.group_size}')
+
+
+def count_lost(bitmap: bytes, size: int) -> int:
+    """Count blocks that are not marked as received in the selective acknowledgement bitmap"""
+    received = sum(bin(byte).count('1') for byte in bitmap)
+    return max(size - received, 0)
+
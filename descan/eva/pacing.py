@@ -0,0 +1,174 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from collections import deque
+from typing import Callable, Deque, Dict, Optional, Tuple
+
+from ipv8.messaging.lazy_payload import VariablePayload
+from ipv8.types import Peer
+
+from descan.eva.settings import Pacing
+
+# Floating-point remainders of the refill are ignored, otherwise a bucket can stay a fraction of a byte short
+EPSILON = 1e-6
+
+# The minimal delay of the drain handle. A smaller delay might not advance the clock at all (e.g., in a
+# discrete event loop), so no tokens would be refilled when the handle fires
+MIN_DELAY = 1e-6
+
+
+class TokenBucket:
+    """A token bucket. One token corresponds to one byte"""
+
+    def __init__(self, rate: float, capacity: float, now: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = now
+
+    def delay(self, size: int, now: float) -> float:
+        """Return the time to wait until `size` bytes can be sent"""
+        self._refill(now)
+        size = min(size, self.capacity)
+        if self.tokens >= size - EPSILON:
+            return 0
+        return (size - self.tokens) / self.rate
+
+    def consume(self, size: int, now: float):
+        self._refill(now)
+        self.tokens -= size
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+
+class Pacer:
+    """Spreads data packets over time instead of sending them back-to-back.
+
+    Each packet has to pass both the global token bucket and the token bucket of its peer.
+    The rate of a peer is derived from the round trip time that is measured by its outgoing
+    transfers: a window is spread across the round trip. Packets that can not be sent
+    immediately wait in a FIFO queue of their peer; the queues are drained in a round-robin
+    manner by a single `loop.call_at` handle.
+
+    The bucket of a peer that has been idle for `settings.idle_timeout` is full, so it is dropped
+    together with the smoothed RTT of the peer. The idle buckets are looked up when a bucket is
+    added, at most once per timeout.
+    """
+
+    def __init__(self, settings: Pacing, send_message: Callable[[Peer, VariablePayload], None]):
+        self.settings = settings
+        self.send_message = send_message
+        self.logger = logging.getLogger(self.__class__.__name__)
+
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.global_bucket: Optional[TokenBucket] = None
+        self.peer_buckets: Dict[Peer, TokenBucket] = {}
+        self.smoothed_rtt: Dict[Peer, float] = {}
+        self.queues: Dict[Peer, Deque[Tuple[VariablePayload, int]]] = {}
+        self.handle: Optional[asyncio.TimerHandle] = None
+        self.evicted: Optional[float] = None
+
+    def send(self, peer: Peer, message: VariablePayload, size: int):
+        """Send the message as soon as the rate limits allow"""
+        queue = self.queues.get(peer)
+        if queue is None and not self._delay(peer, size):
+            self._send(peer, message, size)
+            return
+
+        if queue is None:
+            queue = self.queues[peer] = deque()
+        queue.append((message, size))
+        self._schedule()
+
+    def on_rtt_sample(self, peer: Peer, rtt: float, window_bytes: int):
+        """Update the rate of the peer from a round trip time sample of a window"""
+        if rtt <= 0:
+            return
+
+        smoothed = self.smoothed_rtt.get(peer)
+        smoothed = rtt if smoothed is None else 0.875 * smoothed + 0.125 * rtt
+        self.smoothed_rtt[peer] = smoothed
+
+        rate = max(self.settings.pacing_gain * window_bytes / smoothed, self.settings.min_peer_rate)
+        bucket = self.peer_buckets.get(peer)
+        if bucket:
+            bucket.rate = rate
+        else:
+            self._evict_idle_buckets()
+            self.peer_buckets[peer] = TokenBucket(rate, self.settings.burst_size, self._now())
+        self.logger.debug(f'Peer rate: {rate:.0f}B/s. RTT: {smoothed:.6f}s')
+
+    def stop(self):
+        if self.handle:
+            self.handle.cancel()
+            self.handle = None
+        self.queues.clear()
+
+    def _drain(self):
+        self.handle = None
+
+        # Send at most one packet per peer in a round, so peers share the global rate fairly
+        sent = True
+        while sent and self.queues:
+            sent = False
+            for peer in list(self.queues):
+                queue = self.queues[peer]
+                message, size = queue[0]
+                if self._delay(peer, size):
+                    continue
+
+                queue.popleft()
+                # The peer goes to the end of the round
+                self.queues.pop(peer)
+                if queue:
+                    self.queues[peer] = queue
+                self._send(peer, message, size)
+                sent = True
+
+        self._schedule()
+
+    def _schedule(self):
+        if self.handle or not self.queues:
+            return
+
+        delay = min(self._delay(peer, queue[0][1]) for peer, queue in self.queues.items())
+        if delay:
+            delay = max(delay, MIN_DELAY)
+        self.handle = self.loop.call_at(self._now() + delay, self._drain)
+
+    def _delay(self, peer: Peer, size: int) -> float:
+        now = self._now()
+        delay = self.global_bucket.delay(size, now)
+        bucket = self.peer_buckets.get(peer)
+        if bucket:
+            delay = max(delay, bucket.delay(size, now))
+        return delay
+
+    def _send(self, peer: Peer, message: VariablePayload, size: int):
+        now = self._now()
+        self.global_bucket.consume(size, now)
+        bucket = self.peer_buckets.get(peer)
+        if bucket:
+            bucket.consume(size, now)
+        self.send_message(peer, message)
+
+    def _evict_idle_buckets(self):
+        now = self._now()
+        if self.evicted is not None and now - self.evicted < self.settings.idle_timeout:
+            return
+
+        self.evicted = now
+        idle = [peer for peer, bucket in self.peer_buckets.items()
+                if now - bucket.updated >= self.settings.idle_timeout and peer not in self.queues]
+        for peer in idle:
+            self.peer_buckets.pop(peer)
+            self.smoothed_rtt.pop(peer, None)
+
+    def _now(self) -> float:
+        if not self.loop:
+            self.loop = asyncio.get_running_loop()
+            self.global_bucket = TokenBucket(self.settings.global_rate, self.settings.burst_size, self.loop.time())
+        return self.loop.time()
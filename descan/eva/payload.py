@@ -8,8 +8,8 @@ dataclass = overwrite_dataclass(dataclass)
 
 @vp_compile
 class WriteRequest(VariablePayload):
-    format_list = ['I', 'I', 'raw']
-    names = ['data_size', 'nonce', 'info']
+    format_list = ['I', 'I', 'B', 'B', '20s', 'raw']
+    names = ['data_size', 'nonce', 'codec', 'kind', 'digest', 'info']
 
 
 @vp_compile
@@ -20,8 +20,8 @@ class ReadRequest(VariablePayload):
 
 @vp_compile
 class Acknowledgement(VariablePayload):
-    format_list = ['I', 'I', 'I']
-    names = ['number', 'window_size', 'nonce']
+    format_list = ['I', 'I', 'I', 'raw']
+    names = ['number', 'window_size', 'nonce', 'selective']
 
 
 @vp_compile
@@ -30,6 +30,15 @@ class Data(VariablePayload):
     names = ['number', 'nonce', 'data']
 
 
+@vp_compile
+class Repair(VariablePayload):
+    """XOR parity of the `count` blocks starting from the block `number`.
+    The `length` is XOR of the lengths of the blocks.
+    """
+    format_list = ['I', 'I', 'I', 'I', 'raw']
+    names = ['number', 'count', 'nonce', 'length', 'data']
+
+
 @vp_compile
 class Error(VariablePayload):
     format_list = ['?', 'I', 'I', 'raw']
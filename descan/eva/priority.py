@@ -0,0 +1,11 @@
+from enum import IntEnum
+
+
+class Priority(IntEnum):
+    """Priority classes of transfers.
+
+    Interactive transfers (e.g. responses to queries) are latency sensitive and are preferred
+    by the scheduler over bulk transfers (e.g. replication of data).
+    """
+    INTERACTIVE = 0
+    BULK = 1
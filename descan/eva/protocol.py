@@ -25,37 +25,53 @@ An example of use:
 ...
 ...     async def on_error(self, peer, exception):
 ...         self.logger.error(f'Error has been occurred: {exception}')
+
+Large data can be received incrementally by passing a `sink_factory` that returns a
+`TransferSink` (for example, a `FileSink`) for an incoming transfer. The sink gets the
+data in ordered chunks while the transfer is in progress.
 """
 from __future__ import annotations
 
+import hashlib
 import logging
 from asyncio import Future
 from functools import wraps
 from itertools import chain
 from random import SystemRandom
-from typing import Awaitable, Callable, Dict, Optional, Type, TypeVar
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple, Type, TypeVar
 
 from ipv8.community import Community
 from ipv8.messaging.lazy_payload import VariablePayload
 from ipv8.types import Peer
 
 from descan.eva.aliases import TransferCompleteCallback, TransferErrorCallback, \
-    TransferRequestCallback
+    TransferRequestCallback, TransferSinkFactory
+from descan.eva.batch import TransferKind, pack_batch, unpack_batch
+from descan.eva.budget import MemoryBudget
+from descan.eva.compression import Codec, choose_codec, compress
+from descan.eva.congestion import CongestionController
 from descan.eva.container import Container
-from descan.eva.exceptions import RequestRejected, SizeException, TransferException, \
-    TransferLimitException, \
-    ValueException, to_class, to_code
-from descan.eva.payload import Acknowledgement, Data, Error, ReadRequest, WriteRequest
+from descan.eva.exceptions import BackpressureException, CompressionException, RequestRejected, SizeException, \
+    TransferCancelledException, TransferException, TransferLimitException, ValueException, to_class, to_code
+from descan.eva.fec import LossEstimator
+from descan.eva.pacing import Pacer
+from descan.eva.payload import Acknowledgement, Data, Error, ReadRequest, Repair, WriteRequest
+from descan.eva.priority import Priority
 from descan.eva.result import TransferResult
+from descan.eva.resume import NO_DIGEST, ResumeStore
 from descan.eva.scheduler import Scheduler
 from descan.eva.settings import EVASettings
+from descan.eva.statistics import EVAStatistics
+from descan.eva.sink import TransferSink
 from descan.eva.transfer.base import Transfer
 from descan.eva.transfer.incoming import IncomingTransfer
 from descan.eva.transfer.outgoing import OutgoingTransfer
 from descan.eva.utils.protocol_decorator import make_protocol_decorator
 from descan.eva.utils.async_group import AsyncGroup
+from descan.eva.utils.timer_wheel import TimerWheel
+from descan.eva.utils.lru_cache import LRUCache
 
-__version__ = '2.2.0'
+__version__ = '2.8.0'
 
 logger = logging.getLogger('EVA')
 
@@ -92,7 +108,17 @@ class EVAProtocol:  # pylint: disable=too-many-instance-attributes
         Features:
             * timeout
             * retransmit
-            * dynamic window size
+            * a single timer wheel for timeouts and retransmissions of all transfers
+            * dynamic window size (optionally adapted by AIMD congestion control)
+            * selective acknowledgements and fast retransmit
+            * optional compression of the sent data (zlib, bz2, lzma)
+            * priority classes of transfers with weighted fair scheduling
+            * resumption of interrupted transfers of the same data
+            * optional forward error correction (XOR parity blocks, adapted to the loss rate)
+            * optional pacing of sent data by global and per-peer token buckets
+            * per-transfer statistics aggregated by direction and by peer
+            * a memory budget for buffered incoming data; senders back off while it is exceeded
+            * optional batching of small scheduled transfers to the same peer
 
         The maximum data size that can be transferred through the protocol can be
         calculated as "block_size * 4294967295" where 4294967295 is the max segment
@@ -109,11 +135,15 @@ class EVAProtocol:  # pylint: disable=too-many-instance-attributes
             on_error: Optional[TransferErrorCallback] = None,
             on_request: Optional[TransferRequestCallback] = None,
             start_message_id: int = 186,
-            settings: Optional[EVASettings] = None
+            settings: Optional[EVASettings] = None,
+            sink_factory: Optional[TransferSinkFactory] = None
     ):
         """Init should be called manually within his parent class.
 
         Args:
+            sink_factory: a callback that is invoked with a peer, an info and a data size for
+                each incoming write request. In the case it returns a sink, the data is streamed
+                into the sink instead of being accumulated in memory.
         """
         self.community = community
 
@@ -123,13 +153,22 @@ class EVAProtocol:  # pylint: disable=too-many-instance-attributes
         self.on_receive = on_receive or blank
         self.on_error = on_error or blank
         self.on_request = on_request
+        self.sink_factory = sink_factory
 
-        self.incoming: Container[Peer, IncomingTransfer] = Container(self)
-        self.outgoing: Container[Peer, OutgoingTransfer] = Container(self)
+        self.incoming: Container[IncomingTransfer] = Container(self)
+        self.outgoing: Container[OutgoingTransfer] = Container(self)
+        self.congestion_controllers: LRUCache[Peer, CongestionController] = LRUCache(self.settings.max_peer_states)
+        self.memory_budget = MemoryBudget(self.settings.backpressure.memory_budget)
+        self.resume_store = ResumeStore(self.settings.resumption, self.memory_budget)
+        self.loss_estimators: LRUCache[Peer, LossEstimator] = LRUCache(self.settings.max_peer_states)
+        # `send_message` is looked up on each call, so it can be replaced (e.g. in tests)
+        self.pacer = Pacer(self.settings.pacing, lambda peer, message: self.send_message(peer, message))
 
         self.random = SystemRandom()
         self.scheduler = Scheduler(eva=self)
         self.task_group = AsyncGroup()
+        self.timer_wheel = TimerWheel(self.settings.timer_resolution)
+        self.statistics = EVAStatistics(max_peers=self.settings.max_peer_states)
         self.shutting_down = False
 
         self.start_message_id = self.last_message_id = start_message_id
@@ -143,6 +182,7 @@ class EVAProtocol:  # pylint: disable=too-many-instance-attributes
         self._register_message_handler(Data, self.on_data_packet)
         self._register_message_handler(Error, self.on_error_packet)
         self._register_message_handler(ReadRequest, self.on_read_request)
+        self._register_message_handler(Repair, self.on_repair_packet)
 
         logger.debug(f'Initialized. Settings: {self.settings}.')
 
@@ -151,15 +191,17 @@ class EVAProtocol:  # pylint: disable=too-many-instance-attributes
         self.eva_messages[message_class] = self.last_message_id
         self.last_message_id += 1
 
-    def send_binary(self, peer: Peer, info: bytes, data: bytes) -> Future[TransferResult]:
+    def send_binary(self, peer: Peer, info: bytes, data: bytes, codec: Optional[Codec] = None,
+                    priority: Priority = Priority.BULK, streaming: bool = False) -> Future[TransferResult]:
         """Send a big binary data.
 
-        Due to ipv8 specifics, we can use only one socket port per one peer.
-        Therefore, at one point in time, the protocol can only transmit one particular
-        piece of data for one particular peer.
+        Transfers are multiplexed by their nonce, so several pieces of data can be
+        transmitted to one particular peer at the same time. The number of simultaneous
+        transfers per peer is limited by `settings.max_simultaneous_transfers_per_peer`.
 
-        In case "eva_send_binary" is invoked multiply times for a single peer, the data
-        transfer will be scheduled and performed when the current sending session is finished.
+        In case "eva_send_binary" is invoked more times for a single peer than this limit
+        allows, the data transfer will be scheduled and performed when one of the current
+        sending sessions is finished.
 
         An example:
         >>> class MyCommunity(Community):
@@ -178,6 +220,21 @@ class EVAProtocol:  # pylint: disable=too-many-instance-attributes
             data: binary data that will be sent to the target.
                 It is limited by several GB, but the protocol is slow by design, so
                 try to send less rather than more.
+            codec: a compression codec for the data. By default, it is chosen automatically
+                according to `settings.compression`. The receiver decompresses the data
+                transparently.
+            priority: the priority class of the transfer. It is taken into account in the case
+                that the transfer has to be scheduled.
+            streaming: the flag indicating that the receiver streams the data into a sink. In this
+                case, the data is limited by `settings.streaming_size_limit` instead of
+                `settings.binary_size_limit`.
+
+        In the case that a transfer of the data has been interrupted (for example, by a timeout),
+        sending the same data again to the same peer transmits only the part that the peer has
+        not received yet.
+
+        In the case that `settings.batching` is enabled, small transfers that wait in the scheduler
+        are sent to the peer in a single batch. The future of each transfer is resolved individually.
         """
         if self.shutting_down:
             raise TransferException('The protocol is shutting down')
@@ -188,37 +245,87 @@ class EVAProtocol:  # pylint: disable=too-many-instance-attributes
         if peer == self.community.my_peer:
             raise ValueException('The receiver can not be equal to the sender')
 
-        nonce = self.random.randint(0, MAX_U32)
         data_size = len(data)
-        if data_size > self.settings.binary_size_limit:
-            raise SizeException(f'Data size limit {self.settings.binary_size_limit} has been exceeded: {data_size}')
+        # The receiver decides whether the data is buffered or streamed, and checks the corresponding limit as well
+        size_limit = self.settings.streaming_size_limit if streaming else self.settings.binary_size_limit
+        if data_size > size_limit:
+            raise SizeException(f'Data size limit {size_limit} has been exceeded: {data_size}')
 
-        transfer = OutgoingTransfer(
+        transfer = self._create_write_transfer(peer, info, data, codec, priority)
+        return self.scheduler.schedule(transfer)
+
+    def create_batch(self, transfers: List[OutgoingTransfer]) -> OutgoingTransfer:
+        """Merge scheduled write transfers to the same peer into a single batch transfer.
+
+        The merged transfers are finished with the result (or the exception) of the batch.
+        """
+        first = transfers[0]
+        data = pack_batch([(transfer.info, transfer.create_result().data) for transfer in transfers])
+        batch = self._create_write_transfer(first.peer, b'', data, None, first.priority, kind=TransferKind.BATCH)
+        logger.debug(f'Batch of {len(transfers)} transfers. Peer: {first.peer}. Size: {len(data)}')
+
+        for transfer in transfers:
+            # The batch is the transfer that is accounted in the statistics
+            transfer.protocol_statistics = None
+        batch.future.add_done_callback(lambda future: self._finish_batched(transfers, future))
+        return batch
+
+    @staticmethod
+    def _finish_batched(transfers: List[OutgoingTransfer], future: Future):
+        exception = TransferCancelledException('The batch was cancelled') if future.cancelled() else future.exception()
+        for transfer in transfers:
+            if exception:
+                transfer.finish(exception=exception)
+            else:
+                transfer.finish(result=transfer.create_result())
+
+    def _create_write_transfer(self, peer: Peer, info: bytes, data: bytes, codec: Optional[Codec],
+                               priority: Priority, kind: TransferKind = TransferKind.SINGLE) -> OutgoingTransfer:
+        nonce = self.random.randint(0, MAX_U32)
+        data_size = len(data)
+        if codec is None:
+            codec = choose_codec(data, self.settings.compression)
+
+        payload = data
+        if codec != Codec.NONE:
+            payload = compress(codec, data, self.settings.compression.level)
+            if len(payload) >= data_size:  # the data is incompressible, send it as is
+                codec, payload = Codec.NONE, data
+            elif data_size > len(payload) * self.settings.compression.max_expansion:
+                # the receiver would reject the data as a decompression bomb
+                codec, payload = Codec.NONE, data
+
+        return OutgoingTransfer(
             container=self.outgoing,
             peer=peer,
             info=info,
-            data=data,
-            data_size=data_size,
+            data=payload,
+            data_size=len(payload),
+            uncompressed_data=data if payload is not data else None,
             nonce=nonce,
             settings=self.settings,
             protocol_task_group=self.task_group,
+            timer_wheel=self.timer_wheel,
+            protocol_statistics=self.statistics,
             send_message=self.send_message,
-            on_complete=self.on_send_complete,
-            on_error=self.on_error,
-            request=WriteRequest(data_size, nonce, info)
+            # A batch is reported by the merged transfers
+            on_complete=self.on_send_complete if kind == TransferKind.SINGLE else blank,
+            on_error=self.on_error if kind == TransferKind.SINGLE else blank,
+            request=WriteRequest(len(payload), nonce, codec, kind, self._digest(payload), info),
+            loss_estimator=self.get_loss_estimator(peer),
+            priority=priority
         )
 
-        return self.scheduler.schedule(transfer)
-
-    def get_binary(self, peer: Peer, info: bytes) -> Awaitable[TransferResult]:
+    def get_binary(self, peer: Peer, info: bytes, sink: Optional[TransferSink] = None,
+                   priority: Priority = Priority.BULK) -> Awaitable[TransferResult]:
         """Receive a big binary data.
 
-         Due to ipv8 specifics, we can use only one socket port per one peer.
-         Therefore, at one point in time, the protocol can only transmit one particular
-         piece of data for one particular peer.
+         Transfers are multiplexed by their nonce, so several pieces of data can be
+         received from one particular peer at the same time.
 
-         In case "get_binary" is invoked multiply times for a single peer, the data
-         transfer will be scheduled and performed when the current sending session is finished.
+         In case "get_binary" is invoked more times for a single peer than
+         `settings.max_simultaneous_transfers_per_peer` allows, the data transfer will be
+         scheduled and performed when one of the current sessions is finished.
 
          An example:
          >>> class MyCommunity(Community):
@@ -233,6 +340,8 @@ class EVAProtocol:  # pylint: disable=too-many-instance-attributes
          Args:
              peer: the target peer
              info: a binary info, limited by <block_size> bytes
+             sink: an optional sink that receives the data incrementally
+             priority: the priority class of the transfer
          """
         logger.debug(f'Get binary. Peer: {peer}. Info: {info}.')
 
@@ -250,15 +359,47 @@ class EVAProtocol:  # pylint: disable=too-many-instance-attributes
             nonce=nonce,
             settings=self.settings,
             protocol_task_group=self.task_group,
+            timer_wheel=self.timer_wheel,
+            protocol_statistics=self.statistics,
             send_message=self.send_message,
             on_complete=self.on_receive,
             on_error=self.on_error,
             data_size=0,
-            request=ReadRequest(info=info, nonce=nonce)
+            request=ReadRequest(info=info, nonce=nonce),
+            congestion_controller=self.get_congestion_controller(peer),
+            sink=sink,
+            priority=priority
         )
 
         return self.scheduler.schedule(transfer)
 
+    def get_loss_estimator(self, peer: Peer) -> Optional[LossEstimator]:
+        """Return the loss estimator that is shared by all outgoing transfers to the peer"""
+        if not self.settings.fec.enabled:
+            return None
+
+        return self.loss_estimators.get_or_create(peer, lambda: LossEstimator(self.settings.fec))
+
+    def get_congestion_controller(self, peer: Peer) -> Optional[CongestionController]:
+        """Return the congestion controller that is shared by all incoming transfers from the peer"""
+        if not self.settings.congestion_control.enabled:
+            return None
+
+        return self.congestion_controllers.get_or_create(peer, lambda: CongestionController(self.settings))
+
+    def _digest(self, data: bytes) -> bytes:
+        resumption = self.settings.resumption
+        if not resumption.enabled or len(data) < resumption.min_size:
+            return NO_DIGEST
+        return hashlib.sha1(data).digest()
+
+    def send_data(self, peer: Peer, message: VariablePayload):
+        """Send a data (or repair) block. The block is paced in the case that pacing is enabled"""
+        if self.settings.pacing.enabled:
+            self.pacer.send(peer, message, len(message.data))
+        else:
+            self.send_message(peer, message)
+
     def send_message(self, peer: Peer, message: VariablePayload):
         self.community.endpoint.send(peer.address, self.community.ezr_pack(self.eva_messages[type(message)], message))
 
@@ -266,10 +407,17 @@ class EVAProtocol:  # pylint: disable=too-many-instance-attributes
         exception = None
         if transfer.data_size <= 0:
             exception = ValueException('Data size can not be less or equal to 0', transfer)
-        elif transfer.data_size > self.settings.binary_size_limit:
-            exception = SizeException(f'Data size limit({self.settings.binary_size_limit}) has been exceeded', transfer)
+        elif transfer.data_size > transfer.size_limit:
+            exception = SizeException(f'Data size limit({transfer.size_limit}) has been exceeded', transfer)
         elif self._is_simultaneously_served_transfers_limit_exceeded():
             exception = TransferLimitException('Maximum simultaneous transfers limit exceeded')
+        elif transfer.container.count(transfer.peer) >= self.settings.max_simultaneous_transfers_per_peer:
+            message = 'Maximum simultaneous transfers per peer limit exceeded'
+            # The sender may allow more transfers per peer, so it is asked to retry later
+            exception = BackpressureException(message, transfer) if isinstance(transfer, IncomingTransfer) \
+                else TransferLimitException(message)
+        elif isinstance(transfer, IncomingTransfer) and not transfer.reserve_memory():
+            exception = BackpressureException('Memory budget exceeded', transfer)
 
         if exception:
             self._finish_with_error(transfer, exception)
@@ -281,9 +429,24 @@ class EVAProtocol:  # pylint: disable=too-many-instance-attributes
     async def on_write_request_packet(self, peer: Peer, payload: WriteRequest):
         logger.debug(f'On write request. Peer: {peer}. Info: {payload.info}. Size: {payload.data_size}')
 
-        if peer in self.incoming:
+        if (peer, payload.nonce) in self.incoming:
             return
 
+        codec = Codec.NONE
+        kind = TransferKind.SINGLE
+        request_exception = None
+        try:
+            codec = Codec(payload.codec)
+        except ValueError:
+            request_exception = CompressionException(f'Unknown codec: {payload.codec}')
+        try:
+            kind = TransferKind(payload.kind)
+        except ValueError:
+            request_exception = ValueException(f'Unknown transfer kind: {payload.kind}')
+
+        sink = None
+        if self.sink_factory and kind == TransferKind.SINGLE:
+            sink = self.sink_factory(peer, payload.info, payload.data_size)
         transfer = IncomingTransfer(
             container=self.incoming,
             peer=peer,
@@ -292,18 +455,41 @@ class EVAProtocol:  # pylint: disable=too-many-instance-attributes
             data_size=payload.data_size,
             settings=self.settings,
             protocol_task_group=self.task_group,
+            timer_wheel=self.timer_wheel,
+            protocol_statistics=self.statistics,
             send_message=self.send_message,
-            on_complete=self.on_receive,
+            on_complete=self.on_receive if kind == TransferKind.SINGLE else self.on_batch_receive,
             on_error=self.on_error,
+            congestion_controller=self.get_congestion_controller(peer),
+            sink=sink,
+            codec=codec,
+            digest=payload.digest,
+            resume_store=self.resume_store if self.settings.resumption.enabled else None,
+            memory_budget=self.memory_budget
         )
 
+        if request_exception:
+            self._finish_with_error(transfer, request_exception)
+            return
+
         if self.check_transfer_correctness(transfer):
             transfer.start()
 
+    async def on_batch_receive(self, result: TransferResult):
+        """Pass each entry of the received batch to `on_receive`"""
+        try:
+            entries = unpack_batch(result.data)
+        except ValueException as e:
+            await self.on_error(result.peer, e)
+            return
+
+        for info, data in entries:
+            await self.on_receive(TransferResult(peer=result.peer, info=info, data=data, nonce=result.nonce))
+
     @message_handler(ReadRequest)
     async def on_read_request(self, peer: Peer, payload: ReadRequest):
         logger.debug(f'On read request. Peer: {peer}. Info: {payload.info}.')
-        if peer in self.outgoing:
+        if (peer, payload.nonce) in self.outgoing:
             return
 
         data = b''
@@ -325,9 +511,12 @@ class EVAProtocol:  # pylint: disable=too-many-instance-attributes
             nonce=payload.nonce,
             settings=self.settings,
             protocol_task_group=self.task_group,
+            timer_wheel=self.timer_wheel,
+            protocol_statistics=self.statistics,
             send_message=self.send_message,
             on_complete=self.on_send_complete,
-            on_error=self.on_error
+            on_error=self.on_error,
+            loss_estimator=self.get_loss_estimator(peer)
         )
 
         if exception:
@@ -347,15 +536,31 @@ class EVAProtocol:  # pylint: disable=too-many-instance-attributes
         if not transfer:
             return
 
-        data_list = list(transfer.on_acknowledgement(payload.number, payload.window_size))
-        is_transfer_finished = not data_list
+        is_transfer_finished = payload.number > transfer.block_count
         if is_transfer_finished:
             transfer.finish(result=transfer.create_result())
             return
 
-        for data in data_list:
+        blocks = list(transfer.on_acknowledgement(payload.number, payload.window_size, payload.selective))
+        if self.settings.pacing.enabled and transfer.rtt:
+            window_bytes = payload.window_size * self.settings.block_size
+            self.pacer.on_rtt_sample(peer, transfer.rtt, window_bytes)
+
+        for data in blocks:
             logger.debug(f'Transmit({data.number}). Peer: {peer}.')
-            self.send_message(peer, data)
+            self.send_data(peer, data)
+
+    @message_handler(Repair)
+    async def on_repair_packet(self, peer: Peer, payload: Repair):
+        logger.debug(f'On repair({payload.number}). Count: {payload.count}. Peer: {peer}.')
+        transfer = self._get_transfer(peer=peer, container=self.incoming, nonce=payload.nonce)
+        if not transfer or not transfer.window:
+            return
+
+        window_index = payload.number - transfer.window.start
+        acknowledgement = transfer.on_repair(window_index, payload.count, payload.length, payload.data)
+        if acknowledgement:
+            self.send_message(transfer.peer, acknowledgement)
 
     @message_handler(Data)
     async def on_data_packet(self, peer, payload):
@@ -383,17 +588,16 @@ class EVAProtocol:  # pylint: disable=too-many-instance-attributes
         transfer = self._get_transfer(peer=peer, container=container, nonce=error.nonce)
         if transfer:
             exception_cls = to_class(error.code)
+            if exception_cls is BackpressureException and isinstance(transfer, OutgoingTransfer) and \
+                    transfer.back_off():
+                return
             transfer.finish(exception=exception_cls(message, transfer, remote=True))
 
     @staticmethod
-    def _get_transfer(peer: Peer, container: Dict[Peer, T], nonce: int) -> Optional[T]:
-        transfer = container.get(peer)
+    def _get_transfer(peer: Peer, container: Dict[Tuple[Peer, int], T], nonce: int) -> Optional[T]:
+        transfer = container.get((peer, nonce))
         if not transfer:
-            logger.warning(f'No transfer found with peer {peer} associated with incoming acknowledgement.')
-            return None
-
-        if transfer.nonce != nonce:
-            logger.warning(f'Cannot handle acknowledgement from peer {peer} - nonce mismatch.')
+            logger.warning(f'No transfer found with peer {peer} and nonce {nonce}.')
             return None
 
         return transfer
@@ -410,6 +614,8 @@ class EVAProtocol:  # pylint: disable=too-many-instance-attributes
 
         for transfer in transfers:
             transfer.finish(exception=exception)
+        self.timer_wheel.stop()
+        self.pacer.stop()
 
         await self.task_group.wait()
 
@@ -1,15 +1,24 @@
+from __future__ import annotations
+
 from dataclasses import dataclass
+from typing import Optional, TYPE_CHECKING, Union
 
 from ipv8.types import Peer
 
+if TYPE_CHECKING:
+    from descan.eva.sink import TransferSink
+
 
 @dataclass
 class TransferResult:
     peer: Peer
     info: bytes
-    data: bytes
+    # Received data is passed as a memoryview of the receive buffer to avoid copying it
+    data: Union[bytes, memoryview]
 
     nonce: int
+    # The sink that has received the data in the case of a streamed transfer. The `data` is empty then.
+    sink: Optional[TransferSink] = None
 
     def __str__(self):
-        return f'TransferResult(peer={self.peer}, info: {self.info}, data hash: {hash(self.data)}, nonce={self.nonce})'
+        return f'TransferResult(peer={self.peer}, info: {self.info}, data size: {len(self.data)}, nonce={self.nonce})'
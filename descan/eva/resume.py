@@ -0,0 +1,122 @@
+from __future__ import annotations
+
+import logging
+import os
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from descan.eva.budget import MemoryBudget
+from descan.eva.settings import Resumption
+
+# A digest that is sent in the case that the transfer can not be resumed
+NO_DIGEST = b'\x00' * 20
+
+PART_SUFFIX = '.part'
+
+
+class ResumeStore:
+    """This class keeps the received part of incoming transfers that have been interrupted.
+
+    The parts are keyed by the digest of the transferred data, which is sent in `WriteRequest`.
+    In the case that the same data is sent again, the receiver acknowledges the stored blocks
+    at once, and the sender transmits the missing tail only.
+
+    The parts are kept in memory, or in `settings.directory` to survive a restart. The total
+    size of the parts is limited by `settings.max_size`; the least recently used parts are
+    dropped first. The parts that are kept in memory are charged to the `memory_budget` of the
+    incoming transfers, and are dropped as well in the case that the budget is exceeded.
+    """
+
+    def __init__(self, settings: Resumption, memory_budget: Optional[MemoryBudget] = None):
+        self.settings = settings
+        self.memory_budget = memory_budget if not settings.directory else None
+        self.logger = logging.getLogger(self.__class__.__name__)
+
+        self.sizes: OrderedDict[bytes, int] = OrderedDict()
+        self.parts: Dict[bytes, bytes] = {}
+        self.size = 0
+
+        if settings.directory:
+            self._load_index()
+
+    def load(self, digest: bytes) -> Optional[bytes]:
+        """Return the stored part of the data with the digest"""
+        if digest not in self.sizes:
+            return None
+
+        self.sizes.move_to_end(digest)
+        if not self.settings.directory:
+            return self.parts[digest]
+
+        try:
+            with open(self._path(digest), 'rb') as file:
+                return file.read()
+        except OSError as e:
+            self.logger.warning(f'Can not read the stored part: {e}')
+            self.discard(digest)
+            return None
+
+    def save(self, digest: bytes, part: bytes):
+        """Store the received part of the data with the digest. A previously stored part is replaced"""
+        self.discard(digest)
+        if len(part) > self.settings.max_size:
+            return
+
+        while self.sizes and self.size + len(part) > self.settings.max_size:
+            oldest = next(iter(self.sizes))
+            self.discard(oldest)
+
+        if self.memory_budget:
+            while not self.memory_budget.reserve(len(part)):
+                if not self.sizes:
+                    return
+                self.discard(next(iter(self.sizes)))
+
+        if self.settings.directory:
+            try:
+                with open(self._path(digest), 'wb') as file:
+                    file.write(part)
+            except OSError as e:
+                self.logger.warning(f'Can not store the part: {e}')
+                return
+        else:
+            self.parts[digest] = part
+
+        self.sizes[digest] = len(part)
+        self.size += len(part)
+        self.logger.debug(f'Stored part {digest.hex()}: {len(part)} bytes')
+
+    def discard(self, digest: bytes):
+        size = self.sizes.pop(digest, None)
+        if size is None:
+            return
+
+        self.size -= size
+        self.parts.pop(digest, None)
+        if self.memory_budget:
+            self.memory_budget.release(size)
+        if self.settings.directory:
+            try:
+                os.remove(self._path(digest))
+            except OSError:
+                pass
+
+    def _load_index(self):
+        os.makedirs(self.settings.directory, exist_ok=True)
+        entries = []
+        for name in os.listdir(self.settings.directory):
+            if not name.endswith(PART_SUFFIX):
+                continue
+            path = os.path.join(self.settings.directory, name)
+            try:
+                digest = bytes.fromhex(name[:-len(PART_SUFFIX)])
+            except ValueError:
+                continue
+            entries.append((os.path.getmtime(path), digest, os.path.getsize(path)))
+
+        for _, digest, size in sorted(entries):
+            self.sizes[digest] = size
+            self.size += size
+
+    def _path(self, digest: bytes) -> str:
+        return os.path.join(self.settings.directory, digest.hex() + PART_SUFFIX)
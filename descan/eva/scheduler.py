@@ -2,31 +2,59 @@ from __future__ import annotations
 
 import logging
 from asyncio import Future
-from typing import Dict, Iterable, List, TYPE_CHECKING
+from collections import deque
+from typing import Deque, Dict, List, Optional, Set, TYPE_CHECKING, Tuple
 
+from ipv8.types import Peer
+
+from descan.eva.batch import TransferKind
+from descan.eva.payload import WriteRequest
+from descan.eva.priority import Priority
 from descan.eva.result import TransferResult
 from descan.eva.transfer.base import Transfer
+from descan.eva.transfer.outgoing import OutgoingTransfer
 from descan.eva.utils.async_group import AsyncGroup
 
 if TYPE_CHECKING:
+    from descan.eva.container import Container
     from descan.eva.protocol import EVAProtocol
 
+# Scheduled transfers are queued per peer, per container (incoming or outgoing) and per priority class
+QueueKey = Tuple[Peer, int, Priority]
+
 
 class Scheduler:
-    """This class is used for scheduling and sending a scheduled transfers in the EVA protocol"""
+    """This class is used for scheduling and sending a scheduled transfers in the EVA protocol.
+
+    Scheduled transfers are kept in FIFO queues, one per peer, container and priority class.
+    Queues whose peer has a free slot are kept in the `ready` deque of their class, which is
+    served in a round-robin manner, so peers share the bandwidth fairly. Releasing a slot
+    therefore starts the next eligible transfer in constant time, independent of the total
+    number of scheduled transfers.
+
+    The classes are served in a weighted round-robin order (see `settings.scheduling`), so
+    interactive transfers don't wait behind a burst of bulk transfers.
+
+    In the case that batching is enabled (see `settings.batching`), small write transfers at
+    the head of a queue are merged into a single batch transfer when the queue is served.
+    """
 
     def __init__(self, eva: EVAProtocol):
         self.logger = logging.getLogger(self.__class__.__name__)
 
         self.eva = eva
-        self.scheduled: Dict[Transfer] = {}  # this dict is used as an ordered set
+        self.queues: Dict[QueueKey, Deque[Transfer]] = {}
+        self.ready: Dict[Priority, Deque[QueueKey]] = {priority: deque() for priority in Priority}
+        self.ready_keys: Set[QueueKey] = set()
+        self.scheduled_count = 0
+        self.turn = 0
 
         self.task_group = AsyncGroup()
 
     def can_be_send_immediately(self, transfer: Transfer) -> bool:
         """Test the transfer and decide can it be sent immediately or not"""
-        peer_is_free = transfer.peer not in transfer.container
-        return peer_is_free and not self._is_simultaneously_served_transfers_limit_exceeded()
+        return self._is_peer_free(transfer.peer, transfer.container) and \
+            not self._is_simultaneously_served_transfers_limit_exceeded(transfer.priority)
 
     def schedule(self, transfer: Transfer) -> Future[TransferResult]:
         """Schedule transfer for the sending. In the case it can be sent immediately, it send immediately,
@@ -35,37 +63,138 @@ class Scheduler:
         if self.eva.shutting_down:
             raise RuntimeError('The protocol is in the shutting down state')
 
-        if not self.can_be_send_immediately(transfer):
-            self.scheduled[transfer] = True
-        else:
+        key = self._queue_key(transfer.peer, transfer.container, transfer.priority)
+        if key not in self.queues and self.can_be_send_immediately(transfer):
             transfer.start()
+            return transfer.future
+
+        queue = self.queues.get(key)
+        if queue is None:
+            queue = self.queues[key] = deque()
+        queue.append(transfer)
+        self.scheduled_count += 1
 
+        self.send_scheduled(transfer.peer, transfer.container)
         return transfer.future
 
-    def send_scheduled(self) -> List[Transfer]:
-        """Select transfers that can be sent immediately and send them"""
+    def send_scheduled(self, peer: Optional[Peer] = None, container: Optional[Container] = None) -> List[Transfer]:
+        """Send scheduled transfers while there are free slots.
+
+        Args:
+            peer: the peer that has released a slot in the container, if any
+            container: the container in which the slot has been released
+        """
         started = []
         if self.eva.shutting_down:
             return started
 
-        self.logger.debug('Looking for scheduled transfers for send...')
-        for transfer in self._transfers_that_can_be_send():
-            if self._is_simultaneously_served_transfers_limit_exceeded():
+        if peer is not None:
+            for priority in Priority:
+                self._mark_ready(self._queue_key(peer, container, priority), peer, container)
+
+        while True:
+            key = self._next_ready()
+            if key is None:
                 break
-            self.scheduled.pop(transfer)
+
+            queue = self.queues.get(key)
+            while queue and queue[0].finished:  # the transfer was cancelled while it was scheduled
+                queue.popleft()
+                self.scheduled_count -= 1
+
+            if not queue:
+                self.queues.pop(key, None)
+                continue
+
+            transfer = queue[0]
+            peer, container = transfer.peer, transfer.container
+            if not self._is_peer_free(peer, container):
+                continue  # the queue becomes ready again when the peer releases a slot
+
+            queue.popleft()
+            self.scheduled_count -= 1
+            batched = self._take_batched(transfer, queue)
+            if not queue:
+                self.queues.pop(key)
+            if batched:
+                transfer = self.eva.create_batch([transfer, *batched])
+
             self.logger.debug(f'Scheduled send: {transfer}')
             started.append(transfer)
-
             transfer.start()
 
+            self._mark_ready(key, peer, container)
+
         return started
 
+    def _take_batched(self, transfer: Transfer, queue: Deque[Transfer]) -> List[OutgoingTransfer]:
+        """Take transfers from the head of the queue that can be sent in a batch with the transfer"""
+        batching = self.eva.settings.batching
+        if not batching.enabled or not self._is_batchable(transfer):
+            return []
+
+        batched = []
+        size = self._batch_entry_size(transfer)
+        while queue and len(batched) + 1 < batching.max_entries:
+            candidate = queue[0]
+            if not candidate.finished:
+                if not self._is_batchable(candidate) or size + self._batch_entry_size(candidate) > batching.max_size:
+                    break
+                size += self._batch_entry_size(candidate)
+                batched.append(candidate)
+            queue.popleft()
+            self.scheduled_count -= 1
+
+        return batched
+
+    def _is_batchable(self, transfer: Transfer) -> bool:
+        return isinstance(transfer, OutgoingTransfer) and isinstance(transfer.request, WriteRequest) and \
+            transfer.request.kind == TransferKind.SINGLE and \
+            self._batch_entry_size(transfer) <= self.eva.settings.batching.max_entry_size
+
+    @staticmethod
+    def _batch_entry_size(transfer: OutgoingTransfer) -> int:
+        data = transfer.data if transfer.uncompressed_data is None else transfer.uncompressed_data
+        return len(transfer.info) + len(data)
+
     async def shutdown(self):
         await self.task_group.cancel()
 
-    def _transfers_that_can_be_send(self) -> Iterable[Transfer]:
-        return (transfer for transfer in list(self.scheduled.keys()) if self.can_be_send_immediately(transfer))
+    def _next_ready(self) -> Optional[QueueKey]:
+        """Pop the next ready queue according to the weights of the priority classes"""
+        scheduling = self.eva.settings.scheduling
+        turns = [Priority.INTERACTIVE] * scheduling.interactive_weight + [Priority.BULK] * scheduling.bulk_weight
+        for _ in range(len(turns)):
+            priority = turns[self.turn % len(turns)]
+            self.turn = (self.turn + 1) % len(turns)
+
+            ready = self.ready[priority]
+            if ready and not self._is_simultaneously_served_transfers_limit_exceeded(priority):
+                key = ready.popleft()
+                self.ready_keys.discard(key)
+                return key
+
+        return None
+
+    def _mark_ready(self, key: QueueKey, peer: Peer, container: Container):
+        if key in self.ready_keys or key not in self.queues or not self._is_peer_free(peer, container):
+            return
+
+        _, _, priority = key
+        self.ready[priority].append(key)
+        self.ready_keys.add(key)
+
+    def _is_peer_free(self, peer: Peer, container: Container) -> bool:
+        return container.count(peer) < self.eva.settings.max_simultaneous_transfers_per_peer
+
+    @staticmethod
+    def _queue_key(peer: Peer, container: Container, priority: Priority) -> QueueKey:
+        return peer, id(container), priority
+
+    def _is_simultaneously_served_transfers_limit_exceeded(self, priority: Priority) -> bool:
+        limit = self.eva.settings.max_simultaneous_transfers
+        if priority != Priority.INTERACTIVE:
+            limit -= self.eva.settings.scheduling.interactive_reserved_transfers
 
-    def _is_simultaneously_served_transfers_limit_exceeded(self) -> bool:
         transfers_count = len(self.eva.incoming) + len(self.eva.outgoing)
-        return transfers_count >= self.eva.settings.max_simultaneous_transfers
+        return transfers_count >= limit
@@ -1,4 +1,5 @@
 from dataclasses import dataclass, field
+from typing import Optional
 
 
 @dataclass
@@ -7,6 +8,9 @@ class Retransmission:
     attempts: int = 3
     # An interval after which the next attempt to retransmit will perform
     interval: float = 3.0
+    # A count of blocks that have to be received after a missing block before the missing block is requested
+    # again without waiting for the retransmission interval (fast retransmit)
+    fast_retransmit_threshold: int = 3
 
 
 @dataclass
@@ -17,6 +21,124 @@ class Termination:
     enabled: bool = True
 
 
+@dataclass
+class CongestionControl:
+    # The flag indicating is congestion control enabled or not. If disabled, the fixed `window_size` is used
+    enabled: bool = False
+    # A window size that is used for the first window of a peer
+    initial_window_size: int = 4
+    # Lower and upper bounds for the adaptive window size
+    min_window_size: int = 1
+    max_window_size: int = 256
+    # A factor that is applied to the window size after a loss has been detected
+    decrease_factor: float = 0.5
+    # A lower bound for the retransmission interval, derived from the measured round trip time
+    min_retransmission_interval: float = 0.5
+
+
+@dataclass
+class Compression:
+    # The flag indicating is compression of the sent data enabled or not
+    enabled: bool = False
+    # A codec that is used for compressible data (see `descan.eva.compression.Codec`)
+    codec: int = 1
+    # A compression level
+    level: int = 6
+    # Data smaller than this size is sent uncompressed
+    min_size: int = 1024
+    # A size of the data prefix that is compressed to estimate compressibility of the data
+    probe_size: int = 4096
+    # The data is compressed only in the case that the probe is compressed to this fraction of its size or less
+    max_ratio: float = 0.9
+    # An upper limit for the decompressed size as a multiple of the compressed size. The receiver reserves memory for
+    # the decompressed data up to this limit and rejects data that decompresses to more. The sender sends data that
+    # compresses better than this as is
+    max_expansion: int = 100
+
+
+@dataclass
+class ForwardErrorCorrection:
+    # The flag indicating is forward error correction enabled or not. If enabled, each group of sent blocks is
+    # followed by an XOR parity block, so a single lost block of the group is rebuilt without retransmission
+    enabled: bool = False
+    # Bounds for the count of blocks in a group. The count adapts to the observed loss rate
+    min_group_size: int = 4
+    max_group_size: int = 32
+    # The redundancy (1 / group size) is kept at `redundancy_factor * loss rate`
+    redundancy_factor: float = 2.0
+    # A weight of the latest window in the loss rate estimation
+    loss_smoothing: float = 0.25
+
+
+@dataclass
+class Pacing:
+    # The flag indicating is pacing of sent data enabled or not. If disabled, a window is sent back-to-back
+    enabled: bool = False
+    # An upper limit for the rate of all sent data, bytes per second
+    global_rate: float = 10 * 1024 * 1024
+    # A count of bytes that can be sent back-to-back (the capacity of the token buckets)
+    burst_size: int = 8 * 1024
+    # The rate of a peer is `pacing_gain * window bytes / RTT`. A gain above 1 lets the rate grow
+    pacing_gain: float = 1.25
+    # A lower bound for the rate of a peer, bytes per second
+    min_peer_rate: float = 64 * 1024
+    # The rate of a peer (its token bucket and smoothed RTT) is dropped after nothing has been sent to the peer
+    # for this time, in seconds
+    idle_timeout: float = 60.0
+
+
+@dataclass
+class Resumption:
+    # The flag indicating is resumption of interrupted transfers enabled or not
+    enabled: bool = True
+    # Transfers smaller than this size are not resumed
+    min_size: int = 64 * 1024
+    # An upper limit for the total size of the stored parts of interrupted transfers
+    max_size: int = 64 * 1024 * 1024
+    # A directory in which the parts are stored to survive a restart. If not set, the parts are kept in memory
+    directory: Optional[str] = None
+
+
+@dataclass
+class Backpressure:
+    # An upper limit for the total data size of incoming transfers that are buffered in memory. Write requests
+    # above the limit are rejected with `BackpressureException`
+    memory_budget: int = 256 * 1024 * 1024
+    # An interval after which a rejected write request is sent again. The interval doubles on each rejection
+    retry_interval: float = 1.0
+    max_retry_interval: float = 30.0
+    # A limit for the count of rejections of a single transfer
+    attempts: int = 5
+
+
+@dataclass
+class Batching:
+    # The flag indicating is batching enabled or not. If enabled, small write transfers that wait in the scheduler
+    # for the same peer are merged into a single transfer
+    enabled: bool = False
+    # Transfers with data larger than this size are not merged
+    max_entry_size: int = 4 * 1024
+    # Upper limits for the data size and the count of entries of a batch
+    max_size: int = 64 * 1024
+    max_entries: int = 64
+
+
+@dataclass
+class Scheduling:
+    # Weights of the priority classes. Scheduled transfers of the classes are started in a weighted round-robin
+    # order, so interactive transfers are not stuck behind bulk ones and bulk transfers are not starved.
+    # Both weights should be at least 1
+    interactive_weight: int = 4
+    bulk_weight: int = 1
+    # A count of simultaneously served transfers that can be used only by interactive transfers
+    interactive_reserved_transfers: int = 0
+
+    def __post_init__(self):
+        if self.interactive_weight < 1 or self.bulk_weight < 1:
+            raise ValueError(f'Weights of the priority classes should be at least 1: '
+                             f'{self.interactive_weight}, {self.bulk_weight}')
+
+
 @dataclass
 class EVASettings:
     # A single block size in bytes. Please keep in mind that  ipv8 adds approx. 177 bytes to each packet.
@@ -27,11 +149,29 @@ class EVASettings:
     start_message_id: int = 186
     retransmission: Retransmission = field(default_factory=Retransmission)
     termination: Termination = field(default_factory=Termination)
+    congestion_control: CongestionControl = field(default_factory=CongestionControl)
+    compression: Compression = field(default_factory=Compression)
+    scheduling: Scheduling = field(default_factory=Scheduling)
+    resumption: Resumption = field(default_factory=Resumption)
+    fec: ForwardErrorCorrection = field(default_factory=ForwardErrorCorrection)
+    pacing: Pacing = field(default_factory=Pacing)
+    backpressure: Backpressure = field(default_factory=Backpressure)
+    batching: Batching = field(default_factory=Batching)
     # An interval after which the next scheduled transfer will be send
     scheduled_send_interval: float = 5.0
+    # A resolution (in seconds) of the timer wheel that serves timeouts and retransmissions of all transfers
+    timer_resolution: float = 0.05
     # Limit for binary data size. If this limit will be exceeded, the exception will be returned through a registered
     # error handler
     binary_size_limit: int = 1024 * 1024 * 1024
+    # Limit for binary data size of transfers that are received into a sink and therefore are not kept in memory
+    streaming_size_limit: int = 0xFFFFFFFF
     # An upper limit of simultaneously served peers. The reason for introducing this parameter is to have a tool for
     # limiting socket load which could lead to packet loss.
     max_simultaneous_transfers: int = 10
+    # An upper limit of simultaneously served transfers per peer and per direction. Transfers above this limit are
+    # scheduled and started once a slot for the peer becomes free.
+    max_simultaneous_transfers_per_peer: int = 4
+    # An upper limit for the count of peers whose state (e.g. congestion control, loss estimation) is kept between
+    # transfers. The state of the least recently used peers is dropped
+    max_peer_states: int = 1000
@@ -0,0 +1,44 @@
+from __future__ import annotations
+
+import os
+from abc import ABC, abstractmethod
+from typing import Optional
+
+from descan.eva.exceptions import TransferException
+
+
+class TransferSink(ABC):
+    """A sink receives the data of an incoming transfer incrementally.
+
+    Chunks are passed to the sink in order, as soon as a window has been completed, so
+    the data can be processed while the rest of it is still arriving. The received data
+    is not accumulated in memory by the protocol.
+    """
+
+    @abstractmethod
+    def write(self, chunk: memoryview):
+        """Process the next chunk of the data. Raising an exception terminates the transfer"""
+
+    def close(self):
+        """The transfer has been completed successfully"""
+
+    def abort(self, exception: Optional[TransferException]):
+        """The transfer has been terminated before all data was received"""
+
+
+class FileSink(TransferSink):
+    """This sink writes the received data into a file. The file is removed if the transfer fails"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.file = open(path, 'wb')  # pylint: disable=consider-using-with
+
+    def write(self, chunk: memoryview):
+        self.file.write(chunk)
+
+    def close(self):
+        self.file.close()
+
+    def abort(self, exception: Optional[TransferException]):
+        self.file.close()
+        os.remove(self.path)
@@ -0,0 +1,209 @@
+from __future__ import annotations
+
+import math
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Deque, Dict, List, Optional
+
+from ipv8.types import Peer
+
+from descan.eva.priority import Priority
+from descan.eva.utils.lru_cache import LRUCache
+
+
+class Histogram:
+    """A histogram with power-of-two buckets.
+
+    It keeps a constant amount of memory per order of magnitude of the recorded values,
+    so it can be used for any non-negative quantity (seconds, bytes per second, blocks).
+    Percentiles are estimated by the upper bound of the bucket.
+    """
+
+    def __init__(self):
+        self.buckets: Dict[int, int] = {}
+        self.count = 0
+        self.total = 0.0
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+
+    def add(self, value: float):
+        exponent = math.frexp(value)[1] if value > 0 else -1074
+        self.buckets[exponent] = self.buckets.get(exponent, 0) + 1
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def merge(self, other: Histogram):
+        for exponent, count in other.buckets.items():
+            self.buckets[exponent] = self.buckets.get(exponent, 0) + count
+        self.count += other.count
+        self.total += other.total
+        if other.count:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+            self.max = other.max if self.max is None else max(self.max, other.max)
+
+    @property
+    def mean(self) -> Optional[float]:
+        return self.total / self.count if self.count else None
+
+    def percentile(self, percent: float) -> Optional[float]:
+        if not self.count:
+            return None
+
+        rank = math.ceil(self.count * percent / 100)
+        seen = 0
+        for exponent in sorted(self.buckets):
+            seen += self.buckets[exponent]
+            if seen >= rank:
+                return min(math.ldexp(1, exponent), self.max)
+        return self.max
+
+    def to_dict(self) -> Dict[str, Optional[float]]:
+        return {
+            'count': self.count,
+            'mean': self.mean,
+            'min': self.min,
+            'p50': self.percentile(50),
+            'p90': self.percentile(90),
+            'p99': self.percentile(99),
+            'max': self.max,
+        }
+
+
+@dataclass
+class TransferStatistics:
+    """Statistics of a single transfer. Times are loop times in seconds"""
+    peer: Peer
+    incoming: bool
+    priority: Priority
+    created: float
+    started: Optional[float] = None
+    finished: Optional[float] = None
+    succeeded: bool = False
+    # A size of the transferred data
+    data_size: int = 0
+    # Data bytes and blocks that have been sent or received (including retransmissions)
+    bytes: int = 0
+    blocks: int = 0
+    # Blocks that have been sent (or received) more than once
+    retransmitted_blocks: int = 0
+    # Blocks that have been rebuilt from repair blocks (incoming) or repair blocks that have been sent (outgoing)
+    repair_blocks: int = 0
+    # Retransmissions of requests and acknowledgements caused by timeouts
+    timeouts: int = 0
+    # Round trip time samples: the time between an acknowledgement and the completion of the next window
+    rtt: Histogram = field(default_factory=Histogram)
+    # The window size evolution. A size is recorded when it differs from the previous one
+    window_sizes: List[int] = field(default_factory=list)
+
+    @property
+    def queued_time(self) -> Optional[float]:
+        """The time the transfer waited in the scheduler"""
+        return self.started - self.created if self.started is not None else None
+
+    @property
+    def duration(self) -> Optional[float]:
+        if self.started is None or self.finished is None:
+            return None
+        return self.finished - self.started
+
+    @property
+    def goodput(self) -> Optional[float]:
+        """Transferred data bytes per second. Retransmissions and repair blocks are not taken into account"""
+        duration = self.duration
+        if not self.succeeded or not duration:
+            return None
+        return self.data_size / duration
+
+    @property
+    def final_window_size(self) -> Optional[int]:
+        return self.window_sizes[-1] if self.window_sizes else None
+
+    def add_window_size(self, window_size: int):
+        if not self.window_sizes or self.window_sizes[-1] != window_size:
+            self.window_sizes.append(window_size)
+
+
+class AggregateStatistics:
+    """Counters and histograms over a set of finished transfers"""
+
+    def __init__(self):
+        self.transfers = 0
+        self.failed = 0
+        self.bytes = 0
+        self.blocks = 0
+        self.retransmitted_blocks = 0
+        self.repair_blocks = 0
+        self.timeouts = 0
+
+        self.goodput = Histogram()
+        self.rtt = Histogram()
+        self.queued_time = Histogram()
+        self.duration = Histogram()
+        self.final_window_size = Histogram()
+
+    def add(self, statistics: TransferStatistics):
+        self.transfers += 1
+        self.failed += not statistics.succeeded
+        self.bytes += statistics.bytes
+        self.blocks += statistics.blocks
+        self.retransmitted_blocks += statistics.retransmitted_blocks
+        self.repair_blocks += statistics.repair_blocks
+        self.timeouts += statistics.timeouts
+        self.rtt.merge(statistics.rtt)
+
+        for histogram, value in ((self.goodput, statistics.goodput),
+                                 (self.queued_time, statistics.queued_time),
+                                 (self.duration, statistics.duration),
+                                 (self.final_window_size, statistics.final_window_size)):
+            if value is not None:
+                histogram.add(value)
+
+    def to_dict(self) -> Dict:
+        return {
+            'transfers': self.transfers,
+            'failed': self.failed,
+            'bytes': self.bytes,
+            'blocks': self.blocks,
+            'retransmitted_blocks': self.retransmitted_blocks,
+            'repair_blocks': self.repair_blocks,
+            'timeouts': self.timeouts,
+            'goodput': self.goodput.to_dict(),
+            'rtt': self.rtt.to_dict(),
+            'queued_time': self.queued_time.to_dict(),
+            'duration': self.duration.to_dict(),
+            'final_window_size': self.final_window_size.to_dict(),
+        }
+
+
+class EVAStatistics:
+    """Statistics of the finished transfers of the protocol.
+
+    Transfers are aggregated by direction and by peer. The statistics of the most recent
+    transfers are kept as well. Only the `max_peers` most recently seen peers are aggregated
+    separately; the direction aggregates cover the transfers of all peers.
+
+    An example:
+    >>> statistics = community.eva.statistics
+    >>> print(statistics.incoming.goodput.percentile(50), statistics.outgoing.rtt.percentile(99))
+    """
+
+    def __init__(self, history_size: int = 100, max_peers: int = 1000):
+        self.incoming = AggregateStatistics()
+        self.outgoing = AggregateStatistics()
+        self.peers: LRUCache[Peer, AggregateStatistics] = LRUCache(max_peers)
+        self.history: Deque[TransferStatistics] = deque(maxlen=history_size)
+
+    def add(self, statistics: TransferStatistics):
+        (self.incoming if statistics.incoming else self.outgoing).add(statistics)
+
+        self.peers.get_or_create(statistics.peer, AggregateStatistics).add(statistics)
+
+        self.history.append(statistics)
+
+    def to_dict(self) -> Dict:
+        return {
+            'incoming': self.incoming.to_dict(),
+            'outgoing': self.outgoing.to_dict(),
+        }
@@ -0,0 +1,26 @@
+import pytest
+
+from descan.eva.batch import pack_batch, unpack_batch
+from descan.eva.exceptions import ValueException
+
+
+def test_pack_unpack():
+    entries = [(b'info0', b'data0'), (b'', b'data1'), (b'info2', b'')]
+
+    unpacked = unpack_batch(pack_batch(entries))
+
+    assert [(info, bytes(data)) for info, data in unpacked] == entries
+
+
+def test_unpack_empty():
+    assert unpack_batch(b'') == []
+
+
+def test_unpack_truncated():
+    batch = pack_batch([(b'info', b'data')])
+
+    with pytest.raises(ValueException):
+        unpack_batch(batch[:-1])
+
+    with pytest.raises(ValueException):
+        unpack_batch(batch + b'\x00')
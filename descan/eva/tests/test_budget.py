@@ -0,0 +1,13 @@
+from descan.eva.budget import MemoryBudget
+
+
+def test_reserve_and_release():
+    budget = MemoryBudget(size=100)
+
+    assert budget.reserve(60)
+    assert not budget.reserve(50)
+    assert budget.available == 40
+
+    budget.release(60)
+    assert budget.reserve(100)
+    assert not budget.available
@@ -0,0 +1,67 @@
+import os
+import zlib
+
+import pytest
+
+from descan.eva.compression import Codec, Decompressor, choose_codec, compress
+from descan.eva.exceptions import CompressionException, SizeException
+from descan.eva.settings import Compression
+
+DATA = b'{"head": "0123456789abcdef", "relation": "has_hash", "tail": "fedcba9876543210"}' * 100
+
+
+@pytest.mark.parametrize('codec', [Codec.ZLIB, Codec.BZ2, Codec.LZMA])
+def test_compress_decompress(codec: Codec):
+    compressed = compress(codec, DATA)
+    assert len(compressed) < len(DATA)
+
+    decompressor = Decompressor(codec, size_limit=len(DATA))
+    # the data is decompressed incrementally, chunk by chunk
+    chunks = [decompressor.decompress(compressed[i:i + 10]) for i in range(0, len(compressed), 10)]
+    decompressor.finish()
+
+    assert b''.join(chunks) == DATA
+
+
+def test_compress_none():
+    assert compress(Codec.NONE, memoryview(DATA)) == DATA
+
+
+def test_choose_codec():
+    settings = Compression(enabled=True, codec=Codec.LZMA)
+
+    assert choose_codec(DATA, settings) == Codec.LZMA
+    assert choose_codec(os.urandom(len(DATA)), settings) == Codec.NONE  # incompressible
+    assert choose_codec(DATA[:settings.min_size - 1], settings) == Codec.NONE  # too small
+
+
+def test_choose_codec_disabled():
+    assert choose_codec(DATA, Compression(enabled=False)) == Codec.NONE
+
+
+def test_decompress_size_limit():
+    # A small compressed payload that expands to a big one should be detected
+    decompressor = Decompressor(Codec.ZLIB, size_limit=len(DATA) - 1)
+
+    with pytest.raises(SizeException):
+        decompressor.decompress(zlib.compress(DATA))
+
+
+def test_decompress_corrupted():
+    decompressor = Decompressor(Codec.ZLIB, size_limit=len(DATA))
+
+    with pytest.raises(CompressionException):
+        decompressor.decompress(b'corrupted data')
+
+
+def test_decompress_truncated():
+    decompressor = Decompressor(Codec.ZLIB, size_limit=len(DATA))
+    decompressor.decompress(zlib.compress(DATA)[:-10])
+
+    with pytest.raises(CompressionException):
+        decompressor.finish()
+
+
+def test_unknown_codec():
+    with pytest.raises(CompressionException):
+        Decompressor(Codec.NONE, size_limit=1)
@@ -0,0 +1,94 @@
+from unittest.mock import AsyncMock, Mock
+
+import pytest
+
+from descan.eva.congestion import CongestionController
+from descan.eva.protocol import EVAProtocol
+from descan.eva.settings import CongestionControl, EVASettings, Termination
+from descan.eva.transfer.incoming import IncomingTransfer
+
+
+# pylint: disable=redefined-outer-name, protected-access
+
+@pytest.fixture
+def settings() -> EVASettings:
+    return EVASettings(
+        congestion_control=CongestionControl(enabled=True, initial_window_size=2, max_window_size=16),
+        termination=Termination(enabled=False)
+    )
+
+
+@pytest.fixture
+def controller(settings: EVASettings) -> CongestionController:
+    return CongestionController(settings)
+
+
+def test_slow_start(controller: CongestionController):
+    controller.on_window_completed(0.1)
+    controller.on_window_completed(0.1)
+
+    assert controller.window_size == 8
+
+
+def test_window_is_bounded(controller: CongestionController):
+    for _ in range(10):
+        controller.on_window_completed(0.1)
+
+    assert controller.window_size == 16
+
+
+def test_additive_increase_after_loss(controller: CongestionController):
+    controller.window_size = 8
+    controller.on_loss()
+    assert controller.window_size == 4
+
+    controller.on_window_completed(0.1)
+    assert controller.window_size == 5
+
+
+def test_timeout(controller: CongestionController):
+    controller.window_size = 8
+    controller.on_timeout()
+
+    assert controller.window_size == 1
+    assert controller.slow_start_threshold == 4
+    assert controller.backoff == 2
+
+
+def test_retransmission_interval(controller: CongestionController):
+    assert controller.retransmission_interval == controller.settings.retransmission.interval
+
+    controller.on_window_completed(0.2)
+    assert controller.retransmission_interval == pytest.approx(0.6)
+
+    controller.on_timeout()
+    assert controller.retransmission_interval == pytest.approx(1.2)
+
+
+async def test_incoming_transfer_window_size(settings: EVASettings):
+    eva = EVAProtocol(community=Mock(), settings=settings)
+    peer = Mock()
+    transfer = IncomingTransfer(
+        container=eva.incoming,
+        info=b'info',
+        data_size=100,
+        nonce=0,
+        protocol_task_group=eva.task_group,
+        send_message=Mock(),
+        on_complete=AsyncMock(),
+        on_error=AsyncMock(),
+        peer=peer,
+        settings=settings,
+        congestion_controller=eva.get_congestion_controller(peer)
+    )
+
+    acknowledgement = transfer.make_acknowledgement()
+    assert acknowledgement.window_size == 2
+
+    transfer.on_data(0, b'a')
+    acknowledgement = transfer.on_data(1, b'b')
+    assert acknowledgement.number == 2
+    assert acknowledgement.window_size == 4
+    assert eva.get_congestion_controller(peer) is transfer.congestion_controller
+
+    await eva.shutdown()
@@ -0,0 +1,54 @@
+import pytest
+
+from descan.eva.fec import LossEstimator, count_lost, recover_block, xor_blocks, xor_lengths
+from descan.eva.settings import ForwardErrorCorrection
+
+
+@pytest.mark.parametrize('lost', [0, 1, 2])
+def test_recover_block(lost: int):
+    # The last block is shorter than the block size
+    group = [b'0123456789', b'abcdefghij', b'xyz']
+    parity = xor_blocks(group, size=10)
+    length = xor_lengths(group)
+
+    received = group[:lost] + group[lost + 1:]
+
+    assert recover_block(parity, length, received) == group[lost]
+
+
+def test_recover_empty_block():
+    # The final (empty) block of the transfer can be rebuilt as well
+    group = [b'0123456789', b'']
+    parity = xor_blocks(group, size=10)
+
+    assert recover_block(parity, xor_lengths(group), [b'0123456789']) == b''
+
+
+def test_count_lost():
+    assert count_lost(b'\x0b', 4) == 1
+    assert count_lost(b'\xff\x01', 9) == 0
+    assert count_lost(b'', 3) == 3
+
+
+def test_loss_estimator_group_size():
+    settings = ForwardErrorCorrection(min_group_size=4, max_group_size=32, redundancy_factor=2, loss_smoothing=1)
+    estimator = LossEstimator(settings)
+    assert estimator.group_size == 32  # no losses were observed
+
+    estimator.update(lost=1, total=40)
+    assert estimator.group_size == 20
+
+    estimator.update(lost=16, total=16)
+    assert estimator.group_size == 4
+
+    estimator.update(lost=0, total=0)  # ignored
+    assert estimator.group_size == 4
+
+
+def test_loss_estimator_smoothing():
+    estimator = LossEstimator(ForwardErrorCorrection(loss_smoothing=0.5))
+
+    estimator.update(lost=1, total=10)
+    estimator.update(lost=0, total=10)
+
+    assert estimator.loss_rate == pytest.approx(0.025)
@@ -0,0 +1,20 @@
+from descan.eva.utils.lru_cache import LRUCache
+
+
+def test_get_or_create():
+    cache = LRUCache(max_size=2)
+
+    first = cache.get_or_create('first', list)
+    assert cache.get_or_create('first', list) is first
+    assert len(cache) == 1
+
+
+def test_max_size():
+    # The least recently used entries are dropped first
+    cache = LRUCache(max_size=2)
+    cache.get_or_create('first', list)
+    cache.get_or_create('second', list)
+    cache.get_or_create('first', list)
+    cache.get_or_create('third', list)
+
+    assert list(cache) == ['first', 'third']
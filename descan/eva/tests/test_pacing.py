@@ -0,0 +1,140 @@
+import asyncio
+from unittest.mock import Mock
+
+import pytest
+
+from descan.eva.pacing import Pacer, TokenBucket
+from descan.eva.settings import Pacing
+from simulation.discrete_loop import DiscreteLoop
+
+
+# pylint: disable=redefined-outer-name
+
+
+def test_token_bucket():
+    bucket = TokenBucket(rate=100, capacity=200, now=0)
+
+    assert bucket.delay(200, now=0) == 0
+    bucket.consume(200, now=0)
+
+    assert bucket.delay(50, now=0) == pytest.approx(0.5)
+    assert bucket.delay(50, now=0.5) == 0
+    assert bucket.delay(1000, now=10) == 0  # the bucket is never filled above the capacity
+
+
+def test_token_bucket_remainder():
+    # A floating-point remainder of the refill does not delay a packet
+    bucket = TokenBucket(rate=1000 / 7, capacity=1000, now=0)
+    bucket.tokens = 999.9999999999882
+    assert bucket.delay(1000, now=0) == 0
+
+
+@pytest.fixture
+async def pacer():
+    pacer = Pacer(Pacing(global_rate=1000, burst_size=100), send_message=Mock())
+    yield pacer
+    pacer.stop()
+
+
+@pytest.mark.looptime
+async def test_send_burst(pacer: Pacer):
+    loop = asyncio.get_running_loop()
+    sent = []
+    pacer.send_message = Mock(side_effect=lambda peer, message: sent.append((message, loop.time())))
+
+    for index in range(4):
+        pacer.send(Mock(), index, 50)
+
+    # two packets fit into the burst, the rest are spread by the global rate
+    assert [message for message, _ in sent] == [0, 1]
+
+    await asyncio.sleep(1)
+
+    assert sent == [(0, 0), (1, 0), (2, pytest.approx(0.05)), (3, pytest.approx(0.1))]
+
+
+@pytest.mark.looptime
+async def test_peer_rate(pacer: Pacer):
+    loop = asyncio.get_running_loop()
+    pacer.settings.min_peer_rate = 0
+    pacer.settings.pacing_gain = 1
+    peer = Mock()
+    sent = []
+    pacer.send_message = Mock(side_effect=lambda peer, message: sent.append(loop.time()))
+
+    # 100 bytes per 1 second round trip
+    pacer.on_rtt_sample(peer, rtt=1, window_bytes=100)
+    assert pacer.peer_buckets[peer].rate == 100
+
+    for _ in range(3):
+        pacer.send(peer, b'', 100)
+    await asyncio.sleep(3)
+
+    assert sent == [0, pytest.approx(1), pytest.approx(2)]
+
+
+@pytest.mark.looptime
+async def test_round_robin(pacer: Pacer):
+    # Packets of a peer should not wait behind all packets of another peer
+    peer_a, peer_b = Mock(), Mock()
+    sent = []
+    pacer.send_message = Mock(side_effect=lambda peer, message: sent.append(message))
+
+    for index in range(3):
+        pacer.send(peer_a, f'a{index}', 100)
+    pacer.send(peer_b, 'b0', 100)
+    await asyncio.sleep(1)
+
+    assert sent == ['a0', 'a1', 'b0', 'a2']
+
+
+@pytest.mark.looptime
+async def test_evict_idle_buckets(pacer: Pacer):
+    pacer.settings.idle_timeout = 10
+    idle_peer, active_peer = Mock(), Mock()
+    pacer.on_rtt_sample(idle_peer, rtt=1, window_bytes=100)
+    pacer.on_rtt_sample(active_peer, rtt=1, window_bytes=100)
+
+    await asyncio.sleep(5)
+    pacer.send(active_peer, b'', 10)
+    await asyncio.sleep(5)
+    pacer.on_rtt_sample(Mock(), rtt=1, window_bytes=100)
+
+    assert idle_peer not in pacer.peer_buckets
+    assert idle_peer not in pacer.smoothed_rtt
+    assert active_peer in pacer.peer_buckets
+    assert len(pacer.peer_buckets) == 2
+
+
+@pytest.mark.parametrize("rate, size", [(1000 / 3, 1000), (1000 / 7, 333), (123.456, 1000)])
+def test_drain_discrete_loop(rate: float, size: int):
+    # In a discrete loop, a tiny delay does not advance the clock. The pacer should still make progress
+    loop = DiscreteLoop()
+    sent = []
+    pacer = Pacer(Pacing(global_rate=rate, burst_size=1000), send_message=lambda peer, message: sent.append(message))
+    drain = pacer._drain
+    drains = []
+
+    def counting_drain():
+        drains.append(loop.time())
+        if len(drains) > 1000:
+            loop.stop()
+            return
+        drain()
+
+    pacer._drain = counting_drain
+    peer = Mock()
+
+    def send_all():
+        pacer.on_rtt_sample(peer, rtt=0.3, window_bytes=size * 7 / 3)
+        for index in range(100):
+            pacer.send(peer, index, size)
+
+    loop.call_soon(send_all)
+    try:
+        loop.run_forever()
+    finally:
+        asyncio.events._set_running_loop(None)  # The discrete loop does not unset itself
+
+    assert sent == list(range(100))
+    assert len(drains) < 100
@@ -0,0 +1,334 @@
+import asyncio
+import hashlib
+import os
+from unittest.mock import AsyncMock, Mock
+
+from ipv8.community import Community
+from ipv8.test.base import TestBase
+
+from descan.eva.compression import Codec
+from descan.eva.exceptions import BackpressureException, SizeException, ValueException
+from descan.eva.payload import Data
+from descan.eva.protocol import EVAProtocol
+from descan.eva.settings import EVASettings
+from descan.eva.sink import TransferSink
+
+
+class ListSink(TransferSink):
+    def __init__(self):
+        self.chunks = []
+        self.closed = False
+
+    def write(self, chunk: memoryview):
+        self.chunks.append(bytes(chunk))
+
+    def close(self):
+        self.closed = True
+
+
+class MockCommunity(Community):
+    community_id = os.urandom(20)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.received = []
+        self.eva = EVAProtocol(self, self.on_receive, settings=EVASettings(block_size=10, window_size=8))
+
+    async def on_receive(self, result):
+        self.received.append(result)
+
+    async def unload(self):
+        await self.eva.shutdown()
+        await super().unload()
+
+
+class TestEVAProtocol(TestBase):
+
+    def setUp(self):
+        super().setUp()
+        self.initialize(MockCommunity, 2)
+
+    def overlay(self, index: int) -> MockCommunity:
+        return self.nodes[index].overlay
+
+    def peer(self, index: int):
+        return self.nodes[index].my_peer
+
+    async def test_send_binary(self):
+        data = os.urandom(1000)
+
+        result = await self.overlay(0).eva.send_binary(self.peer(1), b'info', data)
+        await self.deliver_messages()
+
+        assert result.data == data
+        assert len(self.overlay(1).received) == 1
+        assert self.overlay(1).received[0].data == data
+        assert self.overlay(1).received[0].info == b'info'
+
+    async def test_concurrent_send_binary(self):
+        data_list = [os.urandom(200) for _ in range(6)]
+
+        futures = [self.overlay(0).eva.send_binary(self.peer(1), b'%d' % index, data)
+                   for index, data in enumerate(data_list)]
+        for future in futures:
+            await future
+        await self.deliver_messages()
+
+        received = {result.info: result.data for result in self.overlay(1).received}
+        assert received == {b'%d' % index: data for index, data in enumerate(data_list)}
+
+    async def test_send_binary_with_lost_block(self):
+        # The first transmission of the block 1 is lost, it should be recovered by a selective acknowledgement
+        data = os.urandom(200)
+        eva = self.overlay(0).eva
+        send_message = eva.send_message
+        lost = []
+
+        def lossy_send_message(peer, message):
+            if isinstance(message, Data) and message.number == 1 and not lost:
+                lost.append(message)
+                return
+            send_message(peer, message)
+
+        eva.send_message = Mock(wraps=lossy_send_message)
+        result = await eva.send_binary(self.peer(1), b'info', data)
+
+        assert lost
+        assert result.data == data
+        await self.deliver_messages()
+        assert self.overlay(1).received[0].data == data
+        # the size of a selective acknowledgement is not a window size
+        assert eva.statistics.history[0].window_sizes == self.overlay(1).eva.statistics.history[0].window_sizes
+
+    async def test_send_binary_into_sink(self):
+        data = os.urandom(1000)
+        sink = ListSink()
+        self.overlay(1).eva.sink_factory = Mock(return_value=sink)
+
+        await self.overlay(0).eva.send_binary(self.peer(1), b'info', data)
+        await self.deliver_messages()
+
+        # 1000 bytes are sent in blocks of 10 bytes and windows of 8 blocks
+        assert len(sink.chunks) == 13
+        assert b''.join(sink.chunks) == data
+        assert sink.closed
+        assert self.overlay(1).received[0].sink is sink
+        assert not self.overlay(1).received[0].data
+
+    async def test_send_binary_size_limit(self):
+        data = os.urandom(1000)
+        sink = ListSink()
+        eva = self.overlay(0).eva
+        eva.settings.binary_size_limit = 500
+        self.overlay(1).eva.sink_factory = Mock(return_value=sink)
+
+        with self.assertRaises(SizeException):
+            eva.send_binary(self.peer(1), b'info', data)
+
+        # The streaming limit applies only to the sends that are streamed by the receiver
+        await eva.send_binary(self.peer(1), b'info', data, streaming=True)
+        await self.deliver_messages()
+        assert b''.join(sink.chunks) == data
+
+    async def test_send_compressed_binary(self):
+        data = b'{"head": "0123456789abcdef", "relation": "has_hash"}' * 100
+        eva = self.overlay(0).eva
+        eva.settings.compression.enabled = True
+        eva.send_message = Mock(wraps=eva.send_message)
+
+        result = await eva.send_binary(self.peer(1), b'info', data)
+        await self.deliver_messages()
+
+        data_messages = [call.args[1] for call in eva.send_message.call_args_list if isinstance(call.args[1], Data)]
+        assert len(data_messages) < len(data) // eva.settings.block_size
+        assert result.data == data
+        assert bytes(self.overlay(1).received[0].data) == data
+
+    async def test_compressed_binary_reserves_decompressed_size(self):
+        # The receiver has memory for the compressed data, but not for the decompressed one
+        data = os.urandom(50) * 20
+        sender, receiver = self.overlay(0).eva, self.overlay(1).eva
+        sender.settings.backpressure.attempts = 0
+        receiver.memory_budget.size = 500
+
+        with self.assertRaises(BackpressureException):
+            await asyncio.wait_for(sender.send_binary(self.peer(1), b'info', data, codec=Codec.ZLIB), timeout=5)
+
+        receiver.memory_budget.size = 500 * (1 + receiver.settings.compression.max_expansion)
+        result = await asyncio.wait_for(sender.send_binary(self.peer(1), b'info', data, codec=Codec.ZLIB), timeout=5)
+        await self.deliver_messages()
+        assert result.data == data
+        assert receiver.memory_budget.used == 0
+
+    async def test_send_highly_compressible_binary(self):
+        # The data would decompress to more than the receiver accepts, so it is sent as is
+        data = b'0' * 10000
+        eva = self.overlay(0).eva
+        eva.settings.compression.max_expansion = 2
+
+        await eva.send_binary(self.peer(1), b'info', data, codec=Codec.ZLIB)
+        await self.deliver_messages()
+
+        assert eva.statistics.history[0].data_size == len(data)
+        assert bytes(self.overlay(1).received[0].data) == data
+
+    async def test_send_compressed_binary_into_sink(self):
+        data = os.urandom(100) * 20
+        sink = ListSink()
+        self.overlay(1).eva.sink_factory = Mock(return_value=sink)
+
+        await self.overlay(0).eva.send_binary(self.peer(1), b'info', data, codec=Codec.LZMA)
+        await self.deliver_messages()
+
+        assert b''.join(sink.chunks) == data
+        assert sink.closed
+
+    async def test_resume_binary(self):
+        # The receiver has already got the first half of the data in an interrupted transfer
+        data = os.urandom(1000)
+        sender, receiver = self.overlay(0).eva, self.overlay(1).eva
+        sender.settings.resumption.min_size = 0
+        receiver.resume_store.save(hashlib.sha1(data).digest(), data[:505])
+        sender.send_message = Mock(wraps=sender.send_message)
+
+        result = await sender.send_binary(self.peer(1), b'info', data)
+        await self.deliver_messages()
+
+        sent = [call.args[1].number for call in sender.send_message.call_args_list if isinstance(call.args[1], Data)]
+        assert min(sent) == 50  # only whole blocks are resumed
+        assert result.data == data
+        assert bytes(self.overlay(1).received[0].data) == data
+        assert not receiver.resume_store.sizes
+
+    async def test_resume_corrupted_part(self):
+        data = os.urandom(1000)
+        sender, receiver = self.overlay(0).eva, self.overlay(1).eva
+        sender.settings.resumption.min_size = 0
+        receiver.resume_store.save(hashlib.sha1(data).digest(), os.urandom(500))
+        error = asyncio.get_running_loop().create_future()
+        receiver.on_error = AsyncMock(side_effect=lambda _, exception: error.set_result(exception))
+
+        sender.send_binary(self.peer(1), b'info', data)
+
+        assert isinstance(await asyncio.wait_for(error, timeout=5), ValueException)
+        assert not self.overlay(1).received
+        assert not receiver.resume_store.sizes
+
+    async def test_send_binary_with_fec(self):
+        # The lost block 1 should be rebuilt from the repair block without retransmission
+        data = os.urandom(200)
+        eva = self.overlay(0).eva
+        eva.settings.fec.enabled = True
+        self.overlay(1).eva.settings.fec.enabled = True
+        send_message = eva.send_message
+        sent = []
+
+        def lossy_send_message(peer, message):
+            if isinstance(message, Data):
+                sent.append(message.number)
+                if message.number == 1:
+                    return
+            send_message(peer, message)
+
+        eva.send_message = Mock(wraps=lossy_send_message)
+        result = await eva.send_binary(self.peer(1), b'info', data)
+
+        assert sent.count(1) == 1
+        assert result.data == data
+        await self.deliver_messages()
+        assert self.overlay(1).received[0].data == data
+
+    async def test_loss_estimators_are_bounded(self):
+        eva = self.overlay(0).eva
+        eva.settings.fec.enabled = True
+        eva.loss_estimators.max_size = 2
+        peers = [Mock() for _ in range(3)]
+
+        estimators = [eva.get_loss_estimator(peer) for peer in peers]
+
+        assert list(eva.loss_estimators) == peers[1:]
+        assert eva.get_loss_estimator(peers[2]) is estimators[2]
+
+    async def test_send_binary_with_pacing(self):
+        data = os.urandom(1000)
+        eva = self.overlay(0).eva
+        eva.settings.pacing.enabled = True
+        eva.send_message = Mock(wraps=eva.send_message)
+
+        result = await eva.send_binary(self.peer(1), b'info', data)
+
+        assert result.data == data
+        # the peer rate has been derived from the measured round trip time
+        assert self.peer(1) in eva.pacer.peer_buckets
+
+    async def test_statistics(self):
+        data = os.urandom(1000)
+
+        await self.overlay(0).eva.send_binary(self.peer(1), b'info', data)
+        await self.deliver_messages()
+
+        outgoing = self.overlay(0).eva.statistics.outgoing
+        assert outgoing.transfers == 1
+        assert not outgoing.failed
+        assert outgoing.blocks >= 100
+        assert outgoing.goodput.count == 1
+        assert outgoing.final_window_size.count == 1
+        assert self.overlay(0).eva.statistics.peers[self.peer(1)].transfers == 1
+
+        incoming = self.overlay(1).eva.statistics.incoming
+        assert incoming.transfers == 1
+        assert incoming.rtt.count > 0
+        assert self.overlay(1).eva.statistics.history[0].data_size == len(data)
+
+    async def test_backpressure(self):
+        # The receiver has no memory at first, so the sender backs off until the budget is released
+        data = os.urandom(1000)
+        sender, receiver = self.overlay(0).eva, self.overlay(1).eva
+        sender.settings.backpressure.retry_interval = 0.1
+        receiver.memory_budget.used = receiver.memory_budget.size
+        asyncio.get_running_loop().call_later(0.15, receiver.memory_budget.release, receiver.memory_budget.size)
+
+        result = await asyncio.wait_for(sender.send_binary(self.peer(1), b'info', data), timeout=5)
+
+        assert result.data == data
+        assert sender.statistics.history[0].succeeded
+        assert receiver.memory_budget.used == 0
+
+    async def test_backpressure_attempts_are_over(self):
+        data = os.urandom(1000)
+        sender, receiver = self.overlay(0).eva, self.overlay(1).eva
+        sender.settings.backpressure.retry_interval = 0.05
+        sender.settings.backpressure.attempts = 2
+        receiver.memory_budget.size = 100
+
+        with self.assertRaises(BackpressureException):
+            await asyncio.wait_for(sender.send_binary(self.peer(1), b'info', data), timeout=5)
+        assert not self.overlay(1).received
+
+    async def test_receiver_per_peer_limit(self):
+        # The receiver allows fewer transfers per peer than the sender, so the transfers above its limit back off
+        data_list = [os.urandom(1000) for _ in range(3)]
+        sender, receiver = self.overlay(0).eva, self.overlay(1).eva
+        sender.settings.backpressure.retry_interval = 0.05
+        receiver.settings.max_simultaneous_transfers_per_peer = 1
+
+        futures = [sender.send_binary(self.peer(1), b'%d' % index, data) for index, data in enumerate(data_list)]
+        results = await asyncio.wait_for(asyncio.gather(*futures), timeout=5)
+
+        assert [result.data for result in results] == data_list
+        assert all(transfer.succeeded for transfer in sender.statistics.history)
+
+    async def test_send_binary_batched(self):
+        data_list = [os.urandom(50) for _ in range(10)]
+        sender = self.overlay(0).eva
+        sender.settings.batching.enabled = True
+
+        futures = [sender.send_binary(self.peer(1), b'%d' % index, data) for index, data in enumerate(data_list)]
+        results = await asyncio.wait_for(asyncio.gather(*futures), timeout=5)
+        await self.deliver_messages()
+
+        assert [result.data for result in results] == data_list
+        received = {result.info: bytes(result.data) for result in self.overlay(1).received}
+        assert received == {b'%d' % index: data for index, data in enumerate(data_list)}
+        # the transfers above the per peer limit have been sent in a single batch
+        assert sender.statistics.outgoing.transfers == sender.settings.max_simultaneous_transfers_per_peer + 1
@@ -0,0 +1,82 @@
+from descan.eva.budget import MemoryBudget
+from descan.eva.resume import ResumeStore
+from descan.eva.settings import Resumption
+
+
+def test_save_load():
+    store = ResumeStore(Resumption())
+    store.save(b'digest', b'part')
+
+    assert store.load(b'digest') == b'part'
+    assert store.load(b'unknown') is None
+    assert store.size == 4
+
+
+def test_save_replaces_part():
+    store = ResumeStore(Resumption())
+    store.save(b'digest', b'part')
+    store.save(b'digest', b'longer part')
+
+    assert store.load(b'digest') == b'longer part'
+    assert store.size == len(b'longer part')
+
+
+def test_discard():
+    store = ResumeStore(Resumption())
+    store.save(b'digest', b'part')
+
+    store.discard(b'digest')
+    store.discard(b'digest')
+
+    assert store.load(b'digest') is None
+    assert store.size == 0
+
+
+def test_max_size():
+    # The least recently used parts are dropped first
+    store = ResumeStore(Resumption(max_size=10))
+    store.save(b'first', b'1234')
+    store.save(b'second', b'1234')
+    store.load(b'first')
+    store.save(b'third', b'1234')
+
+    assert list(store.sizes) == [b'first', b'third']
+
+    store.save(b'huge', b'1' * 11)
+    assert store.load(b'huge') is None
+
+
+def test_directory(tmp_path):
+    # The parts stored in a directory should survive a restart
+    settings = Resumption(directory=str(tmp_path))
+    ResumeStore(settings).save(b'\x01' * 20, b'part')
+
+    store = ResumeStore(settings)
+
+    assert store.size == 4
+    assert store.load(b'\x01' * 20) == b'part'
+
+    store.discard(b'\x01' * 20)
+    assert not list(tmp_path.iterdir())
+
+
+def test_memory_budget():
+    # The parts are charged to the memory budget, and the least recently used parts are dropped to fit it
+    budget = MemoryBudget(10)
+    store = ResumeStore(Resumption(), budget)
+    store.save(b'first', b'1234')
+    store.save(b'second', b'1234')
+    store.save(b'third', b'1234')
+
+    assert list(store.sizes) == [b'second', b'third']
+    assert budget.used == 8
+
+    store.discard(b'second')
+    assert budget.used == 4
+
+    # The memory is used by the transfers
+    budget.used = budget.size
+    store.save(b'fourth', b'1234')
+    assert list(store.sizes) == [b'fourth']
+    store.save(b'fifth', b'12345678')
+    assert not store.sizes
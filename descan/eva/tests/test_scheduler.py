@@ -0,0 +1,167 @@
+import asyncio
+from unittest.mock import Mock
+
+import pytest
+
+from descan.eva.batch import TransferKind, unpack_batch
+from descan.eva.priority import Priority
+from descan.eva.protocol import EVAProtocol
+from descan.eva.settings import EVASettings, Scheduling
+
+
+# pylint: disable=redefined-outer-name, protected-access
+
+@pytest.fixture
+async def eva():
+    settings = EVASettings(max_simultaneous_transfers_per_peer=2)
+    eva = EVAProtocol(community=Mock(), settings=settings)
+    yield eva
+
+    await eva.shutdown()
+
+
+async def test_concurrent_transfers_to_one_peer(eva: EVAProtocol):
+    peer = Mock()
+
+    for index in range(3):
+        eva.send_binary(peer, b'info', b'data%d' % index)
+
+    assert len(eva.outgoing) == 2
+    assert eva.outgoing.count(peer) == 2
+    assert eva.scheduler.scheduled_count == 1
+
+
+async def test_send_scheduled_after_release(eva: EVAProtocol):
+    peer = Mock()
+
+    for index in range(3):
+        eva.send_binary(peer, b'info', b'data%d' % index)
+
+    transfer = next(iter(eva.outgoing.values()))
+    transfer.finish()
+
+    assert eva.outgoing.count(peer) == 2
+    assert not eva.scheduler.scheduled_count
+
+
+async def test_send_scheduled_fair_interleaving(eva: EVAProtocol):
+    peer_a, peer_b = Mock(), Mock()
+    eva.settings.max_simultaneous_transfers = 0
+
+    eva.send_binary(peer_a, b'info', b'a1')
+    eva.send_binary(peer_a, b'info', b'a2')
+    eva.send_binary(peer_b, b'info', b'b1')
+
+    eva.settings.max_simultaneous_transfers = 2
+    started = eva.scheduler.send_scheduled()
+
+    assert [transfer.data for transfer in started] == [b'a1', b'b1']
+
+
+async def test_send_scheduled_global_limit(eva: EVAProtocol):
+    peer_a, peer_b = Mock(), Mock()
+    eva.settings.max_simultaneous_transfers = 1
+
+    eva.send_binary(peer_a, b'info', b'a1')
+    eva.send_binary(peer_a, b'info', b'a2')
+    eva.send_binary(peer_b, b'info', b'b1')
+    assert eva.scheduler.scheduled_count == 2
+
+    # releasing a slot of the peer A should start the next transfer in the ready queue
+    next(iter(eva.outgoing.values())).finish()
+    assert [transfer.data for transfer in eva.outgoing.values()] == [b'a2']
+
+    next(iter(eva.outgoing.values())).finish()
+    assert [transfer.data for transfer in eva.outgoing.values()] == [b'b1']
+    assert not eva.scheduler.queues
+    assert not eva.scheduler.ready_keys
+
+
+async def test_send_scheduled_cancelled(eva: EVAProtocol):
+    peer = Mock()
+    eva.settings.max_simultaneous_transfers = 1
+
+    eva.send_binary(peer, b'info', b'data1')
+    future = eva.send_binary(peer, b'info', b'data2')
+    eva.send_binary(peer, b'info', b'data3')
+    future.cancel()
+    await asyncio.sleep(0)
+
+    next(iter(eva.outgoing.values())).finish()
+
+    assert [transfer.data for transfer in eva.outgoing.values()] == [b'data3']
+
+
+async def test_send_scheduled_priority(eva: EVAProtocol):
+    # Interactive transfers should overtake bulk transfers that are waiting for the same peer
+    peer = Mock()
+    eva.settings.max_simultaneous_transfers_per_peer = 1
+
+    eva.send_binary(peer, b'info', b'bulk1')
+    eva.send_binary(peer, b'info', b'bulk2')
+    eva.send_binary(peer, b'info', b'interactive', priority=Priority.INTERACTIVE)
+
+    next(iter(eva.outgoing.values())).finish()
+
+    assert [transfer.data for transfer in eva.outgoing.values()] == [b'interactive']
+
+
+async def test_send_scheduled_weights(eva: EVAProtocol):
+    # With weights 2:1 the bulk class gets every third slot, so it is not starved
+    eva.settings.scheduling = Scheduling(interactive_weight=2, bulk_weight=1)
+    eva.settings.max_simultaneous_transfers = 0
+
+    for index in range(3):
+        eva.send_binary(Mock(), b'info', b'bulk%d' % index)
+    for index in range(4):
+        eva.send_binary(Mock(), b'info', b'interactive%d' % index, priority=Priority.INTERACTIVE)
+
+    eva.settings.max_simultaneous_transfers = 6
+    started = eva.scheduler.send_scheduled()
+
+    assert [transfer.data for transfer in started] == [b'interactive0', b'interactive1', b'bulk0',
+                                                       b'interactive2', b'interactive3', b'bulk1']
+
+
+@pytest.mark.parametrize("interactive_weight, bulk_weight", [(0, 0), (0, 1), (1, 0)])
+def test_scheduling_weights_validation(interactive_weight: int, bulk_weight: int):
+    # A class with the weight 0 would never be scheduled
+    with pytest.raises(ValueError):
+        Scheduling(interactive_weight=interactive_weight, bulk_weight=bulk_weight)
+
+
+async def test_interactive_reserved_transfers(eva: EVAProtocol):
+    eva.settings.max_simultaneous_transfers = 2
+    eva.settings.scheduling.interactive_reserved_transfers = 1
+
+    eva.send_binary(Mock(), b'info', b'bulk1')
+    eva.send_binary(Mock(), b'info', b'bulk2')
+    eva.send_binary(Mock(), b'info', b'interactive', priority=Priority.INTERACTIVE)
+
+    assert [transfer.data for transfer in eva.outgoing.values()] == [b'bulk1', b'interactive']
+    assert eva.scheduler.scheduled_count == 1
+
+
+async def test_send_scheduled_batch(eva: EVAProtocol):
+    peer = Mock()
+    eva.settings.batching.enabled = True
+    eva.settings.batching.max_entries = 3
+    eva.settings.max_simultaneous_transfers = 0
+
+    futures = [eva.send_binary(peer, b'info', b'data%d' % index) for index in range(4)]
+    eva.send_binary(peer, b'info', b'x' * (eva.settings.batching.max_entry_size + 1))
+
+    eva.settings.max_simultaneous_transfers = 2
+    started = eva.scheduler.send_scheduled()
+
+    # three transfers are merged into a batch, the fourth one starts alone, the large one waits
+    assert len(started) == 2
+    assert started[0].request.kind == TransferKind.BATCH
+    assert unpack_batch(started[0].data)[2][1] == b'data2'
+    assert started[1].data == b'data3'
+    assert eva.scheduler.scheduled_count == 1
+
+    started[0].finish(result=started[0].create_result())
+    await asyncio.sleep(0)  # done callbacks of the batch future are called soon
+    assert [future.result().data for future in futures[:3]] == [b'data0', b'data1', b'data2']
+    assert not futures[3].done()
@@ -0,0 +1,26 @@
+import os
+
+from descan.eva.exceptions import TransferException
+from descan.eva.sink import FileSink
+
+
+def test_file_sink(tmp_path):
+    path = os.path.join(tmp_path, 'data')
+    sink = FileSink(path)
+
+    sink.write(memoryview(b'first'))
+    sink.write(memoryview(b'second'))
+    sink.close()
+
+    with open(path, 'rb') as file:
+        assert file.read() == b'firstsecond'
+
+
+def test_file_sink_abort(tmp_path):
+    path = os.path.join(tmp_path, 'data')
+    sink = FileSink(path)
+
+    sink.write(memoryview(b'first'))
+    sink.abort(TransferException('message'))
+
+    assert not os.path.exists(path)
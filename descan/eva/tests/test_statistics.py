@@ -0,0 +1,97 @@
+from unittest.mock import Mock
+
+import pytest
+
+from descan.eva.priority import Priority
+from descan.eva.statistics import EVAStatistics, Histogram, TransferStatistics
+
+
+def create_statistics(**kwargs) -> TransferStatistics:
+    kwargs.setdefault('peer', Mock())
+    return TransferStatistics(incoming=False, priority=Priority.BULK, created=0, **kwargs)
+
+
+def test_histogram_empty():
+    histogram = Histogram()
+
+    assert histogram.mean is None
+    assert histogram.percentile(50) is None
+
+
+def test_histogram_percentile():
+    histogram = Histogram()
+    for value in range(1, 101):
+        histogram.add(value)
+
+    assert histogram.mean == pytest.approx(50.5)
+    assert histogram.min == 1
+    assert histogram.max == 100
+    # percentiles are estimated by upper bounds of power-of-two buckets
+    assert histogram.percentile(50) == 64
+    assert histogram.percentile(99) == 100
+    assert histogram.percentile(1) == 2
+
+
+def test_histogram_merge():
+    first = Histogram()
+    second = Histogram()
+    first.add(0.5)
+    second.add(4)
+    second.add(0)
+
+    first.merge(second)
+
+    assert first.count == 3
+    assert first.min == 0
+    assert first.max == 4
+    assert first.total == pytest.approx(4.5)
+
+
+def test_transfer_statistics():
+    statistics = create_statistics(started=1, finished=3, succeeded=True, data_size=1000)
+    statistics.add_window_size(8)
+    statistics.add_window_size(8)
+    statistics.add_window_size(16)
+
+    assert statistics.queued_time == 1
+    assert statistics.duration == 2
+    assert statistics.goodput == 500
+    assert statistics.window_sizes == [8, 16]
+    assert statistics.final_window_size == 16
+
+
+def test_transfer_statistics_failed():
+    statistics = create_statistics(started=1, finished=3, data_size=1000)
+
+    assert statistics.goodput is None
+
+
+def test_eva_statistics():
+    eva_statistics = EVAStatistics(history_size=2)
+    peer = Mock()
+
+    eva_statistics.add(create_statistics(peer=peer, started=0, finished=1, succeeded=True, blocks=10))
+    eva_statistics.add(create_statistics(peer=peer, blocks=5))
+    incoming = create_statistics(started=0, finished=1, succeeded=True)
+    incoming.incoming = True
+    eva_statistics.add(incoming)
+
+    assert eva_statistics.outgoing.transfers == 2
+    assert eva_statistics.outgoing.failed == 1
+    assert eva_statistics.outgoing.blocks == 15
+    assert eva_statistics.outgoing.duration.count == 1
+    assert eva_statistics.incoming.transfers == 1
+    assert eva_statistics.peers[peer].transfers == 2
+    assert len(eva_statistics.history) == 2
+    assert eva_statistics.to_dict()['outgoing']['transfers'] == 2
+
+
+def test_eva_statistics_max_peers():
+    eva_statistics = EVAStatistics(max_peers=2)
+    peers = [Mock() for _ in range(3)]
+
+    for peer in peers:
+        eva_statistics.add(create_statistics(peer=peer, started=0, finished=1, succeeded=True))
+
+    assert list(eva_statistics.peers) == peers[1:]
+    assert eva_statistics.outgoing.transfers == 3
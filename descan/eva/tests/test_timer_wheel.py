@@ -0,0 +1,95 @@
+import asyncio
+from unittest.mock import Mock
+
+import pytest
+
+from descan.eva.utils.timer_wheel import TimerWheel
+
+
+# pylint: disable=redefined-outer-name
+
+
+@pytest.fixture
+async def wheel():
+    wheel = TimerWheel(resolution=0.1, slots=8)
+    yield wheel
+    wheel.stop()
+
+
+@pytest.mark.looptime
+async def test_schedule(wheel: TimerWheel):
+    loop = asyncio.get_running_loop()
+    fired = []
+
+    wheel.schedule(0.3, lambda: fired.append(('a', loop.time())))
+    wheel.schedule(0.1, lambda: fired.append(('b', loop.time())))
+    await asyncio.sleep(1)
+
+    assert fired == [('b', pytest.approx(0.1)), ('a', pytest.approx(0.3))]
+    assert not wheel.pending
+    assert not wheel.handle  # an idle wheel is not ticking
+
+
+@pytest.mark.looptime
+async def test_schedule_more_than_one_rotation(wheel: TimerWheel):
+    # The delay is longer than `slots * resolution`, so the timer should survive several visits of its slot
+    callback = Mock()
+    wheel.schedule(2.05, callback, 'arg')
+
+    await asyncio.sleep(2)
+    assert not callback.called
+
+    await asyncio.sleep(0.2)
+    callback.assert_called_once_with('arg')
+
+
+@pytest.mark.looptime
+async def test_cancel(wheel: TimerWheel):
+    callback = Mock()
+    timer = wheel.schedule(0.2, callback)
+
+    timer.cancel()
+    timer.cancel()
+    await asyncio.sleep(1)
+
+    assert not callback.called
+    assert not wheel.pending
+
+
+@pytest.mark.looptime
+async def test_reschedule_from_callback(wheel: TimerWheel):
+    calls = []
+
+    def callback():
+        calls.append(asyncio.get_running_loop().time())
+        if len(calls) < 3:
+            wheel.schedule(0, callback)
+
+    wheel.schedule(0, callback)
+    await asyncio.sleep(1)
+
+    assert calls == [pytest.approx(0.1), pytest.approx(0.2), pytest.approx(0.3)]
+
+
+@pytest.mark.looptime
+async def test_callback_exception(wheel: TimerWheel):
+    # An exception in one callback should not affect other timers
+    callback = Mock()
+    wheel.schedule(0.1, Mock(side_effect=ValueError))
+    wheel.schedule(0.1, callback)
+
+    await asyncio.sleep(1)
+
+    assert callback.called
+
+
+@pytest.mark.looptime
+async def test_stop(wheel: TimerWheel):
+    callback = Mock()
+    wheel.schedule(0.1, callback)
+
+    wheel.stop()
+    await asyncio.sleep(1)
+
+    assert not callback.called
+    assert not wheel.pending
@@ -3,16 +3,19 @@ from __future__ import annotations
 import asyncio
 import logging
 from math import isclose
-from typing import Callable, Dict, Optional
+from typing import Callable, Dict, Optional, Tuple
 
 from ipv8.messaging.lazy_payload import VariablePayload
 from ipv8.types import Peer
 
 from descan.eva.aliases import TransferCompleteCallback, TransferErrorCallback
 from descan.eva.exceptions import TimeoutException, TransferCancelledException, TransferException
+from descan.eva.priority import Priority
 from descan.eva.result import TransferResult
 from descan.eva.settings import EVASettings
+from descan.eva.statistics import EVAStatistics, TransferStatistics
 from descan.eva.utils.async_group import AsyncGroup
+from descan.eva.utils.timer_wheel import Timer, TimerWheel
 
 
 class Transfer:
@@ -20,17 +23,25 @@ class Transfer:
 
     NONE = -1
 
-    def __init__(self, container: Dict[Peer, Transfer], peer: Peer, info: bytes, nonce: int, settings: EVASettings,
-                 send_message: Callable[[Peer, VariablePayload], None], on_complete: TransferCompleteCallback,
-                 on_error: TransferErrorCallback, protocol_task_group: AsyncGroup,
-                 request: Optional[VariablePayload] = None, data_size: int = 0):
-        """ This class has been used internally by the EVA protocol"""
+    def __init__(self, container: Dict[Tuple[Peer, int], Transfer], peer: Peer, info: bytes, nonce: int,
+                 settings: EVASettings, send_message: Callable[[Peer, VariablePayload], None],
+                 on_complete: TransferCompleteCallback, on_error: TransferErrorCallback,
+                 protocol_task_group: AsyncGroup, request: Optional[VariablePayload] = None, data_size: int = 0,
+                 timer_wheel: Optional[TimerWheel] = None, priority: Priority = Priority.BULK,
+                 protocol_statistics: Optional[EVAStatistics] = None):
+        """ This class has been used internally by the EVA protocol.
+
+        Timeouts and retransmissions are served by the `timer_wheel` that is shared by all
+        transfers of the protocol. Statistics of the transfer are added to the `protocol_statistics`
+        on release.
+        """
 
         self.container = container
         self.peer = peer
         self.info = info
         self.data_size = data_size
         self.nonce = nonce
+        self.priority = priority
         self.send_message = send_message
         self.on_complete = on_complete
         self.on_error = on_error
@@ -40,30 +51,40 @@ class Transfer:
         self.request_received = False
         self.loop = asyncio.get_running_loop()
         self.future = self.loop.create_future()
-        self.task_group = AsyncGroup()
+        self.timer_wheel = timer_wheel or TimerWheel(settings.timer_resolution)
+        self.timers: Dict[str, Timer] = {}
+        self.protocol_statistics = protocol_statistics
+        self.statistics = TransferStatistics(peer=peer, incoming=False, priority=priority, created=self.loop.time())
         self.logger = logging.getLogger(self.__class__.__name__)
         self.updated = None
         self.attempt = self.settings.retransmission.attempts
         self.finished = False
         self.started = False
 
-        self.background_functions = [
-            self.terminate_by_timeout,
-            self.start_request,
-        ]
-
         self.future.add_done_callback(self.on_future_cancelled)
 
+    @property
+    def size_limit(self) -> int:
+        """The maximum data size of the transfer"""
+        return self.settings.binary_size_limit
+
+    @property
+    def key(self) -> Tuple[Peer, int]:
+        """The key under which the transfer is stored in a container"""
+        return self.peer, self.nonce
+
     def start(self):
         if self.started:
             return
         self.logger.debug('Start')
 
-        self.container[self.peer] = self
-        for function in self.background_functions:
-            self.task_group.add(function())
-
+        self.container[self.key] = self
         self.started = True
+        self.statistics.started = self.loop.time()
+
+        if self.settings.termination.enabled:
+            self._schedule('termination', self.settings.termination.timeout, self.terminate_by_timeout)
+        self.start_request()
 
     def update(self):
         self.updated = self.loop.time()
@@ -73,10 +94,15 @@ class Transfer:
         self.logger.debug('Release')
         self.finished = True
 
-        self.protocol_task_group.add(self.task_group.cancel())
+        for timer in self.timers.values():
+            timer.cancel()
+        self.timers.clear()
+
+        if self.statistics.finished is None:
+            self._record_statistics()
 
         if self.container:
-            self.container.pop(self.peer, None)
+            self.container.pop(self.key, None)
             self.container = None
 
     def finish(self, *, result: Optional[TransferResult] = None, exception: Optional[TransferException] = None):
@@ -98,6 +124,14 @@ class Transfer:
 
         self._release()
 
+    def _record_statistics(self):
+        self.statistics.finished = self.loop.time()
+        self.statistics.succeeded = self.future.done() and not self.future.cancelled() and \
+            self.future.exception() is None
+        self.statistics.data_size = self.data_size
+        if self.protocol_statistics:
+            self.protocol_statistics.add(self.statistics)
+
     def on_future_cancelled(self, _):
         if not self.future.cancelled():
             return
@@ -107,33 +141,44 @@ class Transfer:
         self.protocol_task_group.add(self.on_error(self.peer, exception))
         self._release()
 
-    async def terminate_by_timeout(self):
-        remaining_time = self.settings.termination.timeout
-        while self.settings.termination.enabled:
-            await asyncio.sleep(remaining_time)
-            if self.finished:
-                return
-
-            remaining_time = self._remaining(self.settings.termination.timeout)
-            self.logger.debug(f'Remaining time before termination: {remaining_time:.6f}s')
-            if self._the_time_has_come(remaining_time):  # it is time to terminate
-                exception = TimeoutException('Terminated by timeout', self)
-                self.finish(exception=exception)
-                return
-
-    async def start_request(self):
+    def terminate_by_timeout(self):
+        if self.finished or not self.settings.termination.enabled:
+            return
+
+        remaining_time = self._remaining(self.settings.termination.timeout)
+        self.logger.debug(f'Remaining time before termination: {remaining_time:.6f}s')
+        if self._the_time_has_come(remaining_time):  # it is time to terminate
+            exception = TimeoutException('Terminated by timeout', self)
+            self.finish(exception=exception)
+            return
+
+        self._schedule('termination', remaining_time, self.terminate_by_timeout)
+
+    def start_request(self):
         attempts = self.attempt + 1
-        for attempt in reversed(range(attempts)):
-            if self.finished or self.request_received or not self.request:
-                break
+        self._send_request(remains=attempts - 1, maximum=attempts)
+
+    def _send_request(self, remains: int, maximum: int):
+        if self.finished or self.request_received or not self.request:
+            return
+
+        current_attempt = self._format_attempt(remains=remains, maximum=maximum)
+        self.logger.debug(f'{self.request}. Attempt: {current_attempt} for peer: {self.peer}')
+        if remains < maximum - 1:
+            self.statistics.timeouts += 1
 
-            current_attempt = self._format_attempt(remains=attempt, maximum=attempts)
-            self.logger.debug(f'{self.request}. Attempt: {current_attempt} for peer: {self.peer}')
+        self.update()
+        self.send_message(self.peer, self.request)
 
-            self.update()
-            self.send_message(self.peer, self.request)
+        if remains > 0:
+            self._schedule('request', self.settings.retransmission.interval, self._send_request, remains - 1, maximum)
 
-            await asyncio.sleep(self.settings.retransmission.interval)
+    def _schedule(self, name: str, delay: float, callback: Callable, *args):
+        """Schedule the timer with the given name. A previous timer with the same name is cancelled"""
+        timer = self.timers.get(name)
+        if timer:
+            timer.cancel()
+        self.timers[name] = self.timer_wheel.schedule(delay, callback, *args)
 
     def _remaining(self, timeout: float) -> float:
         if self.updated is None:
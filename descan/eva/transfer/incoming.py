@@ -1,21 +1,106 @@
 from __future__ import annotations
 
-import asyncio
-from typing import List, Optional
+import hashlib
+from typing import Iterable, Optional, Union
 
+from descan.eva.budget import MemoryBudget
+from descan.eva.compression import Codec, Decompressor
+from descan.eva.congestion import CongestionController
+from descan.eva.exceptions import SizeException, TransferCancelledException, TransferException, ValueException
+from descan.eva.fec import recover_block
 from descan.eva.payload import Acknowledgement
 from descan.eva.result import TransferResult
+from descan.eva.resume import NO_DIGEST, ResumeStore
+from descan.eva.sink import TransferSink
 from descan.eva.transfer.base import Transfer
 from descan.eva.transfer.window import TransferWindow
 
 
 class IncomingTransfer(Transfer):
-    def __init__(self, *args, **kwargs):
+    def __init__(self, *args, congestion_controller: Optional[CongestionController] = None,
+                 sink: Optional[TransferSink] = None, codec: Codec = Codec.NONE, digest: bytes = NO_DIGEST,
+                 resume_store: Optional[ResumeStore] = None, memory_budget: Optional[MemoryBudget] = None,
+                 **kwargs):
         super().__init__(*args, **kwargs)
-        self.data_list: List[bytes] = []
+        self.statistics.incoming = True
+        # The received data is written into a single buffer. In the case that the data size is known in advance
+        # (a write request), the buffer is preallocated on start. Otherwise (a read request), the buffer grows.
+        # In the case that the transfer has a sink, the data is passed to the sink instead.
+        self.buffer = bytearray()
+        self.sink = sink
+        self.sink_closed = False
+        self.received_size = 0
+        self.received_blocks = 0
         self.window: Optional[TransferWindow] = None
         self.last_window = False
-        self.background_functions.append(self.send_acknowledge)
+        self.congestion_controller = congestion_controller
+        self.acknowledged: Optional[float] = None
+        # The first missing block and the count of blocks that have been received after it
+        self.gap: Optional[int] = None
+        self.gap_duplicates = 0
+        # In the case that the data is compressed, the buffer (or the sink) gets the decompressed data
+        self.decompressor = Decompressor(codec, self.decompressed_size_limit) if codec != Codec.NONE else None
+        # In the case that the data has a digest, the received part is stored on failure, and the transfer
+        # of the same data is resumed from the stored part
+        self.digest = digest
+        self.resume_store = resume_store if digest != NO_DIGEST and not sink else None
+        self.resumed_size = 0
+        # The flag is set when the sender uses forward error correction
+        self.repairs_received = False
+        # The memory that is reserved for the buffer of a write request
+        self.memory_budget = memory_budget
+        self.reserved_size = 0
+
+    def start(self):
+        if not self.started and not self.sink:
+            self.buffer = bytearray(self.data_size)
+            self._resume()
+        if self.started:
+            return
+
+        super().start()
+        self.send_acknowledge()
+
+    def reserve_memory(self) -> bool:
+        """Reserve the memory for the buffer. Return False if the memory budget is exceeded.
+
+        In the case that the data is compressed, the memory for the decompressed data is reserved
+        as well. Transfers that are received into a sink and read requests (with the unknown data size)
+        don't reserve memory.
+        """
+        if not self.memory_budget or self.sink or self.request or self.reserved_size:
+            return True
+
+        size = self.data_size + (self.decompressed_size_limit if self.decompressor else 0)
+        if not self.memory_budget.reserve(size):
+            return False
+        self.reserved_size = size
+        return True
+
+    @property
+    def size_limit(self) -> int:
+        if self.sink:
+            return self.settings.streaming_size_limit
+        return self.settings.binary_size_limit
+
+    @property
+    def decompressed_size_limit(self) -> int:
+        """The decompressed data of a write request is limited by its size, which is reserved in memory"""
+        if self.sink or not self.data_size:
+            return self.size_limit
+        return min(self.size_limit, self.data_size * self.settings.compression.max_expansion)
+
+    @property
+    def window_size(self) -> int:
+        if self.congestion_controller:
+            return self.congestion_controller.window_size
+        return self.settings.window_size
+
+    @property
+    def retransmission_interval(self) -> float:
+        if self.congestion_controller:
+            return self.congestion_controller.retransmission_interval
+        return self.settings.retransmission.interval
 
     def on_data(self, index: int, data: bytes) -> Optional[Acknowledgement]:
         self.request_received = True
@@ -24,48 +109,228 @@ class IncomingTransfer(Transfer):
             self.last_window = True
             self.window.blocks = self.window.blocks[:index + 1]
 
-        self.window.add(index, data)
+        self.statistics.blocks += 1
+        self.statistics.bytes += len(data)
+        if not self.window.add(index, data):
+            self.statistics.retransmitted_blocks += 1
         self.attempt = self.settings.retransmission.attempts
         self.update()
 
         acknowledgement = None
         if self.window.is_finished():
+            if self.acknowledged is not None:
+                rtt = self.loop.time() - self.acknowledged
+                self.statistics.rtt.add(rtt)
+                if self.congestion_controller:
+                    self.congestion_controller.on_window_completed(rtt)
+
             acknowledgement = self.make_acknowledgement()
+            if self.finished:
+                return None
+
             if self.last_window:
-                data = b''.join(self.data_list)
-                result = TransferResult(peer=self.peer, info=self.info, data=data, nonce=self.nonce)
+                data = self._complete_data()
+                if self.finished:
+                    return None
+                result = TransferResult(peer=self.peer, info=self.info, data=data, nonce=self.nonce, sink=self.sink)
                 self.finish(result=result)
+        else:
+            acknowledgement = self._check_fast_retransmit(index)
 
         return acknowledgement
 
+    def on_repair(self, index: int, count: int, length: int, parity: bytes) -> Optional[Acknowledgement]:
+        """Rebuild a lost block of the group from the repair block.
+
+        The group is the `count` blocks of the current window starting from the `index`. Only a single
+        lost block per group can be rebuilt.
+        """
+        self.repairs_received = True
+        if not self.window or index < 0 or index + count > len(self.window.blocks):
+            return None
+
+        group = self.window.blocks[index:index + count]
+        missing = [position for position, block in enumerate(group) if block is None]
+        if len(missing) != 1:
+            return None
+
+        block = recover_block(parity, length, [block for block in group if block is not None])
+        self.statistics.repair_blocks += 1
+        self.logger.debug(f'Block {self.window.start + index + missing[0]} has been repaired')
+        return self.on_data(index + missing[0], block)
+
     def make_acknowledgement(self) -> Acknowledgement:
+        if self.window and self.window.processed and not self.window.is_finished():
+            # Some blocks of the current window are lost. Keep the window and request only the missing blocks.
+            return self._make_selective_acknowledgement(len(self.window.blocks))
+
         if self.window:
-            self.data_list.extend(self.window.consecutive_blocks())
+            self._write(self.window.consecutive_blocks())
 
-        self.window = TransferWindow(start=len(self.data_list), size=self.settings.window_size)
+        self.window = TransferWindow(start=self.received_blocks, size=self.window_size)
+        self.statistics.add_window_size(len(self.window.blocks))
+        self.acknowledged = self.loop.time()
+        self.gap = None
         self.logger.debug(f'Transfer window: {self.window}')
-        return Acknowledgement(self.window.start, len(self.window.blocks), self.nonce)
+        return Acknowledgement(self.window.start, len(self.window.blocks), self.nonce, b'')
+
+    def _make_selective_acknowledgement(self, size: int) -> Acknowledgement:
+        bitmap = self.window.make_bitmap(size)
+        self.logger.debug(f'Selective acknowledgement. Transfer window: {self.window}. Size: {size}')
+        return Acknowledgement(self.window.start, size, self.nonce, bitmap)
+
+    def _check_fast_retransmit(self, index: int) -> Optional[Acknowledgement]:
+        """Request the missing blocks immediately in the case that enough blocks have been received after a gap"""
+        missing = self.window.first_missing()
+        if missing is None or index < missing:
+            return None
+
+        gap = self.window.start + missing
+        if gap != self.gap:
+            self.gap = gap
+            self.gap_duplicates = 0
+
+        self.gap_duplicates += 1
+        threshold = self.settings.retransmission.fast_retransmit_threshold
+        if self.settings.fec.enabled or self.repairs_received:
+            # Give the repair block of the group a chance to arrive before requesting a retransmission
+            threshold = max(threshold, self.settings.fec.max_group_size)
+        if self.gap_duplicates != threshold:
+            return None
+
+        if self.congestion_controller:
+            self.congestion_controller.on_loss()
+        return self._make_selective_acknowledgement(index + 1)
+
+    def _write(self, blocks: Iterable[bytes]):
+        blocks = list(blocks)
+        size = self.received_size + sum(len(block) for block in blocks)
+        if (self.data_size and size > self.data_size) or size > self.size_limit:
+            self.finish(exception=SizeException(f'Data size limit has been exceeded: {size}', self))
+            return
+
+        if self.sink:
+            self._write_to_sink(b''.join(blocks))
+        else:
+            position = self.received_size
+            for block in blocks:
+                self.buffer[position:position + len(block)] = block
+                position += len(block)
+
+        self.received_size = size
+        self.received_blocks += len(blocks)
+
+    def _resume(self):
+        part = self.resume_store.load(self.digest) if self.resume_store else None
+        if not part:
+            return
+
+        # Only whole blocks are resumed, the first acknowledgement requests the rest of the data
+        blocks = min(len(part), self.data_size) // self.settings.block_size
+        size = blocks * self.settings.block_size
+        self.buffer[:size] = memoryview(part)[:size]
+        self.received_size = self.resumed_size = size
+        self.received_blocks = blocks
+        self.logger.debug(f'Resumed: {size} bytes')
+
+    def _complete_data(self) -> Union[bytes, memoryview]:
+        data = memoryview(self.buffer)[:self.received_size]
+        if self.resumed_size and hashlib.sha1(data).digest() != self.digest:
+            # The stored part doesn't belong to the data, it should not be used anymore
+            self.resume_store.discard(self.digest)
+            self.resume_store = None
+            self.finish(exception=ValueException('The digest of the resumed data does not match', self))
+            return data
+
+        if not self.decompressor:
+            return data
+
+        try:
+            if not self.sink:
+                data = self.decompressor.decompress(data)
+            self.decompressor.finish()
+        except TransferException as e:
+            e.transfer = self
+            self.finish(exception=e)
+        return data
+
+    def _write_to_sink(self, chunk: bytes):
+        if self.decompressor:
+            try:
+                chunk = self.decompressor.decompress(chunk)
+            except TransferException as e:
+                e.transfer = self
+                self.finish(exception=e)
+                return
+
+        if not chunk:
+            return
+        try:
+            self.sink.write(memoryview(chunk))
+        except Exception as e:  # pylint: disable=broad-except
+            self.finish(exception=TransferException(f'Sink error: {e.__class__.__name__}: {e}', self))
+
+    def finish(self, *, result: Optional[TransferResult] = None, exception: Optional[TransferException] = None):
+        if not self.finished and not self.future.done():
+            self._close_sink(exception)
+            self._update_resume_store(exception)
+        super().finish(result=result, exception=exception)
+
+    def on_future_cancelled(self, _):
+        if self.future.cancelled():
+            exception = TransferCancelledException('The future was cancelled', self)
+            self._close_sink(exception)
+            self._update_resume_store(exception)
+        super().on_future_cancelled(_)
+
+    def _update_resume_store(self, exception: Optional[TransferException]):
+        if not self.resume_store:
+            return
+
+        if not exception:
+            self.resume_store.discard(self.digest)
+        elif self.received_size > self.resumed_size:
+            self.resume_store.save(self.digest, bytes(memoryview(self.buffer)[:self.received_size]))
+
+    def _close_sink(self, exception: Optional[TransferException]):
+        if not self.sink or self.sink_closed:
+            return
+
+        self.sink_closed = True
+        if exception:
+            self.sink.abort(exception)
+        else:
+            self.sink.close()
 
     def _release(self):
         super()._release()
-        self.data_list = None
+        self.buffer = None
+        if self.reserved_size:
+            self.memory_budget.release(self.reserved_size)
+            self.reserved_size = 0
 
-    async def send_acknowledge(self):
-        while True:
-            attempts_are_over = self.attempt <= 0
-            if attempts_are_over or self.finished:
-                return
+    def send_acknowledge(self):
+        attempts_are_over = self.attempt <= 0
+        if attempts_are_over or self.finished:
+            return
+
+        remaining_time = self._remaining(self.retransmission_interval)
+        if self._the_time_has_come(remaining_time):  # it is time to retransmit
+            if self.window:
+                self.statistics.timeouts += 1
+                if self.congestion_controller:
+                    self.congestion_controller.on_timeout()
 
-            remaining_time = self._remaining(self.settings.retransmission.interval)
-            if self._the_time_has_come(remaining_time):  # it is time to retransmit
-                remaining_time = self.settings.retransmission.interval
-                self.attempt -= 1
+            remaining_time = self.retransmission_interval
+            self.attempt -= 1
 
-                current_attempt = self._format_attempt(remains=self.attempt,
-                                                       maximum=self.settings.retransmission.attempts)
-                acknowledgement = self.make_acknowledgement()
-                self.logger.debug(f'Ack({acknowledgement.number}). Attempt: {current_attempt} for peer: {self.peer}')
-                self.send_message(self.peer, acknowledgement)
+            current_attempt = self._format_attempt(remains=self.attempt,
+                                                   maximum=self.settings.retransmission.attempts)
+            acknowledgement = self.make_acknowledgement()
+            self.logger.debug(f'Ack({acknowledgement.number}). Attempt: {current_attempt} for peer: {self.peer}')
+            self.send_message(self.peer, acknowledgement)
+            if self.finished:
+                return
 
-            self.logger.debug(f'Remaining time before send acknowledge: {remaining_time:.6f}s')
-            await asyncio.sleep(remaining_time)
+        self.logger.debug(f'Remaining time before send acknowledge: {remaining_time:.6f}s')
+        self._schedule('acknowledge', remaining_time, self.send_acknowledge)
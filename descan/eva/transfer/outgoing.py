@@ -1,40 +1,145 @@
 from __future__ import annotations
 
 import math
-from typing import Iterable
+from typing import Iterable, List, Optional, Union
 
-from descan.eva.payload import Data
+from descan.eva.fec import LossEstimator, count_lost, xor_blocks, xor_lengths
+from descan.eva.payload import Data, Repair
 from descan.eva.result import TransferResult
 from descan.eva.transfer.base import Transfer
+from descan.eva.transfer.window import TransferWindow
 
 
 class OutgoingTransfer(Transfer):
-    def __init__(self, data: bytes, *args, **kwargs):
+    def __init__(self, data: bytes, *args, uncompressed_data: Optional[bytes] = None,
+                 loss_estimator: Optional[LossEstimator] = None, **kwargs):
+        """The `data` is sent as is. In the case that it is compressed, the `uncompressed_data` is
+        the original data that is returned in the transfer result.
+
+        In the case that the `loss_estimator` is passed, repair blocks are sent (forward error correction).
+        """
         super().__init__(*args, **kwargs)
         self.data = data
+        self.uncompressed_data = uncompressed_data
+        self.view = memoryview(data)
         self.block_count = math.ceil(self.data_size / self.settings.block_size)
+        self.loss_estimator = loss_estimator
+        self.last_window_size = 0
+        # The time of sending the last window and a round trip time sample (the time between sending a window
+        # and its acknowledgement)
+        self.window_sent: Optional[float] = None
+        self.rtt: Optional[float] = None
+        self.max_sent_block = -1
+        self.backpressure_attempts = 0
+
+    def on_acknowledgement(self, ack_number: int, window_size: int,
+                           selective: bytes = b'') -> Iterable[Union[Data, Repair]]:
+        """Return blocks of the requested window.
+
+        In the case that the acknowledgement is selective, blocks that are marked as received
+        in the bitmap are skipped.
 
-    def on_acknowledgement(self, ack_number: int, window_size: int) -> Iterable[Data]:
+        In the case that forward error correction is enabled, each group of blocks of a new window
+        is followed by a repair block.
+        """
         self.update()
         self.request_received = True
         is_final_acknowledgement = ack_number > self.block_count
         if is_final_acknowledgement:
             return
 
+        # A selective acknowledgement could be triggered by a retransmission, so it gives no RTT sample. Its size
+        # covers only the blocks up to the gap, so it is not a window size either
+        now = self.loop.time()
+        self.rtt = now - self.window_sent if self.window_sent is not None and not selective else None
+        self.window_sent = now
+        if self.rtt is not None:
+            self.statistics.rtt.add(self.rtt)
+        if not selective:
+            self.statistics.add_window_size(window_size)
+
+        group_size = 0
+        if self.loss_estimator:
+            self._estimate_loss(window_size, selective)
+            if not selective:  # retransmitted blocks are not protected
+                group_size = self.loss_estimator.group_size
+
+        group: List[memoryview] = []
         for block_number in range(ack_number, ack_number + window_size):
+            if block_number > self.block_count:
+                break
+            if TransferWindow.is_received(selective, block_number - ack_number):
+                continue
+
             block = self._get_block(block_number)
+            self._count_block(block_number, block)
             yield Data(block_number, self.nonce, block)
+
+            if group_size:
+                group.append(block)
+                if len(group) == group_size:
+                    yield self._make_repair(block_number - group_size + 1, group)
+                    group = []
+
             if len(block) == 0:
-                return
+                break
+
+        if len(group) > 1:
+            yield self._make_repair(block_number - len(group) + 1, group)
+
+    def back_off(self) -> bool:
+        """Send the request again later, because the receiver has no memory for the transfer.
+
+        The retry interval doubles on each rejection. Return False in the case that the request
+        can not be retried.
+        """
+        backpressure = self.settings.backpressure
+        if self.finished or self.request_received or self.backpressure_attempts >= backpressure.attempts:
+            return False
+
+        delay = min(backpressure.retry_interval * 2 ** self.backpressure_attempts, backpressure.max_retry_interval)
+        self.backpressure_attempts += 1
+        self.logger.debug(f'Back off for {delay:.3f}s. Attempt: {self.backpressure_attempts}')
+
+        self._schedule('request', delay, self.start_request)
+        if self.settings.termination.enabled:
+            self._schedule('termination', delay + self.settings.termination.timeout, self.terminate_by_timeout)
+        return True
+
+    def _count_block(self, block_number: int, block: memoryview):
+        self.statistics.blocks += 1
+        self.statistics.bytes += len(block)
+        if block_number <= self.max_sent_block:
+            self.statistics.retransmitted_blocks += 1
+        self.max_sent_block = max(self.max_sent_block, block_number)
+
+    def _estimate_loss(self, window_size: int, selective: bytes):
+        if selective:
+            self.loss_estimator.update(count_lost(selective, window_size), window_size)
+            self.last_window_size = 0
+            return
+
+        # A cumulative acknowledgement confirms that the previous window has been received completely
+        self.loss_estimator.update(0, self.last_window_size)
+        self.last_window_size = window_size
+
+    def _make_repair(self, number: int, group: List[memoryview]) -> Repair:
+        parity = xor_blocks(group, self.settings.block_size)
+        self.statistics.repair_blocks += 1
+        return Repair(number, len(group), self.nonce, xor_lengths(group), parity)
 
     def create_result(self) -> TransferResult:
-        return TransferResult(peer=self.peer, info=self.info, data=self.data, nonce=self.nonce)
+        data = self.data if self.uncompressed_data is None else self.uncompressed_data
+        return TransferResult(peer=self.peer, info=self.info, data=data, nonce=self.nonce)
 
     def _release(self):
         super()._release()
         self.data = None
+        self.uncompressed_data = None
+        self.view = None
 
-    def _get_block(self, number: int) -> bytes:
+    def _get_block(self, number: int) -> memoryview:
+        # Slicing the memoryview doesn't copy the data, the block is copied only once into the outgoing packet
         start_position = number * self.settings.block_size
         stop_position = start_position + self.settings.block_size
-        return self.data[start_position:stop_position]
+        return self.view[start_position:stop_position]
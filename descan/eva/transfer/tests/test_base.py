@@ -32,7 +32,7 @@ async def transfer():
         settings=EVASettings(block_size=2),
     )
     transfer.request = Mock()
-    container[peer] = transfer
+    container[transfer.key] = transfer
     yield transfer
 
     await protocol_task_group.cancel()
@@ -75,6 +75,17 @@ async def test_release(transfer: Transfer):
     assert not container
 
 
+async def test_release_cancels_timers(transfer: Transfer):
+    transfer.start()
+    timers = list(transfer.timers.values())
+
+    transfer._release()
+
+    assert not transfer.timers
+    assert not any(timer.active for timer in timers)
+    assert not transfer.timer_wheel.pending
+
+
 async def test_release_double_call(transfer: Transfer):
     # In this test we ensure that double call of the `_release` method doesn't
     # lead to any exception
@@ -86,13 +97,14 @@ async def test_release_double_call(transfer: Transfer):
 
 
 async def test_start(transfer: Transfer):
-    # In this test we ensure that after starting a transfer, it's `task_group`
-    # is started and the transfer has been added to a container
+    # In this test we ensure that after starting a transfer, it's timers
+    # are scheduled and the transfer has been added to a container
     transfer.start()
 
     assert transfer.started
-    assert transfer.peer in transfer.container
-    assert len(transfer.task_group._futures) == 2
+    assert transfer.key in transfer.container
+    assert set(transfer.timers) == {'termination', 'request'}
+    assert transfer.timer_wheel.pending == 2
 
 
 async def test_double_start(transfer: Transfer):
@@ -144,37 +156,37 @@ async def test_finish_with_exception_and_result(transfer: Transfer):
 async def test_terminate_by_timeout_task(transfer: Transfer):
     transfer.settings.termination.timeout = 0
 
-    await transfer.terminate_by_timeout()
+    transfer.terminate_by_timeout()
 
     assert transfer.finished
     assert transfer.future.done()
     assert isinstance(transfer.future.exception(), TimeoutException)
 
 
+@pytest.mark.looptime
 async def test_terminate_by_timeout_task_with_update(transfer: Transfer):
-    # In this test we run two tasks concurrently:
-    # 1. `update_transfer` task which updates transfer every 0.05 sec
-    # 2. `terminate_by_timeout_task` task which terminates transfer after 0.1 seconds of idle
+    # In this test the transfer is updated every 0.05 sec while the termination timer
+    # terminates the transfer after 0.1 seconds of idle.
 
-    # In the case that `terminate_by_timeout_task` works as expected, it will wait until
+    # In the case that the termination timer works as expected, it will wait until
     # `update_transfer` finish it's work and then will terminate the transfer
     update_sleep_interval = 0.05
     transfer.settings.termination.timeout = 0.1
     transfer.update = Mock(wraps=transfer.update)
     logging.info(transfer)
 
-    async def update_transfer():  # should process 0.2 sec in total
-        for attempt in range(4):
-            logging.debug(f'Sleep({attempt}) {update_sleep_interval}s...')
-            await asyncio.sleep(update_sleep_interval)
-            transfer.update()
+    transfer.update()
+    transfer.terminate_by_timeout()
+
+    for attempt in range(4):  # should process 0.2 sec in total
+        logging.debug(f'Sleep({attempt}) {update_sleep_interval}s...')
+        await asyncio.sleep(update_sleep_interval)
+        assert not transfer.finished
+        transfer.update()
 
-    await asyncio.gather(
-        update_transfer(),
-        transfer.terminate_by_timeout()
-    )
+    await asyncio.sleep(0.2)
 
-    assert transfer.update.call_count == 4
+    assert transfer.update.call_count == 5
     assert transfer.finished
     assert transfer.future.done()
     assert isinstance(transfer.future.exception(), TimeoutException)
@@ -183,7 +195,7 @@ async def test_terminate_by_timeout_task_with_update(transfer: Transfer):
 async def test_terminate_by_timeout_task_disable(transfer: Transfer):
     transfer.settings.termination.enabled = False
 
-    await transfer.terminate_by_timeout()
+    transfer.terminate_by_timeout()
 
     assert not transfer.finished
     assert not transfer.future.done()
@@ -193,22 +205,25 @@ async def test_terminate_by_timeout_task_finished(transfer: Transfer):
     transfer.settings.termination.timeout = 0
     transfer.finished = True
 
-    await transfer.terminate_by_timeout()
+    transfer.terminate_by_timeout()
 
     assert not transfer.future.done()
 
 
+@pytest.mark.looptime
 async def test_start_request_task(transfer: Transfer):
     transfer.settings.retransmission.interval = 0
     transfer.attempt = 3
     transfer.update = Mock(wrap=transfer.update)
 
-    await transfer.start_request()
+    transfer.start_request()
+    await asyncio.sleep(1)
 
     assert transfer.update.call_count == 4  # 1 mandatory attempt and 3 re-transmit
     assert transfer.send_message.call_count == 4  # 1 mandatory attempt and 3 re-transmit
 
 
+@pytest.mark.looptime
 async def test_start_request_task_finished(transfer: Transfer):
     # In this test we will mark the transfer as finished during the first call of `send_message`
     # therefore a count of send attempts should be equal to `1`
@@ -220,10 +235,12 @@ async def test_start_request_task_finished(transfer: Transfer):
 
     transfer.send_message = Mock(wraps=send_message)
 
-    await transfer.start_request()
+    transfer.start_request()
+    await asyncio.sleep(1)
     assert transfer.send_message.call_count == 1
 
 
+@pytest.mark.looptime
 async def test_start_request_task_start_request_received(transfer: Transfer):
     # In this test we will set `start_request_received` as `True` during the first call of `send_message`
     # therefore a count of send attempts should be equal to `1`
@@ -236,7 +253,8 @@ async def test_start_request_task_start_request_received(transfer: Transfer):
 
     transfer.send_message = Mock(wraps=send_message)
 
-    await transfer.start_request()
+    transfer.start_request()
+    await asyncio.sleep(1)
     assert transfer.send_message.call_count == 1
 
 
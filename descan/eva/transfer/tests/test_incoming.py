@@ -4,8 +4,11 @@ from unittest.mock import AsyncMock, Mock
 
 import pytest
 
+from descan.eva.exceptions import SizeException, TransferException
+from descan.eva.fec import xor_blocks, xor_lengths
 from descan.eva.protocol import EVAProtocol
-from descan.eva.settings import EVASettings, Termination
+from descan.eva.resume import ResumeStore
+from descan.eva.settings import EVASettings, Resumption, Termination
 from descan.eva.transfer.incoming import IncomingTransfer
 from descan.eva.transfer.window import TransferWindow
 
@@ -30,6 +33,7 @@ async def incoming_transfer():
         data_size=100,
         nonce=0,
         protocol_task_group=eva.task_group,
+        timer_wheel=eva.timer_wheel,
         send_message=Mock(),
         on_complete=AsyncMock(),
         on_error=AsyncMock(),
@@ -37,7 +41,7 @@ async def incoming_transfer():
         settings=settings
     )
 
-    transfer.container[peer] = transfer
+    transfer.container[transfer.key] = transfer
 
     yield transfer
 
@@ -45,7 +49,7 @@ async def incoming_transfer():
 
 
 async def test_on_data_normal_packet(incoming_transfer: IncomingTransfer):
-    incoming_transfer.window = Mock(is_finished=Mock(return_value=False))
+    incoming_transfer.window = Mock(is_finished=Mock(return_value=False), first_missing=Mock(return_value=None))
     incoming_transfer.make_acknowledgement = Mock()
     incoming_transfer.update = Mock()
     incoming_transfer.attempt = 2
@@ -117,7 +121,8 @@ async def test_make_acknowledgement_next_window(incoming_transfer: IncomingTrans
 
     acknowledgement = incoming_transfer.make_acknowledgement()
 
-    assert len(incoming_transfer.data_list) == 4
+    assert incoming_transfer.received_blocks == 4
+    assert incoming_transfer.buffer[:incoming_transfer.received_size] == b'data'
     assert incoming_transfer.window
     assert incoming_transfer.window.start == 4
     assert incoming_transfer.window.processed == 0
@@ -127,25 +132,76 @@ async def test_make_acknowledgement_next_window(incoming_transfer: IncomingTrans
     assert acknowledgement.window_size == incoming_transfer.settings.window_size
 
 
+async def test_make_acknowledgement_selective(incoming_transfer: IncomingTransfer):
+    incoming_transfer.window = TransferWindow(10, 4)
+    incoming_transfer.window.add(0, b'd')
+    incoming_transfer.window.add(2, b't')
+
+    acknowledgement = incoming_transfer.make_acknowledgement()
+
+    assert incoming_transfer.window.start == 10
+    assert acknowledgement.number == 10
+    assert acknowledgement.window_size == 4
+    assert acknowledgement.selective == bytes([0b0101])
+
+
+async def test_on_data_fast_retransmit(incoming_transfer: IncomingTransfer):
+    incoming_transfer.make_acknowledgement()
+    incoming_transfer.on_data(0, b'data')
+
+    # block 1 is lost
+    assert not incoming_transfer.on_data(2, b'data')
+    assert not incoming_transfer.on_data(3, b'data')
+    acknowledgement = incoming_transfer.on_data(4, b'data')
+
+    assert acknowledgement.number == 0
+    assert acknowledgement.window_size == 5
+    assert acknowledgement.selective == bytes([0b11101])
+
+    # the gap is requested only once
+    assert not incoming_transfer.on_data(5, b'data')
+
+
+async def test_start_preallocates_buffer(incoming_transfer: IncomingTransfer):
+    incoming_transfer.container.pop(incoming_transfer.key)
+    incoming_transfer.start()
+
+    assert len(incoming_transfer.buffer) == incoming_transfer.data_size
+
+
+async def test_data_size_exceeded(incoming_transfer: IncomingTransfer):
+    incoming_transfer.data_size = 2
+    incoming_transfer.window = TransferWindow(0, 1)
+    incoming_transfer.window.add(0, b'data')
+
+    incoming_transfer.make_acknowledgement()
+
+    assert incoming_transfer.finished
+    assert isinstance(incoming_transfer.future.exception(), SizeException)
+
+
 async def test_finish(incoming_transfer: IncomingTransfer):
     container = incoming_transfer.container
     assert container
 
     incoming_transfer.finish()
 
-    assert incoming_transfer.data_list is None
+    assert incoming_transfer.buffer is None
     assert not incoming_transfer.container
     assert not container
 
 
+@pytest.mark.looptime
 async def test_send_acknowledge(incoming_transfer: IncomingTransfer):
     incoming_transfer.settings.retransmission.interval = 0
 
-    await incoming_transfer.send_acknowledge()
+    incoming_transfer.send_acknowledge()
+    await asyncio.sleep(1)
 
     assert incoming_transfer.send_message.call_count == 3
 
 
+@pytest.mark.looptime
 async def test_send_acknowledge_finished(incoming_transfer: IncomingTransfer):
     incoming_transfer.settings.retransmission.interval = 0
 
@@ -154,11 +210,13 @@ async def test_send_acknowledge_finished(incoming_transfer: IncomingTransfer):
 
     incoming_transfer.send_message = Mock(wraps=send_message)
 
-    await incoming_transfer.send_acknowledge()
+    incoming_transfer.send_acknowledge()
+    await asyncio.sleep(1)
 
     assert incoming_transfer.send_message.call_count == 1
 
 
+@pytest.mark.looptime
 async def test_send_acknowledge_updated(incoming_transfer: IncomingTransfer):
     # The timeline for calls:
     #
@@ -168,19 +226,64 @@ async def test_send_acknowledge_updated(incoming_transfer: IncomingTransfer):
     incoming_transfer.settings.retransmission.interval = 0.5
     incoming_transfer._remaining = Mock(wraps=incoming_transfer._remaining)
 
-    async def update_transfer():
-        for attempt in range(3):
-            logging.debug(f'Sleep({attempt}) {update_sleep_interval}s...')
+    incoming_transfer.send_acknowledge()
+    for attempt in range(3):
+        logging.debug(f'Sleep({attempt}) {update_sleep_interval}s...')
 
-            await asyncio.sleep(update_sleep_interval)
-            # emulate on_data()
-            incoming_transfer.update()
-            incoming_transfer.attempt = incoming_transfer.settings.retransmission.attempts
+        await asyncio.sleep(update_sleep_interval)
+        # emulate on_data()
+        incoming_transfer.update()
+        incoming_transfer.attempt = incoming_transfer.settings.retransmission.attempts
 
-    await asyncio.gather(
-        update_transfer(),
-        incoming_transfer.send_acknowledge()
-    )
+    await asyncio.sleep(3)
 
     assert incoming_transfer.send_message.call_count == 4
     assert incoming_transfer._remaining.call_count == 7
+
+
+async def test_finish_with_exception_stores_part(incoming_transfer: IncomingTransfer):
+    store = ResumeStore(Resumption())
+    incoming_transfer.digest = b'\x01' * 20
+    incoming_transfer.resume_store = store
+    incoming_transfer.buffer = bytearray(b'x' * 100)
+    incoming_transfer.received_size = 20
+
+    incoming_transfer.finish(exception=TransferException())
+
+    assert store.load(incoming_transfer.digest) == b'x' * 20
+
+
+async def test_start_resumes_part(incoming_transfer: IncomingTransfer):
+    store = ResumeStore(Resumption())
+    store.save(b'\x01' * 20, b'x' * 25)
+    incoming_transfer.digest = b'\x01' * 20
+    incoming_transfer.resume_store = store
+    incoming_transfer.container.pop(incoming_transfer.key)
+
+    incoming_transfer.start()
+
+    assert incoming_transfer.received_blocks == 2
+    assert incoming_transfer.received_size == 20
+    assert incoming_transfer.window.start == 2
+    assert incoming_transfer.buffer[:20] == b'x' * 20
+
+
+async def test_on_repair(incoming_transfer: IncomingTransfer):
+    incoming_transfer.window = TransferWindow(start=0, size=4)
+    group = [b'0123456789', b'abcdefghij', b'klmnopqrst']
+    incoming_transfer.on_data(0, group[0])
+    incoming_transfer.on_data(2, group[2])
+
+    incoming_transfer.on_repair(0, 3, xor_lengths(group), xor_blocks(group, 10))
+
+    assert incoming_transfer.window.blocks[1] == group[1]
+    assert incoming_transfer.repairs_received
+
+
+async def test_on_repair_two_blocks_lost(incoming_transfer: IncomingTransfer):
+    incoming_transfer.window = TransferWindow(start=0, size=4)
+    group = [b'0123456789', b'abcdefghij', b'klmnopqrst']
+    incoming_transfer.on_data(0, group[0])
+
+    assert not incoming_transfer.on_repair(0, 3, xor_lengths(group), xor_blocks(group, 10))
+    assert incoming_transfer.window.processed == 1
@@ -2,10 +2,11 @@ from unittest.mock import AsyncMock, Mock
 
 import pytest
 
-from descan.eva.payload import Data
+from descan.eva.fec import LossEstimator, xor_blocks
+from descan.eva.payload import Data, Repair
 from descan.eva.protocol import EVAProtocol
 from descan.eva.result import TransferResult
-from descan.eva.settings import EVASettings
+from descan.eva.settings import EVASettings, ForwardErrorCorrection
 from descan.eva.transfer.outgoing import OutgoingTransfer
 
 
@@ -24,6 +25,7 @@ async def outgoing_transfer():
         data_size=len(b'binary_data'),
         nonce=0,
         protocol_task_group=eva.task_group,
+        timer_wheel=eva.timer_wheel,
         send_message=Mock(),
         on_complete=AsyncMock(),
         on_error=AsyncMock(),
@@ -31,7 +33,7 @@ async def outgoing_transfer():
         settings=settings
     )
 
-    transfer.container[peer] = transfer
+    transfer.container[transfer.key] = transfer
     yield transfer
 
     await eva.shutdown()
@@ -63,6 +65,36 @@ async def test_on_acknowledgement(outgoing_transfer: OutgoingTransfer):
     assert all(a.data == e.data and a.number == e.number for a, e in zip(actual, expected))
 
 
+async def test_on_selective_acknowledgement(outgoing_transfer: OutgoingTransfer):
+    actual = list(outgoing_transfer.on_acknowledgement(ack_number=2, window_size=4, selective=bytes([0b1010])))
+
+    assert [(data.number, data.data) for data in actual] == [(2, b'ry'), (4, b'at')]
+
+
+async def test_on_acknowledgement_with_repair(outgoing_transfer: OutgoingTransfer):
+    outgoing_transfer.loss_estimator = LossEstimator(ForwardErrorCorrection(min_group_size=3, max_group_size=3))
+
+    actual = list(outgoing_transfer.on_acknowledgement(ack_number=0, window_size=16))
+
+    assert [(type(message), message.number) for message in actual] == [
+        (Data, 0), (Data, 1), (Data, 2), (Repair, 0),
+        (Data, 3), (Data, 4), (Data, 5), (Repair, 3),
+        (Data, 6),
+    ]
+    repair = actual[3]
+    assert repair.count == 3
+    assert repair.data == xor_blocks([b'bi', b'na', b'ry'], 2)
+
+
+async def test_on_selective_acknowledgement_without_repair(outgoing_transfer: OutgoingTransfer):
+    outgoing_transfer.loss_estimator = LossEstimator(ForwardErrorCorrection(min_group_size=2, max_group_size=2))
+
+    actual = list(outgoing_transfer.on_acknowledgement(ack_number=2, window_size=4, selective=bytes([0b1000])))
+
+    assert all(isinstance(message, Data) for message in actual)
+    assert outgoing_transfer.loss_estimator.loss_rate > 0
+
+
 async def test_on_final_acknowledgement(outgoing_transfer: OutgoingTransfer):
     outgoing_transfer.finish = AsyncMock()
     data_list = list(outgoing_transfer.on_acknowledgement(ack_number=10, window_size=16))
@@ -41,3 +41,23 @@ async def test_consecutive_blocks(window: TransferWindow):
     actual = list(window.consecutive_blocks())
 
     assert actual == [b'first', b'second']
+
+
+async def test_first_missing(window: TransferWindow):
+    window.add(0, b'first')
+    window.add(2, b'third')
+
+    assert window.first_missing() == 1
+
+
+async def test_bitmap(window: TransferWindow):
+    window.add(0, b'first')
+    window.add(9, b'last')
+
+    bitmap = window.make_bitmap(10)
+
+    assert bitmap == bytes([0b00000001, 0b00000010])
+    assert TransferWindow.is_received(bitmap, 0)
+    assert not TransferWindow.is_received(bitmap, 1)
+    assert TransferWindow.is_received(bitmap, 9)
+    assert not TransferWindow.is_received(bitmap, 16)
@@ -8,11 +8,13 @@ class TransferWindow:
         self.start = start
         self.processed: int = 0
 
-    def add(self, index: int, block: bytes):
+    def add(self, index: int, block: bytes) -> bool:
+        """Add the block to the window. Return False if the block has already been received"""
         if self.blocks[index] is not None:
-            return
+            return False
         self.blocks[index] = block
         self.processed += 1
+        return True
 
     def is_finished(self) -> bool:
         return self.processed == len(self.blocks)
@@ -23,5 +25,28 @@ class TransferWindow:
                 break
             yield block
 
+    def first_missing(self) -> Optional[int]:
+        """Return the index of the first block that has not been received yet"""
+        for index, block in enumerate(self.blocks):
+            if block is None:
+                return index
+        return None
+
+    def make_bitmap(self, size: int) -> bytes:
+        """Return a bitmap of received blocks for the first `size` blocks of the window.
+
+        The bit `i % 8` of the byte `i // 8` is set if the block `i` has been received.
+        """
+        bitmap = bytearray((size + 7) // 8)
+        for index in range(size):
+            if self.blocks[index] is not None:
+                bitmap[index // 8] |= 1 << (index % 8)
+        return bytes(bitmap)
+
+    @staticmethod
+    def is_received(bitmap: bytes, index: int) -> bool:
+        byte = index // 8
+        return byte < len(bitmap) and bool(bitmap[byte] >> (index % 8) & 1)
+
     def __str__(self):
         return f'{{start: {self.start}, processed: {self.processed}, size: {len(self.blocks)}}}'
@@ -0,0 +1,30 @@
+from __future__ import annotations
+
+from typing import Callable, Hashable, OrderedDict, TypeVar
+
+K = TypeVar('K', bound=Hashable)
+V = TypeVar('V')
+
+
+class LRUCache(OrderedDict[K, V]):
+    """A dict that keeps at most `max_size` entries.
+
+    It is used for the state that the protocol keeps per peer between transfers, so the state
+    doesn't grow with every peer ever seen. The least recently used entries are dropped first.
+    """
+
+    def __init__(self, max_size: int):
+        super().__init__()
+        self.max_size = max_size
+
+    def get_or_create(self, key: K, factory: Callable[[], V]) -> V:
+        """Return the entry of the key, or create it with the `factory` in the case it is missing"""
+        value = self.get(key)
+        if value is not None:
+            self.move_to_end(key)
+            return value
+
+        value = self[key] = factory()
+        while len(self) > self.max_size:
+            self.popitem(last=False)
+        return value
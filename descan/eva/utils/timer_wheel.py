@@ -0,0 +1,138 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import math
+from typing import Any, Callable, List, Optional
+
+# A tolerance that compensates floating point errors in tick calculations
+EPSILON = 1e-9
+
+
+class Timer:
+    """A single entry of the timer wheel. The entry is removed lazily after cancellation"""
+
+    __slots__ = ['wheel', 'deadline', 'callback', 'args', 'active']
+
+    def __init__(self, wheel: TimerWheel, deadline: int, callback: Callable[..., Any], args: tuple):
+        self.wheel = wheel
+        self.deadline = deadline
+        self.callback = callback
+        self.args = args
+        self.active = True
+
+    def cancel(self):
+        if not self.active:
+            return
+
+        self.active = False
+        self.wheel.pending -= 1
+
+
+class TimerWheel:
+    """A hashed timer wheel that serves the timers of all transfers of the protocol.
+
+    The time is divided into ticks of `resolution` seconds. A timer is put into the slot
+    that corresponds to its deadline tick modulo the number of slots, so scheduling and
+    cancelling a timer take constant time. Cancelled timers stay in their slots and are
+    dropped when the slot is visited.
+
+    The wheel is driven by a single `loop.call_at` handle that is armed only while there
+    are pending timers. Timers never fire earlier than requested, and fire at most one
+    tick later.
+
+    An example:
+    >>> wheel = TimerWheel(resolution=0.05)
+    >>> timer = wheel.schedule(3, print, 'retransmit')
+    >>> timer.cancel()
+    """
+
+    def __init__(self, resolution: float = 0.05, slots: int = 512):
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.resolution = resolution
+        self.slots: List[List[Timer]] = [[] for _ in range(slots)]
+        self.pending = 0
+
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.origin = 0.0
+        self.tick = 0  # the last processed tick
+        self.handle: Optional[asyncio.TimerHandle] = None
+        self.armed_tick = 0
+
+    def schedule(self, delay: float, callback: Callable[..., Any], *args) -> Timer:
+        """Call `callback(*args)` after `delay` seconds"""
+        if not self.loop:
+            self.loop = asyncio.get_running_loop()
+            self.origin = self.loop.time()
+
+        if not self.pending and not self.handle:
+            # The wheel was idle, so there is nothing to catch up
+            self.tick = max(self.tick, self._current_tick())
+
+        deadline = math.ceil((self.loop.time() + max(delay, 0) - self.origin) / self.resolution - EPSILON)
+        timer = Timer(self, max(deadline, self.tick + 1), callback, args)
+        self.slots[timer.deadline % len(self.slots)].append(timer)
+        self.pending += 1
+
+        self._arm()
+        return timer
+
+    def stop(self):
+        """Cancel all pending timers"""
+        if self.handle:
+            self.handle.cancel()
+            self.handle = None
+
+        for slot in self.slots:
+            for timer in slot:
+                timer.cancel()
+            slot.clear()
+
+    def _on_tick(self):
+        self.handle = None
+        now = max(self._current_tick(), self.armed_tick)
+
+        # In the case that the loop was late, all slots between the last processed tick and now are visited,
+        # but every slot is visited at most once
+        first = self.tick + 1
+        count = min(now - self.tick, len(self.slots))
+        self.tick = now
+
+        for tick in range(first, first + count):
+            index = tick % len(self.slots)
+            entries = self.slots[index]
+            self.slots[index] = []
+
+            due = []
+            for timer in entries:
+                if not timer.active:
+                    continue
+                if timer.deadline <= now:
+                    due.append(timer)
+                else:
+                    self.slots[index].append(timer)
+
+            for timer in due:
+                self._fire(timer)
+
+        self._arm()
+
+    def _fire(self, timer: Timer):
+        if not timer.active:  # the timer could be cancelled by a previous callback
+            return
+
+        timer.cancel()
+        try:
+            timer.callback(*timer.args)
+        except Exception as e:  # pylint: disable=broad-except
+            self.logger.exception(f'Timer callback failed: {e.__class__.__name__}: {e}')
+
+    def _arm(self):
+        if self.handle or not self.pending:
+            return
+
+        self.armed_tick = self.tick + 1
+        self.handle = self.loop.call_at(self.origin + self.armed_tick * self.resolution, self._on_tick)
+
+    def _current_tick(self) -> int:
+        return int((self.loop.time() - self.origin) / self.resolution + EPSILON)
@@ -1,12 +1,13 @@
-import json
 import os
 import random
 from asyncio import sleep
-from binascii import unhexlify, hexlify
-from typing import List, Dict
+from binascii import hexlify
+from typing import List, Dict, Optional
 
 from descan.core.content import Content
 from descan.core.db.triplet import Triplet
+from descan.core.ingest import IngestPipeline, read_ethereum_blocks, read_torrents
+from descan.core.merkle import SignedTriplets
 from descan.core.rules.ethereum import EthereumBlockRule, EthereumTransactionRule
 from descan.core.rules.ptn import PTNRule
 from ipv8.configuration import ConfigBuilder
@@ -33,15 +34,19 @@ class DKGSimulation(SkipgraphSimulation):
 
         return builder
 
-    def on_triplets_generated(self, content: Content, triplets: List[Triplet]):
+    def on_triplets_generated(self, content: Content, triplets: List[Triplet],
+                              signed_triplets: Optional[SignedTriplets] = None):
         """
         We generated some triplets. Directly get the responsible node and store the triplets on that node.
         """
         content_keys = Content.get_keys(content.identifier, num_keys=self.settings.replication_factor)
         for ind in range(self.settings.replication_factor):
             responsible_node = self.get_responsible_node_for_key(content_keys[ind])
-            for triplet in triplets:
-                responsible_node.overlay.knowledge_graph.add_triplet(triplet)
+            if signed_triplets:
+                responsible_node.overlay.knowledge_graph.add_signed_triplets(signed_triplets)
+            else:
+                for triplet in triplets:
+                    responsible_node.overlay.knowledge_graph.add_triplet(triplet)
 
     def get_message_statistics(self, node):
         msg_stats_for_node = super().get_message_statistics(node)
@@ -70,21 +75,17 @@ class DKGSimulation(SkipgraphSimulation):
             for node in self.nodes:
                 node.overlay.rule_execution_engine.callback = self.on_triplets_generated
 
+        # Stream the torrents into the rule execution engines, instead of loading the whole file in memory
+        pipelines = self.create_ingest_pipelines()
         with open(self.settings.data_file_name) as torrents_file:
-            for ind, torrent_line in enumerate(torrents_file.readlines()):
+            for ind, content in enumerate(read_torrents(torrents_file)):
                 if ind % 1000 == 0:
                     print("Processed %d torrents..." % ind)
 
-                parts = torrent_line.strip().split("\t")
-                content_hash = unhexlify(parts[0])
-                content_data = parts[1].encode()
-                content = Content(content_hash, content_data)
+                await pipelines[ind % len(self.nodes)].put(content)
 
-                target_node = self.nodes[ind % len(self.nodes)]
-                target_node.overlay.content_db.add_content(content)
-
-                target_node.overlay.rule_execution_engine.process_queue.append(content)
-                target_node.overlay.rule_execution_engine.process()
+        for pipeline in pipelines:
+            await pipeline.flush()
 
         if not self.settings.fast_data_injection:
             await sleep(20)  # Give some time to store the edges in the network
@@ -103,34 +104,30 @@ class DKGSimulation(SkipgraphSimulation):
             for node in self.nodes:
                 node.overlay.rule_execution_engine.callback = self.on_triplets_generated
 
-        # Feed Ethereum blocks to the rule execution engines
-        total_tx = 0
+        # Stream the Ethereum blocks into the rule execution engines, instead of loading the whole file in memory
+        pipelines = self.create_ingest_pipelines()
         blocks_processed = 0
         with open(self.settings.data_file_name) as blocks_file:
-            for ind, block_line in enumerate(blocks_file.readlines()):
+            for ind, content in enumerate(read_ethereum_blocks(blocks_file)):
                 if self.settings.max_eth_blocks and blocks_processed >= self.settings.max_eth_blocks:
-                    print("Done - processed %d ETH blocks (txs so far: %d)..." % (ind, total_tx))
+                    print("Done - processed %d ETH blocks..." % ind)
                     break
 
                 if ind % 100 == 0:
-                    print("Processed %d ETH blocks (txs so far: %d)..." % (ind, total_tx))
-
-                block_json = json.loads(block_line.strip())
-                total_tx += len(block_json["transactions"])
-                content_hash = unhexlify(block_json["hash"][2:])
-                content_data = block_line.strip().encode()
-                content = Content(content_hash, content_data)
+                    print("Processed %d ETH blocks..." % ind)
 
-                target_node = self.nodes[ind % len(self.nodes)]
-                target_node.overlay.content_db.add_content(content)
+                await pipelines[ind % len(self.nodes)].put(content)
+                blocks_processed += 1
 
-                target_node.overlay.rule_execution_engine.process_queue.append(content)
-                while target_node.overlay.rule_execution_engine.process_queue:
-                    target_node.overlay.rule_execution_engine.process()
+        for pipeline in pipelines:
+            await pipeline.flush()
 
-                blocks_processed += 1
+        # Each transaction of a block is processed as a separate content item
+        total_processed = sum(node.overlay.rule_execution_engine.processed_count for node in self.nodes)
+        print("Total ETH transactions: %d" % (total_processed - blocks_processed))
 
-        print("Total ETH transactions: %d" % total_tx)
+    def create_ingest_pipelines(self) -> List[IngestPipeline]:
+        return [IngestPipeline(node.overlay.rule_execution_engine, node.overlay.content_db) for node in self.nodes]
 
     async def start_ipv8_nodes(self) -> None:
         await super().start_ipv8_nodes()
@@ -278,6 +275,20 @@ class DKGSimulation(SkipgraphSimulation):
                     tot_triplets_requests_latency / num_edge_searches,
                     tot_search_latency / num_edge_searches))
 
+        # Write away the EVA transfer statistics per node, to separate the delivery costs from the SG routing
+        with open(os.path.join(self.data_dir, "eva_stats.csv"), "w") as eva_stats_file:
+            eva_stats_file.write("peer,direction,transfers,failed,bytes,blocks,retransmitted_blocks,timeouts,"
+                                 "goodput_p50,rtt_p50,rtt_p99,queued_time_p50,duration_p50\n")
+            for ind, node in enumerate(self.nodes):
+                eva_statistics = node.overlay.eva.statistics
+                for direction, stats in (("in", eva_statistics.incoming), ("out", eva_statistics.outgoing)):
+                    eva_stats_file.write("%d,%s,%d,%d,%d,%d,%d,%d,%f,%f,%f,%f,%f\n" %
+                                         (ind, direction, stats.transfers, stats.failed, stats.bytes, stats.blocks,
+                                          stats.retransmitted_blocks, stats.timeouts,
+                                          stats.goodput.percentile(50) or 0, stats.rtt.percentile(50) or 0,
+                                          stats.rtt.percentile(99) or 0, stats.queued_time.percentile(50) or 0,
+                                          stats.duration.percentile(50) or 0))
+
         # Determine individual search message statistics
         aggregated_search_message_statistics: Dict[int, Dict[int, int]] = {}
         for node in self.nodes:
@@ -0,0 +1,3 @@
+"""
+Contains benchmarks for the EVA transfer protocol.
+"""
@@ -0,0 +1,240 @@
+"""
+Measures the throughput and the latency of the EVA protocol over a simulated lossy network.
+
+The benchmark sweeps the payload size, the window size, the block size and the number of concurrent transfers
+(see EVABenchmarkSettings). For each combination it reports the goodput, the p50/p99 completion time of the
+transfers and the CPU time spent per transferred MB. The results are written to a JSON and a CSV file, so they
+can be compared between revisions of the transfer engine.
+
+Run it from the root of the repository:
+
+    export PYTHONPATH=$PWD
+    python simulations/eva/eva_benchmark.py
+"""
+import asyncio
+import csv
+import json
+import logging
+import math
+import os
+import random
+import time
+from itertools import product
+from typing import Dict, List, Optional, Tuple
+
+from descan.eva.protocol import EVAProtocol
+from descan.eva.settings import EVASettings
+
+from ipv8.community import Community
+from ipv8.keyvault.crypto import default_eccrypto
+from ipv8.peer import Peer
+from ipv8.peerdiscovery.network import Network
+
+from simulation.discrete_loop import DiscreteLoop
+from simulation.simulation_endpoint import SimulationEndpoint
+
+from simulations.eva.settings import EVABenchmarkSettings
+
+MB = 1024 * 1024
+
+
+class LossyEndpoint(SimulationEndpoint):
+    """
+    A simulation endpoint with a configurable latency, loss, reordering and bandwidth of the outgoing link.
+    """
+
+    def __init__(self, settings: EVABenchmarkSettings, rng: random.Random) -> None:
+        super().__init__()
+        self.settings = settings
+        self.random = rng
+        # The (virtual) time at which the link finishes sending the queued packets
+        self.link_free_at: float = 0
+        self.sent_packets: int = 0
+        self.dropped_packets: int = 0
+
+    def get_link_latency(self, to_address):
+        return self.settings.latency
+
+    def send(self, socket_address, packet):
+        loop = asyncio.get_event_loop()
+        self.sent_packets += 1
+
+        delay = self.get_link_latency(socket_address)
+        if self.settings.bandwidth:
+            self.link_free_at = max(loop.time(), self.link_free_at) + len(packet) / self.settings.bandwidth
+            delay += self.link_free_at - loop.time()
+
+        # A dropped packet still occupies the link
+        if self.random.random() < self.settings.loss_rate:
+            self.dropped_packets += 1
+            return
+
+        if self.random.random() < self.settings.reorder_rate:
+            delay += self.random.uniform(0, self.settings.reorder_delay)
+
+        loop.call_later(delay, super(SimulationEndpoint, self).send, socket_address, packet)
+
+
+class BenchmarkCommunity(Community):
+    community_id = b"eva-benchmark".ljust(20, b"\x00")
+
+    def __init__(self, *args, eva_settings: EVASettings, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.eva = EVAProtocol(self, settings=eva_settings)
+
+
+async def create_community(settings: EVABenchmarkSettings, eva_settings: EVASettings,
+                           rng: random.Random) -> BenchmarkCommunity:
+    endpoint = LossyEndpoint(settings, rng)
+    await endpoint.open()
+    peer = Peer(default_eccrypto.generate_key("curve25519"), endpoint.wan_address)
+    return BenchmarkCommunity(peer, endpoint, Network(), eva_settings=eva_settings)
+
+
+def percentile(values: List[float], percent: float) -> Optional[float]:
+    if not values:
+        return None
+    values = sorted(values)
+    return values[max(math.ceil(len(values) * percent / 100) - 1, 0)]
+
+
+async def run_transfers(settings: EVABenchmarkSettings, eva_settings: EVASettings, payload_size: int,
+                        concurrent_transfers: int, rng: random.Random) -> Dict:
+    """
+    Send the given number of concurrent transfers from one peer to another one and measure them.
+    """
+    loop = asyncio.get_event_loop()
+    sender = await create_community(settings, eva_settings, rng)
+    receiver = await create_community(settings, eva_settings, rng)
+
+    completion_times: List[float] = []
+    failed = 0
+
+    async def send(index: int) -> None:
+        nonlocal failed
+        started = loop.time()
+        try:
+            await sender.eva.send_binary(receiver.my_peer, b"%d" % index, os.urandom(payload_size))
+            completion_times.append(loop.time() - started)
+        except Exception:  # pylint: disable=broad-except
+            failed += 1
+
+    start_time = loop.time()
+    start_cpu = time.process_time()
+    await asyncio.gather(*[send(index) for index in range(concurrent_transfers)])
+    cpu_time = time.process_time() - start_cpu
+    duration = loop.time() - start_time
+
+    transferred = payload_size * len(completion_times)
+    result = {
+        "transfers": concurrent_transfers,
+        "failed": failed,
+        "duration": duration,
+        "goodput": transferred / duration if duration else 0,
+        "cpu_per_mb": cpu_time / (transferred / MB) if transferred else None,
+        "completion_times": completion_times,
+        "sent_packets": sender.endpoint.sent_packets + receiver.endpoint.sent_packets,
+        "dropped_packets": sender.endpoint.dropped_packets + receiver.endpoint.dropped_packets,
+        "retransmitted_blocks": sender.eva.statistics.outgoing.retransmitted_blocks,
+    }
+
+    await sender.eva.shutdown()
+    await receiver.eva.shutdown()
+    await sender.unload()
+    await receiver.unload()
+    return result
+
+
+def run_in_discrete_loop(settings: EVABenchmarkSettings, eva_settings: EVASettings, payload_size: int,
+                         concurrent_transfers: int, rng: random.Random) -> Dict:
+    """
+    Run a single benchmark run in a fresh discrete event loop, so the network delays take no real time.
+    """
+    loop = DiscreteLoop()
+    asyncio.set_event_loop(loop)
+    result = {}
+
+    async def main() -> None:
+        try:
+            result.update(await asyncio.wait_for(
+                run_transfers(settings, eva_settings, payload_size, concurrent_transfers, rng), settings.timeout))
+        finally:
+            loop.stop()
+
+    # The task is created on the new loop explicitly, the previous discrete loop remains set as the running one
+    loop.create_task(main())
+    loop.run_forever()
+    return result
+
+
+def run_benchmark(settings: EVABenchmarkSettings) -> List[Dict]:
+    rng = random.Random(settings.seed)
+    results = []
+    combinations: List[Tuple[int, int, int, int]] = list(product(settings.payload_sizes, settings.window_sizes,
+                                                                 settings.block_sizes, settings.concurrent_transfers))
+    for payload_size, window_size, block_size, concurrent_transfers in combinations:
+        eva_settings = EVASettings(block_size=block_size, window_size=window_size,
+                                   max_simultaneous_transfers=max(concurrent_transfers, 10),
+                                   max_simultaneous_transfers_per_peer=concurrent_transfers)
+        # The benchmark measures the transfer engine, not the compression of random data
+        eva_settings.compression.enabled = False
+        eva_settings.resumption.enabled = False
+
+        completion_times: List[float] = []
+        goodputs: List[float] = []
+        cpu_per_mb: List[float] = []
+        failed = 0
+        retransmitted_blocks = 0
+        dropped_packets = 0
+        for _ in range(settings.repetitions):
+            run = run_in_discrete_loop(settings, eva_settings, payload_size, concurrent_transfers, rng)
+            completion_times.extend(run["completion_times"])
+            goodputs.append(run["goodput"])
+            if run["cpu_per_mb"] is not None:
+                cpu_per_mb.append(run["cpu_per_mb"])
+            failed += run["failed"]
+            retransmitted_blocks += run["retransmitted_blocks"]
+            dropped_packets += run["dropped_packets"]
+
+        result = {
+            "payload_size": payload_size,
+            "window_size": window_size,
+            "block_size": block_size,
+            "concurrent_transfers": concurrent_transfers,
+            "latency": settings.latency,
+            "loss_rate": settings.loss_rate,
+            "reorder_rate": settings.reorder_rate,
+            "bandwidth": settings.bandwidth,
+            "repetitions": settings.repetitions,
+            "failed": failed,
+            "goodput": sum(goodputs) / len(goodputs),
+            "completion_time_p50": percentile(completion_times, 50),
+            "completion_time_p99": percentile(completion_times, 99),
+            "cpu_per_mb": sum(cpu_per_mb) / len(cpu_per_mb) if cpu_per_mb else None,
+            "retransmitted_blocks": retransmitted_blocks,
+            "dropped_packets": dropped_packets,
+        }
+        print("Payload: %d, window: %d, block: %d, concurrent: %d -> goodput: %.0f B/s, p50: %s, p99: %s, "
+              "CPU/MB: %s, failed: %d" % (payload_size, window_size, block_size, concurrent_transfers,
+                                          result["goodput"], result["completion_time_p50"],
+                                          result["completion_time_p99"], result["cpu_per_mb"], failed))
+        results.append(result)
+
+    return results
+
+
+def write_results(settings: EVABenchmarkSettings, results: List[Dict], data_dir: str = "data") -> None:
+    os.makedirs(data_dir, exist_ok=True)
+    with open(os.path.join(data_dir, "eva_%s.json" % settings.name), "w") as json_file:
+        json.dump({"settings": settings.__dict__, "results": results}, json_file, indent=2)
+
+    with open(os.path.join(data_dir, "eva_%s.csv" % settings.name), "w", newline="") as csv_file:
+        writer = csv.DictWriter(csv_file, fieldnames=list(results[0].keys()) if results else [])
+        writer.writeheader()
+        writer.writerows(results)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.ERROR)
+    benchmark_settings = EVABenchmarkSettings()
+    write_results(benchmark_settings, run_benchmark(benchmark_settings))
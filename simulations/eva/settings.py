@@ -0,0 +1,43 @@
+from dataclasses import dataclass, field
+from typing import List
+
+
+@dataclass
+class EVABenchmarkSettings:
+    """
+    Settings of the EVA benchmark. Each combination of the sweep lists is a separate run, in which transfers
+    are sent from one peer to another one over a simulated network.
+    """
+
+    # The name of the benchmark. The results are written to data/eva_<name>.json and data/eva_<name>.csv.
+    name: str = "benchmark"
+
+    # The one-way latency of the link in seconds.
+    latency: float = 0.05
+
+    # The probability that a packet is dropped. This is a number ranging from 0 to 1.
+    loss_rate: float = 0.0
+
+    # The probability that a packet is delayed by a random extra delay (up to reorder_delay seconds), so that it
+    # arrives after packets that have been sent later.
+    reorder_rate: float = 0.0
+    reorder_delay: float = 0.02
+
+    # The bandwidth of the link in bytes per second. Packets are serialized onto the link, so they are queued when
+    # sent faster. Zero means the unlimited bandwidth.
+    bandwidth: int = 1024 * 1024
+
+    # The sweep parameters.
+    payload_sizes: List[int] = field(default_factory=lambda: [10 * 1024, 1024 * 1024])
+    window_sizes: List[int] = field(default_factory=lambda: [16, 64])
+    block_sizes: List[int] = field(default_factory=lambda: [1000])
+    concurrent_transfers: List[int] = field(default_factory=lambda: [1, 8])
+
+    # The number of times each combination is repeated. The results of repetitions are aggregated.
+    repetitions: int = 3
+
+    # The seed of the random generator that decides about losses and reordering.
+    seed: int = 42
+
+    # An upper limit for the simulated duration of a single run, in seconds.
+    timeout: float = 600
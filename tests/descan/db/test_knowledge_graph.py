@@ -2,6 +2,9 @@ import pytest
 
 from descan.core.db.knowledge_graph import KnowledgeGraph
 from descan.core.db.triplet import Triplet
+from descan.core.merkle import SignedTriplets, TripletCommitment, get_leaves, get_proof, hash_triplet
+
+from ipv8.keyvault.crypto import default_eccrypto
 
 
 @pytest.fixture
@@ -38,3 +41,56 @@ def test_get_storage_costs(knowledge_graph):
     knowledge_graph.add_triplet(Triplet(b"abc", b"def", b"ghi"))
     s2 = knowledge_graph.get_storage_costs()
     assert s2 > s1
+
+
+def test_get_signed_triplets_of_node(knowledge_graph):
+    key = default_eccrypto.generate_key("curve25519")
+    triplets = [Triplet(b"a", b"b", b"c"), Triplet(b"a", b"b", b"d"), Triplet(b"e", b"b", b"f")]
+    knowledge_graph.add_signed_triplets(SignedTriplets(TripletCommitment.create(key, b"a", triplets), triplets))
+    knowledge_graph.add_triplet(Triplet(b"g", b"b", b"a"))
+
+    unsigned, signed = knowledge_graph.get_signed_triplets_of_node(b"a")
+    assert unsigned == [Triplet(b"g", b"b", b"a")]
+    assert len(signed) == 1
+    assert sorted(signed[0].triplets, key=lambda triplet: triplet.tail) == triplets[:2]
+    assert len(signed[0].proofs) == 2
+    assert signed[0].is_valid()
+
+    # All triplets of the commitment are returned, so no proofs are needed
+    other_triplets = [Triplet(b"x", b"b", b"y")]
+    knowledge_graph.add_signed_triplets(SignedTriplets(TripletCommitment.create(key, b"x", other_triplets),
+                                                       other_triplets))
+    unsigned, signed = knowledge_graph.get_signed_triplets_of_node(b"x")
+    assert not unsigned
+    assert signed[0].triplets == other_triplets
+    assert signed[0].proofs is None
+
+
+def test_latest_commitment(knowledge_graph):
+    """
+    Test whether triplets that were added later, with proofs against a new commitment, are grouped by it.
+    """
+    key = default_eccrypto.generate_key("curve25519")
+    triplets = [Triplet(b"a", b"b", b"c")]
+    knowledge_graph.add_signed_triplets(SignedTriplets(TripletCommitment.create(key, b"a", triplets), triplets))
+
+    all_triplets = triplets + [Triplet(b"a", b"b", b"d")]
+    commitment = TripletCommitment.create(key, b"a", all_triplets)
+    leaves = get_leaves(all_triplets)
+    proof = get_proof(leaves, hash_triplet(all_triplets[1]))
+    knowledge_graph.add_signed_triplets(SignedTriplets(commitment, all_triplets[1:], [proof]))
+
+    # The first triplet is still covered by the first commitment only
+    unsigned, signed = knowledge_graph.get_signed_triplets_of_node(b"a")
+    assert not unsigned
+    assert len(signed) == 2
+    assert signed[0].proofs is None
+    assert signed[1].commitment.digest == commitment.digest
+    assert signed[1].triplets == all_triplets[1:]
+    assert all(group.is_valid() for group in signed)
+
+    # Once it is stored with the new commitment as well, the latest commitment is used
+    knowledge_graph.add_signed_triplets(SignedTriplets(commitment, all_triplets))
+    _, signed = knowledge_graph.get_signed_triplets_of_node(b"a")
+    assert [group.commitment.digest for group in signed] == [commitment.digest]
+    assert signed[0].proofs is None
@@ -0,0 +1,78 @@
+import pytest
+
+from descan.core.content import Content, ContentType
+from descan.core.db.processed_database import ProcessedDatabase
+
+
+@pytest.fixture
+def processed_db():
+    db = ProcessedDatabase()
+    yield db
+    db.close()
+
+
+def test_mark_processed(processed_db):
+    processed_db.add_pending([Content(b"a", b"test1"), Content(b"b", b"test2")])
+    processed_db.mark_processed(b"a", [(b"DUMMY", 1)], follow_up=[Content(b"c", b"test3")])
+
+    assert processed_db.get_applied_rules(b"a") == {b"DUMMY": 1}
+    assert not processed_db.get_applied_rules(b"b")
+    assert sorted(content.identifier for content in processed_db.get_pending()) == [b"b", b"c"]
+    assert processed_db.num_processed() == 1
+
+
+def test_upgrade_rule(processed_db):
+    processed_db.mark_processed(b"a", [(b"DUMMY", 1), (b"OTHER", 1)])
+    processed_db.mark_processed(b"a", [(b"DUMMY", 2)])
+    assert processed_db.get_applied_rules(b"a") == {b"DUMMY": 2, b"OTHER": 1}
+
+
+def test_persistence(tmp_path):
+    path = str(tmp_path / "processed.db")
+    db = ProcessedDatabase(path)
+    db.add_pending([Content(b"a", b"test1", content_type=ContentType.TORRENT)])
+    db.mark_processed(b"b", [(b"DUMMY", 1)])
+    db.close()
+
+    db = ProcessedDatabase(path)
+    assert db.get_applied_rules(b"b") == {b"DUMMY": 1}
+    pending = db.get_pending()
+    assert [(content.identifier, content.data) for content in pending] == [(b"a", b"test1")]
+    assert pending[0].content_type == ContentType.TORRENT
+    db.close()
+
+
+def test_persist_by_parent(tmp_path):
+    path = str(tmp_path / "processed.db")
+    db = ProcessedDatabase(path)
+    block = Content(b"block", b'{"transactions": [{"from": "a"}, {"from": "b"}]}',
+                    content_type=ContentType.ETHEREUM_BLOCK)
+    follow_up = [Content.from_parent(b"tx%d" % index, block, "transactions", index,
+                                     ContentType.ETHEREUM_TRANSACTION) for index in range(2)]
+    db.mark_processed(b"block", [(b"DUMMY", 1)], follow_up=follow_up)
+    db.commit()
+    assert not db.connection.execute("SELECT 1 FROM pending WHERE data IS NOT NULL").fetchall()
+    db.close()
+
+    db = ProcessedDatabase(path)
+    pending = sorted(db.get_pending(), key=lambda content: content.identifier)
+    assert [content.parsed for content in pending] == [{"from": "a"}, {"from": "b"}]
+    assert all(content.content_type == ContentType.ETHEREUM_TRANSACTION for content in pending)
+
+    # The parent is removed once all its follow-up content has been processed
+    for content in pending:
+        db.mark_processed(content.identifier, [(b"DUMMY", 1)])
+    db.commit()
+    assert not db.connection.execute("SELECT 1 FROM parents").fetchall()
+    db.close()
+
+
+def test_leaves(processed_db):
+    processed_db.set_leaves(b"a", [b"FIRST", b"SECOND"], [(b"1", b"FIRST"), (b"2", b"FIRST"), (b"2", b"SECOND")])
+    assert processed_db.get_leaves(b"a") == [b"1", b"2"]
+    assert processed_db.get_leaves(b"a", exclude_rules={b"FIRST"}) == [b"2"]
+
+    # The leaves of a rule are replaced
+    processed_db.set_leaves(b"a", [b"FIRST"], [(b"3", b"FIRST")])
+    assert processed_db.get_leaves(b"a") == [b"2", b"3"]
+    assert not processed_db.get_leaves(b"b")
@@ -0,0 +1,38 @@
+from descan.core.content import Content, ContentType
+from descan.core.db.rules_database import RulesDatabase
+from descan.core.rule_execution_engine import apply_rules
+from descan.core.rules.dummy import DummyRule
+
+
+class TorrentRule(DummyRule):
+    RULE_NAME = b"TORRENT"
+    CONTENT_TYPES = {ContentType.TORRENT}
+
+
+class BlockRule(DummyRule):
+    RULE_NAME = b"BLOCK"
+    CONTENT_TYPES = {ContentType.ETHEREUM_BLOCK}
+
+    def applies_to(self, content: Content) -> bool:
+        return content.identifier != b"skip"
+
+
+def test_get_rules_for():
+    rules_db = RulesDatabase()
+    for rule in (DummyRule(), TorrentRule(), BlockRule()):
+        rules_db.add_rule(rule)
+
+    assert [rule.RULE_NAME for rule in rules_db.get_rules_for(ContentType.TORRENT)] == [b"DUMMY", b"TORRENT"]
+    assert [rule.RULE_NAME for rule in rules_db.get_rules_for(ContentType.ETHEREUM_TRANSACTION)] == [b"DUMMY"]
+    assert len(rules_db.get_rules_for(None)) == 3
+
+
+def test_apply_matching_rules():
+    rules_db = RulesDatabase()
+    rules_db.add_rule(TorrentRule())
+    rules_db.add_rule(BlockRule())
+
+    rules = rules_db.get_rules_for(ContentType.ETHEREUM_BLOCK)
+    triplets = apply_rules(rules, None, Content(b"a", b"test", content_type=ContentType.ETHEREUM_BLOCK))
+    assert [triplet.rules for triplet in triplets] == [[b"BLOCK"]]
+    assert not apply_rules(rules, None, Content(b"skip", b"test", content_type=ContentType.ETHEREUM_BLOCK))
@@ -3,6 +3,7 @@ from typing import List
 from descan.core.community import DKGCommunity
 from descan.core.content import Content
 from descan.core.db.triplet import Triplet
+from descan.core.merkle import SignedTriplets, TripletCommitment
 from descan.skipgraph.community import SkipGraphCommunity
 from descan.skipgraph.membership_vector import MembershipVector
 from descan.skipgraph.util import verify_skip_graph_integrity
@@ -102,6 +103,31 @@ class TestDKGCommunitySingleReplication(TestDKGCommunityBase):
         triplets = await self.nodes[1].overlay.search_edges(b"abcdefg")
         assert len(triplets) == 1
 
+    async def test_store_signed_triplets(self):
+        """
+        Test storing and retrieving triplets with a signed commitment, and dropping triplets with a forged one.
+        """
+        await self.setup_skip_graphs()
+
+        content = Content(b"abcdefg", b"")
+        triplets = [Triplet(b"abcdefg", b"b", b"c"), Triplet(b"abcdefg", b"b", b"d")]
+        commitment = TripletCommitment.create(self.nodes[0].overlay.my_peer.key, content.identifier, triplets)
+        await self.nodes[0].overlay.on_new_triplets_generated(content, triplets, SignedTriplets(commitment, triplets))
+        await self.deliver_messages()
+        assert self.nodes[1].overlay.knowledge_graph.get_num_edges() == 2
+        assert len(self.nodes[1].overlay.knowledge_graph.commitments) == 1
+
+        self.nodes[0].overlay.require_signed_triplets = True
+        triplets = await self.nodes[0].overlay.search_edges(b"abcdefg")
+        assert len(triplets) == 2
+
+        # Triplets that do not match the signed root are not stored
+        forged_triplets = [Triplet(b"abcdefg", b"b", b"e")]
+        await self.nodes[0].overlay.on_new_triplets_generated(content, forged_triplets,
+                                                              SignedTriplets(commitment, forged_triplets))
+        await self.deliver_messages()
+        assert self.nodes[1].overlay.knowledge_graph.get_num_edges() == 2
+
     async def test_storage_request(self):
         """
         Test sending storage requests.
@@ -0,0 +1,52 @@
+import json
+import pickle
+from unittest.mock import patch
+
+import pytest
+
+from descan.core.content import Content
+
+
+def test_parse_once():
+    content = Content(b"a", json.dumps({"hash": "0x00"}).encode())
+    with patch("descan.core.content.json.loads", wraps=json.loads) as loads:
+        assert content.parsed == {"hash": "0x00"}
+        assert content.parsed is content.parsed
+        assert loads.call_count == 1
+
+
+def test_parsed_content():
+    content = Content(b"a", parsed={"hash": "0x00"})
+    assert json.loads(content.data) == {"hash": "0x00"}
+
+
+def test_no_data():
+    with pytest.raises(ValueError):
+        Content(b"a")
+
+
+def test_from_parent():
+    parent = Content(b"a", json.dumps({"items": [{"hash": "0x01"}, {"hash": "0x02"}]}).encode())
+    content = Content.from_parent(b"b", parent, "items", 1)
+    assert content.parsed == {"hash": "0x02"}
+    assert content.parent is parent
+
+
+def test_pickle_without_parent():
+    parent = Content(b"a", json.dumps({"items": [{"hash": "0x01"}], "padding": "0" * 10000}).encode())
+    content = pickle.loads(pickle.dumps(Content.from_parent(b"b", parent, "items", 0)))
+    assert content.parsed == {"hash": "0x01"}
+    assert content.parent is None
+    assert (content.parent_key, content.parent_index) == ("items", 0)
+
+
+def test_release_parsed():
+    content = Content(b"a", b'{"hash": "0x00"}', parsed={"hash": "0x00"})
+    content.release_parsed()
+    assert content._parsed is None
+    assert content.parsed == {"hash": "0x00"}
+
+    # Content without data keeps its parsed representation
+    content = Content(b"a", parsed={"hash": "0x00"})
+    content.release_parsed()
+    assert content.parsed == {"hash": "0x00"}
@@ -0,0 +1,149 @@
+import json
+from asyncio import sleep
+from binascii import hexlify
+
+import pytest
+
+from descan.core.content import Content
+from descan.core.db.content_database import ContentDatabase
+from descan.core.db.rules_database import RulesDatabase
+from descan.core.ingest import IngestPipeline, follow_lines, read_ethereum_blocks, read_torrents
+from descan.core.rule_execution_engine import RuleExecutionEngine
+from descan.core.rules.dummy import DummyRule
+
+
+@pytest.fixture
+async def rule_execution_engine():
+    rules_db = RulesDatabase()
+    rules_db.add_rule(DummyRule())
+    engine = RuleExecutionEngine(ContentDatabase(), rules_db, None, None)
+    yield engine
+    engine.shutdown()
+
+
+@pytest.fixture
+def pipeline(rule_execution_engine):
+    return IngestPipeline(rule_execution_engine, rule_execution_engine.content_db, max_queued=5, max_storing=3,
+                          poll_interval=0.01)
+
+
+def test_read_torrents():
+    contents = list(read_torrents(["%s\tubuntu.iso\n" % ("aa" * 20), "\n", "%s\tdebian.iso\n" % ("bb" * 20)]))
+    assert [content.identifier for content in contents] == [b"\xaa" * 20, b"\xbb" * 20]
+    assert contents[0].data == b"ubuntu.iso"
+
+
+def test_read_ethereum_blocks():
+    block = json.dumps({"hash": "0x" + "cc" * 32, "transactions": []})
+    contents = list(read_ethereum_blocks([block + "\n"]))
+    assert len(contents) == 1
+    assert contents[0].identifier == b"\xcc" * 32
+    assert json.loads(contents[0].data) == json.loads(block)
+
+
+@pytest.mark.asyncio
+async def test_skip_known_content(pipeline):
+    assert await pipeline.put(Content(b"a", b"test"))
+    assert not await pipeline.put(Content(b"a", b"test"))
+    assert pipeline.ingested == 1
+    assert pipeline.skipped == 1
+
+
+@pytest.mark.asyncio
+@pytest.mark.timeout(5)
+async def test_backpressure(pipeline):
+    """
+    Test whether the engine queue stays bounded while ingesting and whether all content is processed after a flush.
+    """
+    results = []
+
+    async def store(content, triplets, signed_triplets):
+        await sleep(0.001)
+        results.append(content.identifier)
+
+    pipeline.engine.callback = store
+    queue_depths = []
+    for ind in range(50):
+        await pipeline.put(Content(b"%d" % ind, b"test"))
+        queue_depths.append(pipeline.engine.queue_depth)
+        assert len(pipeline.engine.pending_callbacks) <= pipeline.max_storing
+    assert max(queue_depths) <= pipeline.max_queued
+
+    await pipeline.flush()
+    assert len(results) == 50
+    assert not pipeline.engine.pending_callbacks
+
+
+@pytest.mark.asyncio
+@pytest.mark.timeout(5)
+async def test_release_parsed_content(pipeline):
+    """
+    Test whether the stored content does not keep its parsed representation once it has been processed.
+    """
+    pipeline.engine.callback = lambda content, triplets, signed_triplets: None
+    block = json.dumps({"hash": "0x" + "cc" * 32, "transactions": []})
+    for content in read_ethereum_blocks([block]):
+        await pipeline.put(content)
+    await pipeline.flush()
+
+    content = pipeline.content_db.get_content(b"\xcc" * 32)
+    assert content._parsed is None
+
+
+@pytest.mark.asyncio
+@pytest.mark.timeout(5)
+async def test_run_limit(pipeline):
+    pipeline.engine.callback = lambda content, triplets, signed_triplets: None
+    assert await pipeline.run((Content(b"%d" % ind, b"test") for ind in range(20)), limit=10) == 10
+    await pipeline.flush()
+    assert pipeline.engine.processed_count == 10
+
+
+@pytest.mark.asyncio
+@pytest.mark.timeout(5)
+async def test_follow_growing_file(tmp_path, pipeline):
+    """
+    Test whether content that is appended to a file is ingested.
+    """
+    pipeline.engine.callback = lambda content, triplets, signed_triplets: None
+    path = tmp_path / "torrents.txt"
+    path.write_text("%s\tfirst\n" % hexlify(b"a" * 20).decode())
+
+    async def torrents(torrents_file):
+        async for line in follow_lines(torrents_file, poll_interval=0.01):
+            for content in read_torrents([line]):
+                yield content
+
+    with open(path) as torrents_file:
+        lines = follow_lines(torrents_file, poll_interval=0.01)
+        assert await lines.__anext__() == "%s\tfirst\n" % hexlify(b"a" * 20).decode()
+
+        # A partially written line is only yielded once it is complete
+        with open(path, "a") as out_file:
+            out_file.write(hexlify(b"b" * 20).decode())
+            out_file.flush()
+            await sleep(0.05)
+            out_file.write("\tsecond\n")
+        assert await lines.__anext__() == "%s\tsecond\n" % hexlify(b"b" * 20).decode()
+        await lines.aclose()
+
+    with open(path) as torrents_file:
+        assert await pipeline.run(torrents(torrents_file), limit=2) == 2
+    await pipeline.flush()
+    assert pipeline.engine.processed_count == 2
+
+
+@pytest.mark.asyncio
+async def test_ingest_without_matching_rules(pipeline):
+    """
+    Test whether content to which no rule applies is still ingested.
+    """
+    pipeline.engine.callback = lambda content, triplets, signed_triplets: None
+    pipeline.engine.rules_db = RulesDatabase()
+    assert await pipeline.put(Content(b"a", b"test"))
+    assert pipeline.content_db.has_content(b"a")
+
+    # Content to which rules have been applied before is skipped, even if it is not in the content database
+    pipeline.engine.processed_db.mark_processed(b"b", [(b"DUMMY", 1)])
+    assert not await pipeline.put(Content(b"b", b"test"))
+    assert pipeline.skipped == 1
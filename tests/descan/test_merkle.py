@@ -0,0 +1,63 @@
+import pytest
+
+from descan.core.db.triplet import Triplet
+from descan.core.merkle import CommitmentVerifier, SignedTriplets, TripletCommitment, get_leaves, get_proof, \
+    get_root, hash_triplet, verify_proof
+
+from ipv8.keyvault.crypto import default_eccrypto
+
+
+@pytest.fixture
+def key():
+    return default_eccrypto.generate_key("curve25519")
+
+
+def make_triplets(count: int):
+    return [Triplet(b"a", b"rel", b"tail %d" % ind) for ind in range(count)]
+
+
+def test_root_is_order_independent():
+    triplets = make_triplets(5)
+    assert get_root(get_leaves(triplets)) == get_root(get_leaves(list(reversed(triplets))))
+    assert get_root(get_leaves(triplets)) != get_root(get_leaves(triplets[:4]))
+
+
+@pytest.mark.parametrize("count", [1, 2, 3, 7, 8])
+def test_proofs(count):
+    leaves = get_leaves(make_triplets(count))
+    root = get_root(leaves)
+    for leaf in leaves:
+        assert verify_proof(leaf, get_proof(leaves, leaf), root)
+    assert not verify_proof(hash_triplet(Triplet(b"x", b"y", b"z")), get_proof(leaves, leaves[0]), root)
+
+
+def test_commitment(key):
+    triplets = make_triplets(3)
+    commitment = TripletCommitment.create(key, b"a", triplets)
+    assert commitment.has_valid_signature()
+    assert SignedTriplets(commitment, triplets).is_valid()
+    assert not SignedTriplets(commitment, triplets[:2]).is_valid()
+
+    commitment.content_identifier = b"b"
+    assert not commitment.has_valid_signature()
+
+
+def test_verify_batch(key):
+    triplets = make_triplets(4)
+    commitment = TripletCommitment.create(key, b"a", triplets)
+    leaves = get_leaves(triplets)
+    partial = SignedTriplets(commitment, triplets[:1], [get_proof(leaves, hash_triplet(triplets[0]))])
+    forged = SignedTriplets(commitment, [Triplet(b"a", b"rel", b"forged")], partial.proofs)
+
+    verifier = CommitmentVerifier()
+    valid, invalid = verifier.verify([SignedTriplets(commitment, triplets), partial, forged])
+    assert valid == [valid[0], partial]
+    assert invalid == [forged]
+    assert len(verifier.verified) == 1
+
+    # A reused signature does not verify another root
+    other = TripletCommitment(b"a", get_root(get_leaves(triplets[:3])), 3, commitment.public_key,
+                              commitment.signature)
+    valid, invalid = verifier.verify([SignedTriplets(other, triplets[:3])])
+    assert not valid
+    assert len(invalid) == 1
@@ -1,4 +1,5 @@
-from asyncio import Future
+import json
+from asyncio import Future, gather, sleep
 from binascii import hexlify
 from typing import List
 
@@ -6,12 +7,15 @@ import pytest
 
 from descan.core.content import Content
 from descan.core.db.content_database import ContentDatabase
-from descan.core.db.knowledge_graph import KnowledgeGraph
+from descan.core.db.processed_database import ProcessedDatabase
 from descan.core.db.rules_database import RulesDatabase
 from descan.core.db.triplet import Triplet
+from descan.core.merkle import SignedTriplets
 from descan.core.rule_execution_engine import RuleExecutionEngine
 from descan.core.rules.dummy import DummyRule
 
+from ipv8.keyvault.crypto import default_eccrypto
+
 
 @pytest.fixture
 def content_db():
@@ -31,14 +35,15 @@ def rules_db():
 
 
 @pytest.fixture
-def knowledge_graph():
-    kg = KnowledgeGraph()
-    return kg
+def key():
+    return default_eccrypto.generate_key("curve25519")
 
 
 @pytest.fixture
-def rule_execution_engine(content_db, rules_db, knowledge_graph):
-    return RuleExecutionEngine(content_db, rules_db, knowledge_graph, None)
+async def rule_execution_engine(content_db, rules_db, key):
+    engine = RuleExecutionEngine(content_db, rules_db, key, None)
+    yield engine
+    engine.shutdown()
 
 
 @pytest.mark.asyncio
@@ -49,7 +54,9 @@ async def test_dummy_rule(rule_execution_engine):
     """
     test_future: Future = Future()
 
-    def on_result(content: Content, triplets: List[Triplet]):
+    def on_result(content: Content, triplets: List[Triplet], signed_triplets: SignedTriplets):
+        assert signed_triplets.commitment.has_valid_signature()
+        assert signed_triplets.is_valid()
         on_result.triplets_generated += triplets
         if len(on_result.triplets_generated) == 2:
             identifiers: List[bytes] = []
@@ -63,3 +70,281 @@ async def test_dummy_rule(rule_execution_engine):
     rule_execution_engine.callback = on_result
     rule_execution_engine.start(0.1)
     await test_future
+
+
+def fill_queue(engine: RuleExecutionEngine, count: int):
+    for ind in range(count):
+        engine.process_queue.append(Content(b"%d" % ind, b"test"))
+
+
+async def drain_and_store(engine: RuleExecutionEngine):
+    """
+    Drain the queue and wait for the callbacks, after which the content is marked as processed.
+    """
+    await engine.drain()
+    await gather(*engine.pending_callbacks)
+
+
+@pytest.mark.asyncio
+async def test_drain_batches(rule_execution_engine):
+    """
+    Test whether the queue is drained in batches under the time budget.
+    """
+    results = []
+    rule_execution_engine.callback = lambda content, triplets, signed_triplets: results.append(content)
+    rule_execution_engine.batch_size = 10
+    fill_queue(rule_execution_engine, 25)
+
+    # Without time budget, a single batch is processed per tick
+    rule_execution_engine.time_budget = 0
+    await rule_execution_engine.drain()
+    assert rule_execution_engine.queue_depth == 15
+
+    rule_execution_engine.time_budget = 10
+    await rule_execution_engine.drain()
+    assert not rule_execution_engine.queue_depth
+    assert rule_execution_engine.processed_count == 25
+    assert rule_execution_engine.throughput > 0
+
+
+class FollowUpRule(DummyRule):
+    """
+    A rule that queues a follow-up content item for each top-level content item.
+    """
+    RULE_NAME = b"FOLLOWUP"
+
+    def apply_rule(self, engine, content: Content):
+        if not content.identifier.startswith(b"sub"):
+            engine.process_queue.append(Content(b"sub" + content.identifier, b"test"))
+        return set()
+
+
+@pytest.mark.asyncio
+@pytest.mark.timeout(10)
+async def test_drain_in_workers(rule_execution_engine):
+    """
+    Test whether the rules are applied in worker processes, including follow-up content.
+    """
+    results = {}
+    rule_execution_engine.callback = lambda content, triplets, signed_triplets: \
+        results.update({content.identifier: triplets})
+    rule_execution_engine.rules_db.add_rule(FollowUpRule())
+    rule_execution_engine.workers = 2
+    rule_execution_engine.batch_size = 3
+    fill_queue(rule_execution_engine, 10)
+
+    rule_execution_engine.time_budget = 10
+    await rule_execution_engine.drain()
+
+    assert not rule_execution_engine.queue_depth
+    assert rule_execution_engine.processed_count == 20
+    assert len(results) == 20
+    assert [triplet.rules for triplet in results[b"1"]] == [[b"DUMMY"]]
+
+
+class ItemsRule(DummyRule):
+    """
+    A rule that queues the items of a list in the content as follow-up content.
+    """
+    RULE_NAME = b"ITEMS"
+
+    def apply_rule(self, engine, content: Content):
+        if content.parent is None and content.parent_key is None:
+            for index, item in enumerate(content.parsed["items"]):
+                engine.process_queue.append(Content.from_parent(item.encode(), content, "items", index))
+        return set()
+
+
+@pytest.mark.asyncio
+@pytest.mark.timeout(10)
+async def test_follow_up_parent_in_workers(rule_execution_engine):
+    """
+    Test whether the follow-up content from a worker process refers to its parent again.
+    """
+    rule_execution_engine.callback = lambda content, triplets, signed_triplets: None
+    rule_execution_engine.rules_db.add_rule(ItemsRule())
+    rule_execution_engine.workers = 1
+    rule_execution_engine.batch_size = 1
+    rule_execution_engine.time_budget = 0
+    parent = Content(b"parent", json.dumps({"items": ["x", "y"]}).encode())
+    rule_execution_engine.enqueue(parent)
+
+    await rule_execution_engine.drain()
+
+    assert [content.parsed for content in rule_execution_engine.process_queue] == ["x", "y"]
+    assert all(content.parent is parent for content in rule_execution_engine.process_queue)
+    # The follow-up content is checkpointed by reference to its parent
+    assert sorted(rule_execution_engine.processed_db.connection.execute(
+        "SELECT content_hash FROM pending WHERE parent_hash = ? AND data IS NULL", (b"parent",))) == [(b"x",), (b"y",)]
+
+
+@pytest.mark.asyncio
+async def test_resume_after_restart(tmp_path, content_db, rules_db):
+    """
+    Test whether a restarted engine only queues the content that has not been processed yet.
+    """
+    path = str(tmp_path / "processed.db")
+    engine = RuleExecutionEngine(content_db, rules_db, None, lambda content, triplets, signed_triplets: None,
+                                 processed_db=ProcessedDatabase(path))
+    engine.start(10)
+    engine.batch_size = 1
+    engine.time_budget = 0
+    await drain_and_store(engine)
+    assert engine.queue_depth == 1
+    engine.shutdown()
+    engine.processed_db.close()
+
+    # The pending item is resumed and the processed item is not queued again
+    engine = RuleExecutionEngine(content_db, rules_db, None, lambda content, triplets, signed_triplets: None,
+                                 processed_db=ProcessedDatabase(path))
+    engine.start(10)
+    assert engine.queue_depth == 1
+    engine.shutdown()
+    engine.processed_db.close()
+
+    # After a change of the rule set, all content is processed again
+    rules_db.add_rule(FollowUpRule())
+    engine = RuleExecutionEngine(content_db, rules_db, None, lambda content, triplets, signed_triplets: None,
+                                 processed_db=ProcessedDatabase(path))
+    engine.start(10)
+    assert engine.queue_depth == 2
+    engine.shutdown()
+    engine.processed_db.close()
+
+
+@pytest.mark.asyncio
+async def test_mark_processed_after_callback(rule_execution_engine):
+    """
+    Test whether content is only marked as processed once its callback has completed.
+    """
+    stored: Future = Future()
+    rule_execution_engine.callback = lambda content, triplets, signed_triplets: \
+        stored if content.identifier == b"a" else None
+    rule_execution_engine.time_budget = 10
+    rule_execution_engine.start(10)
+    await rule_execution_engine.drain()
+    await sleep(0)
+
+    # The storage of the content is in flight, so it is resumed after a crash
+    processed_db = rule_execution_engine.processed_db
+    assert not processed_db.get_applied_rules(b"a")
+    assert [content.identifier for content in processed_db.get_pending()] == [b"a"]
+    assert rule_execution_engine.is_processed(Content(b"a", b"test1"))
+
+    stored.set_result(None)
+    await drain_and_store(rule_execution_engine)
+    assert processed_db.get_applied_rules(b"a") == {b"DUMMY": 1}
+    assert not processed_db.get_pending()
+
+
+@pytest.mark.asyncio
+async def test_failed_callback(rule_execution_engine):
+    """
+    Test whether content stays pending if its callback fails.
+    """
+    async def on_result(content: Content, triplets: List[Triplet], signed_triplets: SignedTriplets):
+        raise RuntimeError("storage failed")
+
+    rule_execution_engine.callback = on_result
+    rule_execution_engine.time_budget = 10
+    rule_execution_engine.start(10)
+    await rule_execution_engine.drain()
+    await gather(*rule_execution_engine.pending_callbacks, return_exceptions=True)
+
+    assert not rule_execution_engine.processed_db.num_processed()
+    assert len(rule_execution_engine.processed_db.get_pending()) == 2
+
+
+class UpgradedDummyRule(DummyRule):
+    RULE_VERSION = 2
+
+
+@pytest.mark.asyncio
+async def test_backfill(rule_execution_engine):
+    """
+    Test whether only new or upgraded rules are applied to the existing content by the backfill.
+    """
+    results = []
+    rule_execution_engine.callback = lambda content, triplets, signed_triplets: \
+        results.append((content.identifier, triplets))
+    rule_execution_engine.time_budget = 10
+    rule_execution_engine.start(10)
+    await drain_and_store(rule_execution_engine)
+    assert len(results) == 2
+
+    # Nothing is queued while no rules have been added
+    rule_execution_engine.start_backfill(10, batch_size=1)
+    assert not rule_execution_engine.backfill(1)
+    assert not rule_execution_engine.is_pending_task_active("backfill")
+
+    # A new rule generates no triplets, but is recorded as applied
+    results.clear()
+    rule_execution_engine.rules_db.add_rule(FollowUpRule())
+    rule_execution_engine.start_backfill(10, batch_size=1)
+    assert rule_execution_engine.backfill(1) == 1
+    assert not rule_execution_engine.backfill(10)  # The previous batch has not been processed yet
+    await drain_and_store(rule_execution_engine)
+    assert rule_execution_engine.backfill(1) == 1
+    await drain_and_store(rule_execution_engine)
+
+    # The follow-up content is processed with all rules, the existing content only with the new rule
+    assert len(results) == 4
+    assert sorted(len(triplets) for _, triplets in results) == [0, 0, 1, 1]
+
+    # Upgrading a rule applies only that rule again to the content in the content database
+    results.clear()
+    rule_execution_engine.rules_db.add_rule(UpgradedDummyRule())
+    rule_execution_engine.start_backfill(10, batch_size=10)
+    assert rule_execution_engine.backfill(10) == 2
+    await drain_and_store(rule_execution_engine)
+    assert [[triplet.rules for triplet in triplets] for _, triplets in results] == [[[b"DUMMY"]]] * 2
+
+
+class TailRule(DummyRule):
+    """
+    A rule that generates another edge than the dummy rule.
+    """
+    RULE_NAME = b"TAIL"
+
+    def apply_rule(self, engine, content: Content):
+        return {Triplet(hexlify(content.identifier), b"a", b"c")}
+
+
+@pytest.mark.asyncio
+@pytest.mark.timeout(10)
+@pytest.mark.parametrize("workers", [0, 2])
+async def test_commit_all_triplets(rule_execution_engine, workers):
+    """
+    Test whether the commitment covers all triplets of a content item when a new rule is applied.
+    """
+    rule_execution_engine.workers = workers
+    results = {}
+    rule_execution_engine.callback = lambda content, triplets, signed_triplets: \
+        results.update({content.identifier: signed_triplets})
+    rule_execution_engine.time_budget = 10
+    rule_execution_engine.start(10)
+    await drain_and_store(rule_execution_engine)
+    assert results[b"a"].commitment.leaves_count == 1
+    assert results[b"a"].proofs is None
+
+    rule_execution_engine.rules_db.add_rule(TailRule())
+    rule_execution_engine.start_backfill(10, batch_size=10)
+    rule_execution_engine.backfill(10)
+    await drain_and_store(rule_execution_engine)
+
+    # Only the new triplet is sent, with a proof against the commitment to both triplets
+    signed_triplets = results[b"a"]
+    assert signed_triplets.commitment.leaves_count == 2
+    assert [triplet.tail for triplet in signed_triplets.triplets] == [b"c"]
+    assert len(signed_triplets.proofs) == 1
+    assert signed_triplets.is_valid()
+    assert signed_triplets.commitment.has_valid_signature()
+
+    # An upgraded rule replaces its earlier triplets
+    rule_execution_engine.rules_db.add_rule(UpgradedDummyRule())
+    rule_execution_engine.start_backfill(10, batch_size=10)
+    rule_execution_engine.backfill(10)
+    await drain_and_store(rule_execution_engine)
+    assert results[b"a"].commitment.leaves_count == 2
+    assert results[b"a"].is_valid()
+    assert len(rule_execution_engine.processed_db.get_leaves(b"a")) == 2
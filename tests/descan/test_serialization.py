@@ -0,0 +1,80 @@
+import pytest
+
+from descan.core.db.triplet import Triplet
+from descan.core.merkle import SignedTriplets, TripletCommitment, get_leaves, get_proof, hash_triplet
+from descan.core.payloads import TripletsPayload
+from descan.core.serialization import pack_signed_triplets, pack_triplets, read_varint, unpack_signed_triplets, \
+    unpack_triplets, write_varint
+
+from ipv8.keyvault.crypto import default_eccrypto
+from ipv8.messaging.serialization import default_serializer
+
+
+def make_triplets():
+    triplets = []
+    for ind in range(20):
+        triplet = Triplet(b"a" * 64, b"title" if ind % 2 else b"year", b"tail %d" % ind)
+        triplet.add_rule(b"PTNRule")
+        triplets.append(triplet)
+    triplets.append(Triplet(b"b" * 64, b"title", b"other"))
+    return triplets
+
+
+@pytest.mark.parametrize("value", [0, 1, 127, 128, 300, 2 ** 32])
+def test_varint(value):
+    out = bytearray()
+    write_varint(out, value)
+    assert read_varint(bytes(out), 0) == (value, len(out))
+
+
+def test_pack_unpack():
+    triplets = make_triplets()
+
+    unpacked = unpack_triplets(pack_triplets(triplets))
+
+    assert unpacked == triplets
+    assert [triplet.rules for triplet in unpacked] == [triplet.rules for triplet in triplets]
+
+
+def test_pack_empty():
+    assert unpack_triplets(pack_triplets([])) == []
+
+
+def test_compact_size():
+    triplets = make_triplets()
+    legacy = default_serializer.pack_serializable(TripletsPayload([triplet.to_payload() for triplet in triplets]))
+
+    assert len(pack_triplets(triplets)) * 3 < len(legacy)
+
+
+def test_unpack_malformed():
+    data = pack_triplets(make_triplets())
+
+    with pytest.raises(ValueError):
+        unpack_triplets(data[:-1])
+    with pytest.raises(ValueError):
+        unpack_triplets(data + b"\x00")
+    with pytest.raises(ValueError):
+        unpack_triplets(b"\x02" + data[1:])
+
+
+def test_pack_unpack_signed():
+    key = default_eccrypto.generate_key("curve25519")
+    triplets = make_triplets()
+    commitment = TripletCommitment.create(key, b"a" * 64, triplets)
+    leaves = get_leaves(triplets)
+    partial = SignedTriplets(commitment, triplets[:2], [get_proof(leaves, hash_triplet(triplet))
+                                                        for triplet in triplets[:2]])
+
+    data = pack_signed_triplets(triplets[:1], [SignedTriplets(commitment, triplets), partial])
+    unsigned, groups = unpack_signed_triplets(data)
+
+    assert unsigned == triplets[:1]
+    assert [group.triplets for group in groups] == [triplets, triplets[:2]]
+    assert groups[0].proofs is None
+    assert groups[1].proofs == partial.proofs
+    assert groups[0].commitment.digest == commitment.digest
+    assert all(group.is_valid() for group in groups)
+
+    with pytest.raises(ValueError):
+        unpack_signed_triplets(data[:-1])